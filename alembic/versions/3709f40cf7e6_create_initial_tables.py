@@ -11,7 +11,9 @@ import sqlalchemy as sa
 
 # revision identifiers, used by Alembic.
 from sqlalchemy import Column, Integer, Sequence, String, Float, DateTime, ForeignKey
-from sqlalchemy.sql.ddl import CreateSequence, DropSequence
+
+from solarmeteo.model.migration import create_sequence, drop_sequence, sequence_default, \
+    create_unique_constraint, drop_unique_constraint
 
 revision = '3709f40cf7e6'
 down_revision = None
@@ -20,20 +22,20 @@ depends_on = None
 
 
 def upgrade():
-    op.execute(CreateSequence(Sequence('station_id_seq')))
+    create_sequence('station_id_seq')
     op.create_table('station',
                     Column('id', Integer, Sequence('station_id_seq'), primary_key=True,
-                           server_default=sa.text("nextval('station_id_seq'::regclass)")),
+                           server_default=sequence_default('station_id_seq')),
                     Column('name', String, nullable=False),
                     Column('imgw_id', Integer, nullable=False),
                     Column('longitude', Float),
                     Column('latitude', Float)
                     )
-    op.execute(CreateSequence(Sequence('station_data_id_seq')))
+    create_sequence('station_data_id_seq')
     op.create_index('ix_station_imgw_id', 'station', ['imgw_id'], unique=True)
     op.create_table('station_data',
                     Column('id', Integer, Sequence('station_data_id_seq'), primary_key=True,
-                           server_default=sa.text("nextval('station_data_id_seq'::regclass)")),
+                           server_default=sequence_default('station_data_id_seq')),
                     Column('station_id', Integer, ForeignKey('station.id', ondelete='CASCADE'), nullable=False),
                     Column('datetime', DateTime, nullable=False),
                     Column('temperature', Float),
@@ -43,13 +45,13 @@ def upgrade():
                     Column('precipitation', Float),
                     Column('pressure', Float)
                     )
-    op.create_unique_constraint('uq_station_id_datetime', 'station_data', ['station_id', 'datetime'])
+    create_unique_constraint('uq_station_id_datetime', 'station_data', ['station_id', 'datetime'])
 
 
 def downgrade():
-    op.drop_constraint('uq_station_id_datetime', 'station_data', type_='unique')
+    drop_unique_constraint('uq_station_id_datetime', 'station_data')
     op.drop_table('station_data')
-    op.execute(DropSequence(Sequence('station_data_id_seq')))
+    drop_sequence('station_data_id_seq')
     op.drop_index('ix_station_imgw_id')
     op.drop_table('station')
-    op.execute(DropSequence(Sequence('station_id_seq')))
+    drop_sequence('station_id_seq')
@@ -8,9 +8,10 @@ Create Date: 2025-07-10 09:54:35.790476
 from alembic import op
 import sqlalchemy as sa
 
-from sqlalchemy import Column, Integer, Sequence, String, Float, DateTime, ForeignKey, text
+from sqlalchemy import Column, Integer, Sequence, String, Float, DateTime, ForeignKey
 
-from sqlalchemy.sql.ddl import CreateSequence, DropSequence
+from solarmeteo.model.migration import create_sequence, drop_sequence, sequence_default, \
+    create_unique_constraint, drop_unique_constraint
 
 
 # revision identifiers, used by Alembic.
@@ -22,12 +23,12 @@ depends_on = None
 
 def upgrade():
 
-    op.execute(CreateSequence(Sequence('esa_station_id_seq')))
+    create_sequence('esa_station_id_seq')
 
     op.create_table(
         'esa_station',
         Column('id', Integer(), Sequence('esa_station_id_seq'), primary_key=True,
-               server_default=text("nextval('esa_station_id_seq')")),
+               server_default=sequence_default('esa_station_id_seq')),
         Column('name', String(), nullable=False, unique=True),
         Column('street', String()),
         Column('post_code', String()),
@@ -35,11 +36,11 @@ def upgrade():
         Column('longitude', Float(), nullable=False),
         Column('latitude', Float(), nullable=False))
 
-    op.execute(CreateSequence(Sequence('esa_station_data_id_seq')))
+    create_sequence('esa_station_data_id_seq')
     op.create_table(
         'esa_station_data',
         Column('id', Integer(), Sequence('esa_station_data_id_seq'), primary_key=True,
-                  server_default=text("nextval('esa_station_data_id_seq')")),
+                  server_default=sequence_default('esa_station_data_id_seq')),
         Column('esa_station_id', Integer(), ForeignKey('esa_station.id'), nullable=False),
         Column('humidity', Float(), nullable=False),
         Column('pressure', Float(), nullable=False),
@@ -48,12 +49,12 @@ def upgrade():
         Column('pm25', Float(), nullable=False),
         Column('datetime', DateTime(), nullable=False)
     )
-    op.create_unique_constraint('uq_esa_station_id_datetime', 'esa_station_data', ['esa_station_id', 'datetime'])
+    create_unique_constraint('uq_esa_station_id_datetime', 'esa_station_data', ['esa_station_id', 'datetime'])
 
 
 def downgrade():
-    op.drop_constraint('uq_esa_station_id_datetime', 'esa_station_data', type_='unique')
+    drop_unique_constraint('uq_esa_station_id_datetime', 'esa_station_data')
     op.drop_table('esa_station_data')
-    op.execute(DropSequence(Sequence('esa_station_data_id_seq')))
+    drop_sequence('esa_station_data_id_seq')
     op.drop_table('esa_station')
-    op.execute(DropSequence(Sequence('esa_station_id_seq')))
\ No newline at end of file
+    drop_sequence('esa_station_id_seq')
\ No newline at end of file
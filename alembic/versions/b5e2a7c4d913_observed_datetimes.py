@@ -0,0 +1,45 @@
+"""datetime indexes and observed datetimes
+
+Revision ID: b5e2a7c4d913
+Revises: 4687b017397f
+Create Date: 2026-10-19 10:12:41.318204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from sqlalchemy import Column, String, DateTime
+
+# revision identifiers, used by Alembic.
+revision = 'b5e2a7c4d913'
+down_revision = '4687b017397f'
+branch_labels = None
+depends_on = None
+
+# source name, measurement table
+SOURCES = [
+    ('imgw', 'station_data'),
+    ('esa', 'esa_station_data'),
+    ('gios', 'gios_station_data'),
+]
+
+
+def upgrade():
+    for source, table in SOURCES:
+        op.create_index(f'ix_{table}_datetime', table, ['datetime'])
+
+    op.create_table(
+        'observed_datetime',
+        Column('source', String, primary_key=True),
+        Column('datetime', DateTime, primary_key=True),
+    )
+
+    for source, table in SOURCES:
+        op.execute(sa.text(
+            f"INSERT INTO observed_datetime (source, datetime) SELECT DISTINCT '{source}', datetime FROM {table}"))
+
+
+def downgrade():
+    op.drop_table('observed_datetime')
+    for source, table in SOURCES:
+        op.drop_index(f'ix_{table}_datetime', table_name=table)
@@ -0,0 +1,109 @@
+"""monthly partitions of measurement tables
+
+Revision ID: c8d14f3a6e57
+Revises: b5e2a7c4d913
+Create Date: 2026-10-19 13:40:17.522913
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+from solarmeteo.model.migration import is_postgresql
+
+# revision identifiers, used by Alembic.
+revision = 'c8d14f3a6e57'
+down_revision = 'b5e2a7c4d913'
+branch_labels = None
+depends_on = None
+
+# partitions created ahead of the current month, updaters create further ones when needed
+FUTURE_PARTITIONS = 2
+
+# table: (unique constraint or index, its columns, is index), foreign keys (columns, referred table, ondelete)
+TABLES = {
+    'station_data': (
+        ('uq_station_id_datetime', ['station_id', 'datetime'], False),
+        [(['station_id'], 'station', 'CASCADE')]),
+    'esa_station_data': (
+        ('uq_esa_station_id_datetime', ['esa_station_id', 'datetime'], False),
+        [(['esa_station_id'], 'esa_station', None)]),
+    'gios_station_data': (
+        ('ix_gios_station_data_station_parameter_datetime', ['gios_station_id', 'parameter_id', 'datetime'], True),
+        [(['gios_station_id'], 'gios_station', None), (['parameter_id'], 'gios_parameter', None)]),
+}
+
+
+def _add_months(month, months):
+    index = month.year * 12 + month.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def _months(first, last):
+    month = datetime(first.year, first.month, 1)
+    while month <= last:
+        yield month
+        month = _add_months(month, 1)
+
+
+def _add_constraints(table, primary_key):
+    (unique_name, unique_columns, unique_index), foreign_keys = TABLES[table]
+    op.create_primary_key(f'{table}_pkey', table, primary_key)
+    if unique_index:
+        op.create_index(unique_name, table, unique_columns, unique=True)
+    else:
+        op.create_unique_constraint(unique_name, table, unique_columns)
+    for columns, referred, ondelete in foreign_keys:
+        op.create_foreign_key(f'{table}_{columns[0]}_fkey', table, referred, columns, ['id'], ondelete=ondelete)
+
+
+def _rename_datetime_indexes(old, new):
+    for table in TABLES:
+        op.drop_index(f'ix_{table}_{old}', table_name=table)
+        op.create_index(f'ix_{table}_{new}', table, ['datetime'])
+
+
+def upgrade():
+    # partitioning is PostgreSQL only, SQLite keeps btree datetime indexes under the names of the models
+    if not is_postgresql():
+        _rename_datetime_indexes('datetime', 'datetime_brin')
+        return
+
+    connection = op.get_bind()
+    now = datetime.now()
+
+    for table in TABLES:
+        old = f'{table}_unpartitioned'
+        op.rename_table(table, old)
+        op.execute(f'CREATE TABLE {table} (LIKE {old} INCLUDING DEFAULTS) PARTITION BY RANGE (datetime)')
+
+        first = connection.execute(sa.text(f'SELECT min(datetime) FROM {old}')).scalar() or now
+        for month in _months(first, _add_months(datetime(now.year, now.month, 1), FUTURE_PARTITIONS)):
+            op.execute(f"CREATE TABLE {table}_y{month.year:04d}m{month.month:02d} PARTITION OF {table} "
+                       f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{_add_months(month, 1):%Y-%m-%d}')")
+
+        op.execute(f'INSERT INTO {table} SELECT * FROM {old}')
+        op.drop_table(old)
+
+        # primary key of a partitioned table has to contain the partition key
+        _add_constraints(table, ['id', 'datetime'])
+        # datetime correlates with physical order of appended rows, BRIN is tiny and sufficient
+        op.execute(f'CREATE INDEX ix_{table}_datetime_brin ON {table} USING brin (datetime)')
+
+
+def downgrade():
+    if not is_postgresql():
+        _rename_datetime_indexes('datetime_brin', 'datetime')
+        return
+
+    for table in TABLES:
+        partitioned = f'{table}_partitioned'
+        op.rename_table(table, partitioned)
+        op.execute(f'CREATE TABLE {table} (LIKE {partitioned} INCLUDING DEFAULTS)')
+        op.execute(f'INSERT INTO {table} SELECT * FROM {partitioned}')
+        # drops attached partitions, detached ones are left as they are
+        op.execute(f'DROP TABLE {partitioned}')
+
+        _add_constraints(table, ['id'])
+        op.create_index(f'ix_{table}_datetime', table, ['datetime'])
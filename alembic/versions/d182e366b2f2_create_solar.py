@@ -10,7 +10,8 @@ from alembic import op
 
 import sqlalchemy as sa
 from sqlalchemy import Column, DateTime, Integer, Sequence
-from sqlalchemy.sql.ddl import CreateSequence, DropSequence
+
+from solarmeteo.model.migration import create_sequence, drop_sequence, sequence_default, is_postgresql
 
 revision = 'd182e366b2f2'
 down_revision = '3709f40cf7e6'
@@ -19,16 +20,17 @@ depends_on = None
 
 
 def upgrade():
-    op.execute(CreateSequence(Sequence('solar_data_id_seq')))
+    create_sequence('solar_data_id_seq')
     op.create_table('solar_data',
                     Column('id', Integer, Sequence('solar_data_id_seq'), primary_key=True,
-                          server_default=sa.text("nextval('solar_data_id_seq'::regclass)")),
-                    Column('datetime', DateTime, unique=True, nullable=False, primary_key=True),
+                          server_default=sequence_default('solar_data_id_seq')),
+                    # SQLite fills only a single column integer primary key
+                    Column('datetime', DateTime, unique=True, nullable=False, primary_key=is_postgresql()),
                     Column('power', Integer)
                     )
 
 
 def downgrade():
     op.drop_table('solar_data')
-    op.execute(DropSequence(Sequence('solar_data_id_seq')))
+    drop_sequence('solar_data_id_seq')
 
@@ -10,7 +10,7 @@ import sqlalchemy as sa
 
 from sqlalchemy import Column, Integer, Sequence, String, DateTime, ForeignKey, Table, MetaData
 
-from sqlalchemy.sql.ddl import CreateSequence, DropSequence
+from solarmeteo.model.migration import create_sequence, drop_sequence, sequence_default
 
 # revision identifiers, used by Alembic.
 revision = 'd7e584f06439'
@@ -20,11 +20,11 @@ depends_on = None
 
 
 def upgrade():
-    op.execute(CreateSequence(Sequence('frame_types_id_seq')))
+    create_sequence('frame_types_id_seq')
     op.create_table(
         'frame_types',
         Column('id', Integer, Sequence('frame_types_id_seq'), primary_key=True,
-               server_default=sa.text("nextval('frame_types_id_seq')")),
+               server_default=sequence_default('frame_types_id_seq')),
                 Column('name', String, unique=True, nullable=False)
     )
     frame_types_table = Table(
@@ -45,11 +45,11 @@ def upgrade():
             ]
     )
 
-    op.execute(CreateSequence(Sequence('frames_id_seq')))
+    create_sequence('frames_id_seq')
     op.create_table(
         'frames',
         Column('id', Integer, Sequence('frames_id_seq'), primary_key=True,
-               server_default=sa.text("nextval('frames_id_seq')")),
+               server_default=sequence_default('frames_id_seq')),
         Column('type_id', Integer, ForeignKey('frame_types.id'), nullable=False),
         Column('datetime', DateTime, nullable=False),
         Column('body', String, nullable=False),
@@ -59,6 +59,6 @@ def upgrade():
 
 def downgrade():
     op.drop_table('frames')
-    op.execute(DropSequence(Sequence('frames_id_seq')))
+    drop_sequence('frames_id_seq')
     op.drop_table('frame_types')
-    op.execute(DropSequence(Sequence('frame_types_id_seq')))
\ No newline at end of file
+    drop_sequence('frame_types_id_seq')
\ No newline at end of file
@@ -0,0 +1,65 @@
+"""rollups of measurements
+
+Revision ID: e2f9b6a1c384
+Revises: c8d14f3a6e57
+Create Date: 2026-10-19 15:02:53.871406
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from sqlalchemy import Column, String, Integer, Float, DateTime
+
+from solarmeteo.model.migration import date_trunc
+
+# revision identifiers, used by Alembic.
+revision = 'e2f9b6a1c384'
+down_revision = 'c8d14f3a6e57'
+branch_labels = None
+depends_on = None
+
+IMGW_VARIABLES = ('temperature', 'wind_speed', 'humidity', 'precipitation', 'pressure')
+ESA_VARIABLES = ('temperature', 'humidity', 'pressure', 'pm10', 'pm25')
+
+INSERT = 'INSERT INTO rollup (source, resolution, variable, bucket, station_id, count, sum, min, max) '
+
+
+def upgrade():
+    op.create_table(
+        'rollup',
+        Column('source', String, primary_key=True),
+        Column('resolution', String, primary_key=True),
+        Column('variable', String, primary_key=True),
+        Column('bucket', DateTime, primary_key=True),
+        Column('station_id', Integer, primary_key=True),
+        Column('count', Integer, nullable=False),
+        Column('sum', Float, nullable=False),
+        Column('min', Float, nullable=False),
+        Column('max', Float, nullable=False),
+    )
+
+    # rollups of already stored measurements
+    for resolution in ('day', 'month'):
+        for variable in IMGW_VARIABLES:
+            op.execute(sa.text(
+                INSERT + f"SELECT 'imgw', '{resolution}', '{variable}', {date_trunc(resolution, 'datetime')}, "
+                f"station_id, count({variable}), sum({variable}), min({variable}), max({variable}) "
+                f"FROM station_data WHERE {variable} IS NOT NULL "
+                f"GROUP BY {date_trunc(resolution, 'datetime')}, station_id"))
+
+        op.execute(sa.text(
+            INSERT + f"SELECT 'gios', '{resolution}', p.name, {date_trunc(resolution, 'd.datetime')}, "
+            f"d.gios_station_id, count(d.value), sum(d.value), min(d.value), max(d.value) "
+            f"FROM gios_station_data d JOIN gios_parameter p ON p.id = d.parameter_id WHERE d.value IS NOT NULL "
+            f"GROUP BY p.name, {date_trunc(resolution, 'd.datetime')}, d.gios_station_id"))
+
+    for resolution in ('hour', 'day', 'month'):
+        for variable in ESA_VARIABLES:
+            op.execute(sa.text(
+                INSERT + f"SELECT 'esa', '{resolution}', '{variable}', {date_trunc(resolution, 'datetime')}, "
+                f"esa_station_id, count({variable}), sum({variable}), min({variable}), max({variable}) "
+                f"FROM esa_station_data GROUP BY {date_trunc(resolution, 'datetime')}, esa_station_id"))
+
+
+def downgrade():
+    op.drop_table('rollup')
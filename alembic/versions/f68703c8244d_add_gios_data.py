@@ -9,7 +9,8 @@ from alembic import op
 import sqlalchemy as sa
 
 from sqlalchemy import Column, Integer, Sequence, Float, String, DateTime, Boolean, MetaData, Table
-from sqlalchemy.sql.ddl import CreateSequence, DropSequence
+
+from solarmeteo.model.migration import create_sequence, drop_sequence, sequence_default
 
 # revision identifiers, used by Alembic.
 revision = 'f68703c8244d'
@@ -19,14 +20,12 @@ depends_on = None
 
 
 def upgrade():
-    op.execute(CreateSequence(Sequence('gios_station_id_seq')))
-    Column('id', Integer, Sequence('gios_station_id_seq'), primary_key=True,
-       server_default=sa.text("nextval('gios_station_id_seq'::regclass)")),
+    create_sequence('gios_station_id_seq')
 
     op.create_table(
         'gios_station',
         Column('id', Integer, Sequence('gios_station_id_seq'), primary_key=True,
-               server_default=sa.text("nextval('gios_station_id_seq')")),
+               server_default=sequence_default('gios_station_id_seq')),
         Column('station_name', String, nullable=False, unique=True),
         Column('gios_id', Integer, nullable=False, index=True, unique=True),
         Column('longitude', Float),
@@ -40,11 +39,11 @@ def upgrade():
         Column('station_code', String)
     )
 
-    op.execute(CreateSequence(Sequence('gios_parameter_id_seq')))
+    create_sequence('gios_parameter_id_seq')
     op.create_table(
         'gios_parameter',
         Column('id', Integer, Sequence('gios_parameter_id_seq'), primary_key=True,
-               server_default=sa.text("nextval('gios_parameter_id_seq')")),
+               server_default=sequence_default('gios_parameter_id_seq')),
         Column('name', String, nullable=False, unique=True)),
 
 
@@ -67,11 +66,11 @@ def upgrade():
         ]
     )
 
-    op.execute(CreateSequence(Sequence('gios_station_data_id_seq')))
+    create_sequence('gios_station_data_id_seq')
     op.create_table(
         'gios_station_data',
         Column('id', Integer, Sequence('gios_station_data_id_seq'), primary_key=True,
-               server_default=sa.text("nextval('gios_station_data_id_seq')")),
+               server_default=sequence_default('gios_station_data_id_seq')),
         Column('gios_station_id', Integer, sa.ForeignKey('gios_station.id'), nullable=False),
         Column('parameter_id', Integer, sa.ForeignKey('gios_parameter.id'), nullable=False),
         Column('datetime', DateTime, nullable=False),
@@ -85,9 +84,9 @@ def downgrade():
     op.drop_index('ix_gios_station_data_station_parameter_datetime')
     op.drop_index('ix_gios_station_gios_id')
     op.drop_table('gios_station_data')
-    op.execute(DropSequence(Sequence('gios_station_data_id_seq')))
+    drop_sequence('gios_station_data_id_seq')
     op.drop_table('gios_parameter')
-    op.execute(DropSequence(Sequence('gios_parameter_id_seq')))
+    drop_sequence('gios_parameter_id_seq')
     op.drop_table('gios_station')
-    op.execute(DropSequence(Sequence('gios_station_id_seq')))
+    drop_sequence('gios_station_id_seq')
 
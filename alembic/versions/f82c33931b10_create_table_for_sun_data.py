@@ -11,7 +11,8 @@ import sqlalchemy as sa
 
 # revision identifiers, used by Alembic.
 from sqlalchemy import Column, Integer, Sequence, Float, DateTime
-from sqlalchemy.sql.ddl import CreateSequence, DropSequence
+
+from solarmeteo.model.migration import create_sequence, drop_sequence, sequence_default
 
 revision = 'f82c33931b10'
 down_revision = 'd182e366b2f2'
@@ -20,11 +21,11 @@ depends_on = None
 
 
 def upgrade():
-    op.execute(CreateSequence(Sequence('sun_data_id_seq')))
+    create_sequence('sun_data_id_seq')
     # op.create_index('ix_sun_data_id', 'sun_data', ['sun_data_id'], unique=True)
     op.create_table('sun_data',
                     Column('id', Integer, Sequence('sun_data_id_seq'), primary_key=True,
-                           server_default=sa.text("nextval('sun_data_id_seq'::regclass)")),
+                           server_default=sequence_default('sun_data_id_seq')),
                     Column('datetime', DateTime, nullable=False),
                     Column('azimuth', Float, nullable=False),
                     Column('height', Float, nullable=False)
@@ -33,5 +34,5 @@ def upgrade():
 
 def downgrade():
     op.drop_table('sun_data')
-    op.execute(DropSequence(Sequence('sun_data_id_seq')))
+    drop_sequence('sun_data_id_seq')
 
@@ -0,0 +1,96 @@
+###
+# SolarMeteo    : https://github.com/pa810p/solarmeteo
+# Author        : Pawel Prokop
+# License       : GNU GENERAL PUBLIC LICENSE v3
+###
+
+import logging
+import optparse
+import sys
+
+from solarmeteo.benchmark.baseline import save_baseline, load_baseline, compare, DEFAULT_TOLERANCE
+from solarmeteo.benchmark.imports import run_import_benchmark, IMPORT_PATHS, DEFAULT_REPEAT
+from solarmeteo.benchmark.pipeline import run_benchmark, DEFAULT_POINTS, DEFAULT_FRAMES, DEFAULT_SAMPLE_FRAMES
+from solarmeteo.benchmark.synthetic import LAYOUT_IMGW, LAYOUT_ESA
+from solarmeteo.heatmap.heatmap_creator import DEFAULT_GRID_SIZE, DEFAULT_PREVIEW_GRID_SIZE
+from solarmeteo.logger.logs import get_log_level, setup_logging
+
+
+def _parse_numbers(value):
+    return tuple(int(number) for number in value.split(',') if number.strip())
+
+
+def _load_geometry(path):
+    from solarmeteo.heatmap.geometry_store import load_poland_geometry
+    return load_poland_geometry(path)
+
+
+def _report(regressions):
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    if not regressions:
+        print("No regressions.")
+    return 1 if regressions else 0
+
+
+def main(argv=None):
+    parser = optparse.OptionParser(
+        usage="%prog [--points 60,1000] [--frames 1,24] [-o result.json] [--baseline baseline.json]\n"
+              "       %prog --imports [-o result.json] [--baseline baseline.json]\n"
+              "       %prog --compare baseline.json result.json",
+        description='Benchmark of the heatmap pipeline stages on synthetic station data.')
+    parser.add_option('--points', dest='points', default=','.join(map(str, DEFAULT_POINTS)),
+                      help='comma separated numbers of stations, default is %default')
+    parser.add_option('--frames', dest='frames', default=','.join(map(str, DEFAULT_FRAMES)),
+                      help='comma separated numbers of frames, default is %default')
+    parser.add_option('--layout', dest='layout', default=LAYOUT_IMGW, choices=[LAYOUT_IMGW, LAYOUT_ESA],
+                      help='imgw (evenly spread) or esa (clustered around cities) stations, default is %default')
+    parser.add_option('--sample-frames', dest='sample_frames', type=int, default=DEFAULT_SAMPLE_FRAMES,
+                      help='frames rendered per number of stations, default is %default')
+    parser.add_option('--grid-size', dest='grid_size', type=int, default=DEFAULT_GRID_SIZE,
+                      help='points of interpolation grid along each axis, default is %default')
+    parser.add_option('--preview', dest='preview', type=int, nargs=1, metavar='GRID_SIZE',
+                      help=f'interpolate on a coarse grid upsampled to --grid-size, e.g. {DEFAULT_PREVIEW_GRID_SIZE}')
+    parser.add_option('--geojson', dest='geojson',
+                      help='borders of Poland, a rough synthetic outline is used by default')
+    parser.add_option('--imports', dest='imports', action='store_true', default=False,
+                      help='measure cold start (imports) of every -u module and of --heatmap instead')
+    parser.add_option('--repeat', dest='repeat', type=int, default=DEFAULT_REPEAT,
+                      help='cold starts measured per path, median is reported, default is %default')
+    parser.add_option('-o', '--output', dest='output', help='store result as json baseline')
+    parser.add_option('--baseline', dest='baseline', help='compare result with json baseline')
+    parser.add_option('--compare', dest='compare', nargs=2, metavar='BASELINE RESULT',
+                      help='compare two stored results without running benchmark')
+    parser.add_option('--tolerance', dest='tolerance', type=float, default=DEFAULT_TOLERANCE,
+                      help='relative slowdown reported as regression, default is %default')
+    parser.add_option('-l', '--log-level', dest='log_level', default='info', help='logging level')
+
+    (options, args) = parser.parse_args(argv)
+
+    if options.compare:
+        baseline, current = (load_baseline(path) for path in options.compare)
+        return _report(compare(baseline, current, options.tolerance))
+
+    setup_logging(level=get_log_level(options.log_level), log_file="benchmark.log", project_prefix="solarmeteo")
+    logging.getLogger("solarmeteo.benchmark").info("Starting benchmark...")
+
+    if options.imports:
+        result = run_import_benchmark(tuple(IMPORT_PATHS), options.repeat)
+        for key, path_result in result['results'].items():
+            print(f"{key:16} {path_result['total']:.3f}s  {', '.join(path_result['heavy']) or '-'}")
+    else:
+        result = run_benchmark(points=_parse_numbers(options.points), frames=_parse_numbers(options.frames),
+                               layout=options.layout, sample_frames=options.sample_frames,
+                               geometry=_load_geometry(options.geojson) if options.geojson else None,
+                               grid_size=options.grid_size, preview_grid_size=options.preview)
+
+    if options.output:
+        save_baseline(result, options.output)
+
+    if options.baseline:
+        return _report(compare(load_baseline(options.baseline), result, options.tolerance))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,61 @@
+###
+# SolarMeteo    : https://github.com/pa810p/solarmeteo
+# Author        : Pawel Prokop
+# License       : GNU GENERAL PUBLIC LICENSE v3
+###
+
+import json
+from dataclasses import dataclass
+
+# relative slowdown of a stage reported as regression
+DEFAULT_TOLERANCE = 0.25
+# stages faster than that in both runs are noise and never reported
+DEFAULT_MIN_SECONDS = 0.01
+
+
+@dataclass
+class Regression:
+    key: str
+    stage: str
+    baseline: float
+    current: float
+
+    @property
+    def ratio(self):
+        return self.current / self.baseline if self.baseline else float('inf')
+
+    def __str__(self):
+        return f"{self.key} {self.stage}: {self.baseline:.3f}s -> {self.current:.3f}s ({self.ratio:.2f}x)"
+
+
+def save_baseline(result: dict, path):
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(result, file, indent=2, sort_keys=True)
+
+
+def load_baseline(path) -> dict:
+    with open(path, encoding='utf-8') as file:
+        return json.load(file)
+
+
+def compare(baseline: dict, current: dict, tolerance=DEFAULT_TOLERANCE, min_seconds=DEFAULT_MIN_SECONDS) -> list:
+    """
+    Compares stage timings of two benchmark results, only combinations and stages present (and not
+    skipped) in both are compared.
+
+    :return: list of Regression, stages slower than baseline by more than tolerance
+    """
+    regressions = []
+    for key, baseline_result in sorted(baseline['results'].items()):
+        current_result = current['results'].get(key)
+        if current_result is None:
+            continue
+        for stage, baseline_seconds in baseline_result['stages'].items():
+            current_seconds = current_result['stages'].get(stage)
+            if baseline_seconds is None or current_seconds is None:
+                continue
+            if max(baseline_seconds, current_seconds) < min_seconds:
+                continue
+            if current_seconds > baseline_seconds * (1 + tolerance):
+                regressions.append(Regression(key, stage, baseline_seconds, current_seconds))
+    return regressions
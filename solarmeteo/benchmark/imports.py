@@ -0,0 +1,87 @@
+###
+# SolarMeteo    : https://github.com/pa810p/solarmeteo
+# Author        : Pawel Prokop
+# License       : GNU GENERAL PUBLIC LICENSE v3
+###
+
+import json
+import platform
+import statistics
+import subprocess
+import sys
+from datetime import datetime
+
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+# modules imported on top of the entry point by every path of the command line
+IMPORT_PATHS = {
+    'imgw': ('solarmeteo.updater.meteo_updater',),
+    'solar': ('solarmeteo.updater.solar_updater',),
+    'gios': ('solarmeteo.updater.gios_updater',),
+    'esa': ('solarmeteo.updater.esa_updater',),
+    'heatmap': ('solarmeteo.heatmap.heatmap',),
+}
+ENTRY_POINT = 'solarmeteo.solarmeteo'
+
+# scientific dependencies that only rendering (and validation of sun positions) needs
+HEAVY_MODULES = ('geopandas', 'shapely', 'scipy', 'matplotlib', 'imageio', 'PIL', 'pyproj', 'astropy')
+
+DEFAULT_REPEAT = 5
+
+_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+for module in sys.argv[1:]:
+    __import__(module)
+seconds = time.perf_counter() - started
+print(json.dumps({'seconds': seconds, 'modules': sorted(sys.modules)}))
+"""
+
+
+def cold_import(modules) -> dict:
+    """
+    Imports modules in a fresh interpreter.
+
+    :return: {'seconds': time of the imports, 'modules': names of all loaded modules}
+    """
+    completed = subprocess.run([sys.executable, '-c', _PROBE, *modules], capture_output=True, text=True, check=True)
+    return json.loads(completed.stdout)
+
+
+def heavy_modules(loaded) -> list:
+    return [module for module in HEAVY_MODULES if module in loaded]
+
+
+def run_import_benchmark(paths=tuple(IMPORT_PATHS), repeat=DEFAULT_REPEAT) -> dict:
+    """
+    Measures cold start of command line paths: the entry point and modules of the path imported by
+    a fresh interpreter, median of repeat runs. Heavy dependencies loaded by the path are listed.
+
+    :return: benchmark result, see solarmeteo.benchmark.baseline
+    """
+    results = dict()
+    for path in paths:
+        modules = (ENTRY_POINT, *IMPORT_PATHS[path])
+        runs = [cold_import(modules) for _ in range(repeat)]
+        seconds = statistics.median(run['seconds'] for run in runs)
+        heavy = heavy_modules(runs[0]['modules'])
+
+        key = f'import-{path}'
+        results[key] = {
+            'modules': list(modules),
+            'heavy': heavy,
+            'stages': {'import': seconds},
+            'total': seconds,
+            'skipped': [],
+        }
+        logger.info(f"{key}: import={seconds:.3f}s heavy={','.join(heavy) or '-'}")
+
+    return {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'results': results,
+    }
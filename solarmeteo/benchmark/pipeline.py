@@ -0,0 +1,171 @@
+###
+# SolarMeteo    : https://github.com/pa810p/solarmeteo
+# Author        : Pawel Prokop
+# License       : GNU GENERAL PUBLIC LICENSE v3
+###
+
+import os
+import platform
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+
+from solarmeteo.benchmark.synthetic import synthetic_geometry, synthetic_stations, create_database, datetimes, \
+    LAYOUT_IMGW
+from solarmeteo.heatmap.data_provider import DataProvider
+from solarmeteo.heatmap.heatmap import HeatMap, write_gif, write_webp
+from solarmeteo.heatmap.heatmap_creator import TemperatureCreator, DEFAULT_GRID_SIZE
+
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+STAGES = ('fetch', 'project', 'interpolate', 'mask', 'render', 'encode', 'persist')
+# stages of a single frame, measured on sampled frames and multiplied by number of frames
+FRAME_STAGES = ('project', 'interpolate', 'mask', 'render')
+
+DEFAULT_POINTS = (60, 1000, 10000)
+DEFAULT_FRAMES = (1, 24, 168)
+DEFAULT_SAMPLE_FRAMES = 3
+# RBF evaluates distances of every grid point to every station at once, larger inputs are skipped
+INTERPOLATION_MEMORY_LIMIT = 2 * 1024 ** 3
+
+_VMIN, _VMAX = -5, 30
+
+
+def benchmark_creator(geometry=None, grid_size=DEFAULT_GRID_SIZE, preview_grid_size=None) -> TemperatureCreator:
+    """
+    Temperature creator using given (or synthetic) geometry instead of loading borders of Poland.
+    """
+    creator = TemperatureCreator.__new__(TemperatureCreator)
+    creator._geometry = geometry if geometry is not None else synthetic_geometry()
+    creator.grid_size = grid_size
+    creator.preview_grid_size = preview_grid_size
+    return creator
+
+
+def _timed(function, *args, **kwargs):
+    started = time.perf_counter()
+    result = function(*args, **kwargs)
+    return time.perf_counter() - started, result
+
+
+def time_frame_stages(creator, stations, memory_limit=INTERPOLATION_MEMORY_LIMIT):
+    """
+    Runs stages of HeatmapCreator.generate_heatmap one by one for every frame.
+
+    :param creator: HeatmapCreator with geometry
+    :param stations: list of (datetime, [StationValue]) as provided by DataProvider
+    :param memory_limit: interpolation needing more memory is skipped, its grid is left empty
+    :return: tuple (stage -> mean seconds per frame or None when skipped, list of rendered images)
+    """
+    timings = {stage: [] for stage in FRAME_STAGES}
+    skipped = set()
+    images = []
+    for displaydate, frame_stations in stations:
+        lons = np.array([s.lon for s in frame_stations])
+        lats = np.array([s.lat for s in frame_stations])
+        values = np.array([s.value for s in frame_stations])
+        names = np.array([s.name for s in frame_stations])
+        directions = np.array([None] * len(frame_stations))
+
+        elapsed, (x, y) = _timed(creator.project_stations, lons, lats)
+        timings['project'].append(elapsed)
+
+        xx, yy = creator.interpolation_grid()
+        if creator.interpolation_size ** 2 * len(values) * 8 <= memory_limit:
+            elapsed, grid = _timed(creator.interpolate, x, y, (values - _VMIN) / (_VMAX - _VMIN), xx, yy)
+            grid = grid * (_VMAX - _VMIN) + _VMIN
+            timings['interpolate'].append(elapsed)
+        else:
+            grid = np.full(xx.shape, np.nan)
+            skipped.add('interpolate')
+
+        elapsed, mask = _timed(creator.mask, xx, yy)
+        timings['mask'].append(elapsed)
+        grid[~mask] = np.nan
+        grid = np.clip(grid, _VMIN, _VMAX)
+
+        def render():
+            grid_lon, grid_lat = creator.unproject_grid(xx, yy)
+            fig = creator.render(grid_lon, grid_lat, grid, lons, lats, names, values, directions,
+                                 displaydate=str(displaydate), vmin=_VMIN, vmax=_VMAX, label="Temperature (°C)",
+                                 display_labels=HeatMap.display_labels)
+            return creator.figure_to_image(fig)
+
+        elapsed, image = _timed(render)
+        timings['render'].append(elapsed)
+        images.append(image)
+
+    return {stage: float(np.mean(values)) if values and stage not in skipped else None
+            for stage, values in timings.items()}, images
+
+
+def run_benchmark(points=DEFAULT_POINTS, frames=DEFAULT_FRAMES, layout=LAYOUT_IMGW,
+                  sample_frames=DEFAULT_SAMPLE_FRAMES, geometry=None, memory_limit=INTERPOLATION_MEMORY_LIMIT,
+                  seed=0, grid_size=DEFAULT_GRID_SIZE, preview_grid_size=None) -> dict:
+    """
+    Times stages of the heatmap pipeline on synthetic stations for every combination of number of
+    points and number of frames.
+
+    fetch, encode (animated GIF and WebP) and persist run on all frames, stages of a single frame
+    run on sample_frames frames per number of points and are multiplied by the number of frames.
+    Keys of results other than of the default grid name the grid, e.g. imgw-60p-24f-g250-preview100.
+
+    :return: benchmark result, see solarmeteo.benchmark.baseline
+    """
+    creator = benchmark_creator(geometry, grid_size, preview_grid_size)
+    suffix = (f'-g{grid_size}' if grid_size != DEFAULT_GRID_SIZE else '') + \
+        (f'-preview{preview_grid_size}' if preview_grid_size is not None else '')
+    results = dict()
+
+    for count in points:
+        lons, lats, names = synthetic_stations(count, layout, seed)
+        with tempfile.TemporaryDirectory() as directory:
+            db_url = create_database(directory, lons, lats, names, max(frames), seed)
+            provider = DataProvider(db_url)
+
+            sampled = provider.provide_stations_by_datetimes('temperature', datetimes(min(sample_frames, max(frames))))
+            per_frame, images = time_frame_stages(creator, sampled, memory_limit)
+
+            for frame_count in frames:
+                frame_datetimes = datetimes(frame_count)
+                stages = dict()
+
+                stages['fetch'], _ = _timed(provider.provide_stations_by_datetimes, 'temperature', frame_datetimes)
+                for stage in FRAME_STAGES:
+                    stages[stage] = per_frame[stage] * frame_count if per_frame[stage] is not None else None
+
+                # images of sampled frames stand for the others
+                frame_images = [images[index % len(images)] for index in range(frame_count)]
+                gif_seconds, _ = _timed(write_gif, os.path.join(directory, 'benchmark.gif'), frame_images)
+                webp_seconds, _ = _timed(write_webp, os.path.join(directory, 'benchmark.webp'), frame_images)
+                stages['encode'] = gif_seconds + webp_seconds
+
+                # frame type of its own, so frames are inserted, not overwritten
+                stages['persist'], _ = _timed(provider.store_frames, f'benchmark_{frame_count}',
+                                              dict(zip(frame_datetimes, frame_images)))
+
+                key = f'{layout}-{count}p-{frame_count}f{suffix}'
+                results[key] = {
+                    'layout': layout,
+                    'points': count,
+                    'frames': frame_count,
+                    'sampled_frames': len(images),
+                    'stages': stages,
+                    'total': sum(seconds for seconds in stages.values() if seconds is not None),
+                    'skipped': [stage for stage, seconds in stages.items() if seconds is None],
+                }
+                logger.info(f"{key}: " + ", ".join(
+                    f"{stage}={seconds:.3f}s" if seconds is not None else f"{stage}=skipped"
+                    for stage, seconds in stages.items()))
+
+    return {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'results': results,
+    }
@@ -0,0 +1,137 @@
+###
+# SolarMeteo    : https://github.com/pa810p/solarmeteo
+# Author        : Pawel Prokop
+# License       : GNU GENERAL PUBLIC LICENSE v3
+###
+
+import os
+from datetime import datetime, timedelta
+
+import geopandas as gpd
+import numpy as np
+import shapely
+from shapely.geometry import Polygon
+from sqlalchemy import create_engine, insert
+
+from solarmeteo.heatmap.geometry_store import from_geodataframe
+from solarmeteo.heatmap.station_geometry import CRS_LATLON
+from solarmeteo.model import Base
+from solarmeteo.model.frame import Frame
+from solarmeteo.model.station import Station
+from solarmeteo.model.station_data import StationData
+
+LAYOUT_IMGW = 'imgw'
+LAYOUT_ESA = 'esa'
+
+START = datetime(2025, 1, 1)
+
+# rough outline of Poland, good enough to place stations and mask the grid
+POLAND_OUTLINE = [
+    (14.2, 53.9), (16.0, 54.25), (17.7, 54.8), (18.8, 54.35), (19.6, 54.45), (22.8, 54.4), (23.5, 53.9),
+    (23.9, 52.7), (23.6, 51.5), (24.1, 50.8), (22.6, 49.1), (21.0, 49.4), (19.9, 49.2), (18.8, 49.5),
+    (17.0, 50.2), (16.3, 50.65), (15.0, 51.0), (14.8, 51.9), (14.6, 52.6), (14.2, 53.2),
+]
+
+CITIES = {
+    'Warszawa': (21.01, 52.23), 'Kraków': (19.94, 50.06), 'Łódź': (19.46, 51.76), 'Wrocław': (17.04, 51.11),
+    'Poznań': (16.93, 52.41), 'Gdańsk': (18.65, 54.35), 'Szczecin': (14.55, 53.43), 'Lublin': (22.57, 51.25),
+    'Białystok': (23.16, 53.13), 'Katowice': (19.02, 50.26), 'Rzeszów': (22.0, 50.04), 'Olsztyn': (20.49, 53.78),
+    'Zielona Góra': (15.5, 51.94), 'Suwałki': (22.93, 54.1), 'Zakopane': (19.95, 49.3),
+}
+
+# share of ESA-like sensors placed around cities, the rest is spread over the country
+_CLUSTERED = 0.8
+_CLUSTER_SPREAD = 0.08
+
+
+def synthetic_geometry():
+    """
+    Geometry in the form HeatmapCreator expects it (PolandGeometry of a single region), so benchmarks
+    run without downloading borders.
+    """
+    return from_geodataframe(gpd.GeoDataFrame(geometry=[Polygon(POLAND_OUTLINE)], crs=CRS_LATLON))
+
+
+def _inside(rng, count, outline):
+    lons, lats = np.empty(0), np.empty(0)
+    min_lon, min_lat, max_lon, max_lat = outline.bounds
+    while len(lons) < count:
+        candidate_lons = rng.uniform(min_lon, max_lon, count * 2)
+        candidate_lats = rng.uniform(min_lat, max_lat, count * 2)
+        inside = shapely.contains_xy(outline, candidate_lons, candidate_lats)
+        lons = np.concatenate([lons, candidate_lons[inside]])
+        lats = np.concatenate([lats, candidate_lats[inside]])
+    return lons[:count], lats[:count]
+
+
+def synthetic_stations(count, layout=LAYOUT_IMGW, seed=0):
+    """
+    Generates stations over Poland. IMGW-like stations are spread evenly, ESA-like sensors are
+    clustered around cities. The first stations are placed in cities and named after them, so city
+    labels are rendered as in production.
+
+    :return: tuple of arrays (lons, lats, names)
+    """
+    rng = np.random.default_rng(seed)
+    outline = Polygon(POLAND_OUTLINE)
+
+    cities = list(CITIES.items())[:count]
+    names = [name for name, _ in cities] + [f'S{index}' for index in range(len(cities), count)]
+    lons = [lon for _, (lon, _) in cities]
+    lats = [lat for _, (_, lat) in cities]
+
+    remaining = count - len(cities)
+    clustered = int(remaining * _CLUSTERED) if layout == LAYOUT_ESA else 0
+    centers = rng.integers(0, len(CITIES), clustered)
+    city_coordinates = np.array(list(CITIES.values()))
+    cluster_lons = city_coordinates[centers, 0] + rng.normal(0, _CLUSTER_SPREAD, clustered)
+    cluster_lats = city_coordinates[centers, 1] + rng.normal(0, _CLUSTER_SPREAD, clustered)
+    spread_lons, spread_lats = _inside(rng, remaining - clustered, outline)
+
+    return (np.concatenate([lons, cluster_lons, spread_lons]),
+            np.concatenate([lats, cluster_lats, spread_lats]),
+            np.array(names, dtype=object))
+
+
+def synthetic_temperatures(lons, lats, hour, seed=0):
+    """
+    Smooth temperature field with a daily cycle and a little noise of sensors.
+    """
+    rng = np.random.default_rng(seed + hour)
+    return (12.0 + 6.0 * np.sin(np.radians(hour * 15.0)) - 2.0 * (lats - 52.0) + 0.5 * np.cos(lons)
+            + rng.normal(0, 0.5, len(lons)))
+
+
+def datetimes(frames):
+    """
+    Hourly datetimes of frames, newest first as provided by DataProvider.get_last_datetimes.
+    """
+    return [START + timedelta(hours=hour) for hour in reversed(range(frames))]
+
+
+def create_database(directory, lons, lats, names, frames, seed=0) -> str:
+    """
+    Creates SQLite database of synthetic IMGW tables with temperatures of given number of frames.
+
+    :return: database url
+    """
+    db_url = 'sqlite:///' + os.path.join(directory, 'benchmark.db')
+    engine = create_engine(db_url)
+    for metadata in (Station.metadata, StationData.metadata, Frame.metadata, Base.metadata):
+        metadata.create_all(engine)
+
+    with engine.begin() as connection:
+        connection.execute(insert(Station.__table__), [
+            {'id': index + 1, 'name': name, 'imgw_id': index + 1, 'longitude': float(lon), 'latitude': float(lat)}
+            for index, (lon, lat, name) in enumerate(zip(lons, lats, names))
+        ])
+        for hour in range(frames):
+            temperatures = synthetic_temperatures(lons, lats, hour, seed)
+            connection.execute(insert(StationData.__table__), [
+                {'station_id': index + 1, 'datetime': START + timedelta(hours=hour),
+                 'temperature': float(temperature)}
+                for index, temperature in enumerate(temperatures)
+            ])
+
+    engine.dispose()
+    return db_url
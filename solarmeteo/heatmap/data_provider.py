@@ -1,23 +1,97 @@
 import base64
+import threading
+from bisect import bisect_left
 import zlib
 from dataclasses import dataclass
+from datetime import datetime, timedelta
 from operator import and_
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 
 from logging import getLogger
 
 import numpy as np
 
-from sqlalchemy import create_engine, select, func, delete
+from sqlalchemy import select, func, delete, case
 from sqlalchemy.orm import sessionmaker
 
-from solarmeteo.model import EsaStationData, EsaStation
+from solarmeteo.heatmap.spatial_binning import GridBinner, STATISTIC_MEDIAN, deduplicate
+from solarmeteo.heatmap.station_geometry import ProjectionCache
+from solarmeteo.metrics import metrics
+from solarmeteo.model import EsaStationData, EsaStation, GiosStation, GiosStationData, Parameter
+from solarmeteo.model.database import get_engine, time_bucket
 from solarmeteo.model.frame import FrameType, Frame
+from solarmeteo.model.observed_datetime import ObservedDatetime, SOURCE_IMGW, SOURCE_ESA, SOURCE_GIOS
+from solarmeteo.model.rollup import Rollup, RESOLUTIONS, ROLLUP_RESOLUTIONS, bucket_start
 from solarmeteo.model.station import Station
 from solarmeteo.model.station_data import StationData
 
 logger = getLogger("solarmeteo")
 
+# size of time buckets ESA measurements are aggregated in
+ESA_BUCKET_MINUTES = 60
+# number of cached (column, bucket) aggregates
+ESA_BUCKET_CACHE_SIZE = 4096
+# size of grid cells ESA sensors are binned to, 0 averages sensors per city
+ESA_GRID_KM = 5
+
+_EPOCH = datetime(1970, 1, 1)
+
+_esa_bucket_cache = OrderedDict()
+_esa_bucket_cache_lock = threading.Lock()
+
+_grid_binners = dict()
+_grid_binners_lock = threading.Lock()
+
+# names of gios_parameter rows, GIOS heatmap types are gios_{parameter}
+GIOS_PARAMETERS = ('pm10', 'pm25', 'no2', 'o3', 'so2')
+
+_gios_stations = dict()
+_gios_parameters = dict()
+_gios_cache_lock = threading.Lock()
+
+# sources fused per variable, the first one gives datetimes of frames, fused heatmap types are fused_{variable}
+FUSION_SOURCES = {
+    'temperature': (SOURCE_IMGW, SOURCE_ESA),
+    'humidity': (SOURCE_IMGW, SOURCE_ESA),
+    'pressure': (SOURCE_IMGW, SOURCE_ESA),
+    'pm10': (SOURCE_ESA, SOURCE_GIOS),
+    'pm25': (SOURCE_ESA, SOURCE_GIOS),
+}
+# weights of sources when co-located points are merged, crowd-sourced ESA sensors are trusted less than
+# IMGW stations, GIOS indices (midpoints of concentration ranges, not measurements) least of all
+FUSION_WEIGHTS = {SOURCE_IMGW: 1.0, SOURCE_ESA: 0.5, SOURCE_GIOS: 0.2}
+# points of different sources closer than that are merged
+FUSION_DEDUP_KM = 1
+# GIOS provides indices only, they are fused as midpoints of concentration ranges (µg/m³) of index levels 0-5
+GIOS_INDEX_CONCENTRATIONS = {
+    'pm10': (10.0, 35.0, 65.0, 95.0, 130.0, 175.0),
+    'pm25': (6.5, 24.0, 45.0, 65.0, 92.5, 130.0),
+}
+
+_source_geometry = dict()
+_source_geometry_lock = threading.Lock()
+
+
+def source_geometry(source) -> ProjectionCache:
+    """
+    Returns process wide projected coordinates of stations of a source.
+    """
+    with _source_geometry_lock:
+        if source not in _source_geometry:
+            _source_geometry[source] = ProjectionCache()
+        return _source_geometry[source]
+
+
+def grid_binner(cell_km, statistic=STATISTIC_MEDIAN) -> GridBinner:
+    """
+    Returns process wide binner of given cell size, so sensor cell assignment is computed once per sensor.
+    """
+    with _grid_binners_lock:
+        key = (cell_km, statistic)
+        if key not in _grid_binners:
+            _grid_binners[key] = GridBinner(cell_km, statistic)
+        return _grid_binners[key]
+
 @dataclass
 class StationValue:
     lon: np.float64
@@ -29,9 +103,48 @@ class StationValue:
 class StationWindValue(StationValue):
     direction: np.int16
 
+@dataclass
+class GiosColumns:
+    """
+    Pivoted GIOS measurements, one row per datetime and station, nan where a parameter was not measured.
+    """
+    datetimes: np.ndarray
+    station_ids: np.ndarray
+    values: dict
+
+@dataclass
+class FusedPoints:
+    """
+    Points of all sources of a variable in one frame, after co-located points were merged.
+    """
+    lons: np.ndarray
+    lats: np.ndarray
+    values: np.ndarray
+    weights: np.ndarray
+    sources: np.ndarray
+    names: np.ndarray
+
+    def __len__(self):
+        return len(self.values)
+
+    def stations(self) -> list:
+        return [StationValue(lon, lat, value, name)
+                for lon, lat, value, name in zip(self.lons, self.lats, self.values, self.names)]
+
+@dataclass
+class RollupValue:
+    bucket: datetime
+    key: object
+    count: int
+    mean: float
+    min: float
+    max: float
+
 
 class DataProvider:
 
+    # data source of observed_datetime table
+    source = SOURCE_IMGW
 
     def __init__(self, meteo_db_url, last=1, from_time=None, until_time=None):
         self.meteo_db_url = meteo_db_url
@@ -44,26 +157,30 @@ class DataProvider:
         """
         Creates connection to database
         """
-        engine = create_engine(self.meteo_db_url)
-        return engine.connect()
+        return get_engine(self.meteo_db_url).connect()
 
     def create_session(self):
         """
-        Creates a database session
+        Creates a database session using shared connection pool
         """
-        session = sessionmaker(bind=self.create_connection())
+        session = sessionmaker(bind=get_engine(self.meteo_db_url))
         return session()
 
 
     def get_last_datetimes(self, last):
+        """
+        Returns last measurement datetimes of provider's source, newest first. Datetimes are read
+        from observed_datetime table so the cost does not grow with the history of measurements.
+        """
         session = self.create_session()
 
-        latest_datetimes = session.execute(
-            select(StationData.datetime)
-            .distinct()
-            .order_by(StationData.datetime.desc())
-            .limit(last)
-        ).scalars().all()
+        with metrics.timer('query.last_datetimes'):
+            latest_datetimes = session.execute(
+                select(ObservedDatetime.datetime)
+                .where(ObservedDatetime.source == self.source)
+                .order_by(ObservedDatetime.datetime.desc())
+                .limit(last)
+            ).scalars().all()
 
         session.close()
         return latest_datetimes
@@ -140,23 +257,24 @@ class DataProvider:
         # Dynamically get the column from StationData
         data_column = getattr(StationData, column)
 
-        results = session.execute(
-            select(
-                StationData.datetime,
-                Station.longitude,
-                Station.latitude,
-                data_column,
-                Station.name
-            )
-            .join(Station, Station.id == StationData.station_id)
-            .where(
-                and_(
-                    StationData.datetime.in_(datetimes),
-                    data_column.isnot(None)
+        with metrics.timer('query.imgw'):
+            results = session.execute(
+                select(
+                    StationData.datetime,
+                    Station.longitude,
+                    Station.latitude,
+                    data_column,
+                    Station.name
                 )
-            )
-            .order_by(StationData.datetime.desc())
-        ).all()
+                .join(Station, Station.id == StationData.station_id)
+                .where(
+                    and_(
+                        StationData.datetime.in_(datetimes),
+                        data_column.isnot(None)
+                    )
+                )
+                .order_by(StationData.datetime.desc())
+            ).all()
 
         session.close()
 
@@ -196,12 +314,13 @@ class DataProvider:
             return None
 
         session = self.create_session()
-        result = ((session.query(Frame.datetime, Frame.body, Frame.dtype, Frame.shape)
-                   .join(FrameType))
-        .filter(
-            FrameType.name == heatmap,
-            Frame.datetime.in_(datetimes)
-        )).all()
+        with metrics.timer('query.frames'):
+            result = ((session.query(Frame.datetime, Frame.body, Frame.dtype, Frame.shape)
+                       .join(FrameType))
+            .filter(
+                FrameType.name == heatmap,
+                Frame.datetime.in_(datetimes)
+            )).all()
 
         session.close()
 
@@ -278,7 +397,8 @@ class DataProvider:
                 )
                 session.add(new_frame)
 
-        session.commit()
+        with metrics.timer('query.store_frames'):
+            session.commit()
         session.close()
 
 
@@ -388,65 +508,169 @@ class WindProvider(DataProvider):
 
 
 class ESAProvider(DataProvider):
+    """
+    ESA sensors report at irregular timestamps, so their measurements are aggregated per city in
+    time buckets of bucket_minutes aligned to full intervals. Frames datetimes are beginnings of
+    the buckets. Aggregates of complete buckets (older than the bucket of the latest measurement)
+    are cached within the process, so animations query only buckets not seen before. Rows arriving
+    late for a cached bucket drop it from the cache (see invalidate_esa_buckets).
 
-    def __init__(self, meteo_db_url, last=1):
-        super().__init__(meteo_db_url, last)
+    With grid_km set, readings of sensors are binned into grid cells of that size (see GridBinner)
+    instead of being averaged per city, otherwise there is one point per city.
+    """
 
-    def get_last_datetimes(self, last):
-        session = self.create_session()
+    source = SOURCE_ESA
 
-        latest_datetimes = session.execute(
-            select(EsaStationData.datetime)
-            .distinct()
-            .order_by(EsaStationData.datetime.desc())
-            .limit(last)
-        ).scalars().all()
+    def __init__(self, meteo_db_url, last=1, bucket_minutes=ESA_BUCKET_MINUTES, grid_km=ESA_GRID_KM,
+                 grid_statistic=STATISTIC_MEDIAN):
+        super().__init__(meteo_db_url, last)
+        self.bucket_minutes = bucket_minutes
+        self.bucket = timedelta(minutes=bucket_minutes)
+        self.grid_km = grid_km
+        self.grid_statistic = grid_statistic
 
-        session.close()
+    def align(self, value):
+        """
+        Returns beginning of the bucket containing given datetime.
+        """
+        return _EPOCH + ((value - _EPOCH) // self.bucket) * self.bucket
 
-        return latest_datetimes
+    def get_last_datetimes(self, last):
+        """
+        Returns beginnings of last buckets, newest first, ending with the bucket of the latest measurement.
+        """
+        latest = super().get_last_datetimes(1)
+        if not latest:
+            return []
+        newest = self.align(latest[0])
+        return [newest - index * self.bucket for index in range(last)]
 
-    def provide_stations_by_datetimes(self, column, datetimes):
+    def _query_buckets(self, column, from_time, until_time) -> dict:
         session = self.create_session()
 
         data_column = getattr(EsaStationData, column)
+        bucket = time_bucket(EsaStationData.datetime, self.bucket_minutes, session.get_bind().dialect.name)
 
-        query = (
-            select(
-                EsaStationData.datetime,
-                func.avg(EsaStation.longitude).label("avg_longitude"),
-                func.avg(EsaStation.latitude).label("avg_latitude"),
-                func.avg(data_column).label("value"),
-                EsaStation.city
+        if self.grid_km:
+            # readings of every sensor, binned to grid cells below
+            query = (
+                select(
+                    bucket.label("bucket"),
+                    EsaStation.id,
+                    EsaStation.longitude,
+                    EsaStation.latitude,
+                    func.avg(data_column).label("value"),
+                    EsaStation.city
+                )
+                .join(EsaStationData.station)
+                .where(EsaStationData.datetime >= from_time, EsaStationData.datetime < until_time)
+                .group_by(EsaStation.id, bucket)
+            )
+        else:
+            query = (
+                select(
+                    bucket.label("bucket"),
+                    func.avg(EsaStation.longitude).label("avg_longitude"),
+                    func.avg(EsaStation.latitude).label("avg_latitude"),
+                    func.avg(data_column).label("value"),
+                    EsaStation.city
+                )
+                .join(EsaStationData.station)  # Join the tables via relationship
+                .where(EsaStationData.datetime >= from_time, EsaStationData.datetime < until_time)
+                .group_by(EsaStation.city, bucket)  # Group by city and bucket
+                .order_by(EsaStation.city, bucket)
             )
-            .join(EsaStationData.station)  # Join the tables via relationship
-            .where(EsaStationData.datetime.in_(datetimes))
-            .group_by(EsaStation.city, EsaStationData.datetime)  # Group by city and datetime
-            .order_by(EsaStation.city, EsaStationData.datetime)
-        )
 
-        results = session.execute(query).all()
+        with metrics.timer('query.esa'):
+            results = session.execute(query).all()
 
-        session.close_all()
+        session.close()
 
-        datetime_to_stations = defaultdict(list)
-        for datetime, avg_longitude, avg_latitude, value, city in results:
-            datetime_to_stations[datetime].append(
-                StationValue(np.float64(avg_longitude), np.float64(avg_latitude), np.float64(value), city)
-            )
+        bucket_to_stations = defaultdict(list)
+        if self.grid_km:
+            bucket_to_sensors = defaultdict(list)
+            for start, *sensor in results:
+                bucket_to_sensors[self.align(start)].append(sensor)
+            binner = grid_binner(self.grid_km, self.grid_statistic)
+            for start, sensors in bucket_to_sensors.items():
+                for lon, lat, value, name in binner.bin(*zip(*sensors)):
+                    bucket_to_stations[start].append(
+                        StationValue(np.float64(lon), np.float64(lat), np.float64(value), name))
+        else:
+            for start, avg_longitude, avg_latitude, value, city in results:
+                bucket_to_stations[self.align(start)].append(
+                    StationValue(np.float64(avg_longitude), np.float64(avg_latitude), np.float64(value), city)
+                )
+        return bucket_to_stations
+
+    def provide_stations_by_datetimes(self, column, datetimes):
+        buckets = sorted({self.align(date_time) for date_time in datetimes})
+        if not buckets:
+            return []
+
+        latest = super().get_last_datetimes(1)
+        complete_before = self.align(latest[0]) if latest else None
+
+        bucket_to_stations = dict()
+        missing = []
+        with _esa_bucket_cache_lock:
+            for bucket in buckets:
+                key = (self.meteo_db_url, column, self.bucket_minutes, self.grid_km, self.grid_statistic, bucket)
+                if key in _esa_bucket_cache:
+                    _esa_bucket_cache.move_to_end(key)
+                    bucket_to_stations[bucket] = _esa_bucket_cache[key]
+                else:
+                    missing.append(bucket)
+
+        if missing:
+            # one grouped query over the range of all missing buckets
+            logger.debug(f"Query {len(missing)} {column} buckets of {self.bucket_minutes} minutes")
+            queried = self._query_buckets(column, missing[0], missing[-1] + self.bucket)
+            with _esa_bucket_cache_lock:
+                for bucket in missing:
+                    bucket_to_stations[bucket] = queried.get(bucket, [])
+                    if complete_before is not None and bucket < complete_before:
+                        _esa_bucket_cache[(self.meteo_db_url, column, self.bucket_minutes, self.grid_km, self.grid_statistic, bucket)] = \
+                            bucket_to_stations[bucket]
+                while len(_esa_bucket_cache) > ESA_BUCKET_CACHE_SIZE:
+                    _esa_bucket_cache.popitem(last=False)
 
         sorted_map = sorted(
-            datetime_to_stations.items(),
+            ((bucket, stations) for bucket, stations in bucket_to_stations.items() if stations),
             key=lambda x: x[0],
             reverse=True
         )
 
         return sorted_map
 
+def invalidate_esa_buckets(meteo_db_url, datetimes):
+    """
+    Drops cached aggregates of buckets containing datetimes of ESA measurements stored to meteo_db_url,
+    so rows arriving late for buckets already complete are included when the buckets are queried again.
+    """
+    datetimes = sorted(set(datetimes))
+    if not datetimes:
+        return
+
+    def touched(key):
+        url, _, bucket_minutes, _, _, bucket = key
+        index = bisect_left(datetimes, bucket)
+        return url == meteo_db_url and index < len(datetimes) \
+            and datetimes[index] < bucket + timedelta(minutes=bucket_minutes)
+
+    with _esa_bucket_cache_lock:
+        stale = [key for key in _esa_bucket_cache if touched(key)]
+        for key in stale:
+            del _esa_bucket_cache[key]
+    if stale:
+        logger.debug(f"Invalidated {len(stale)} cached ESA buckets")
+
+
 class PM10Provider(ESAProvider):
 
-    def __init__(self, meteo_db_url, last=1):
-        super().__init__(meteo_db_url, last)
+    def __init__(self, meteo_db_url, last=1, bucket_minutes=ESA_BUCKET_MINUTES, grid_km=ESA_GRID_KM,
+                 grid_statistic=STATISTIC_MEDIAN):
+        super().__init__(meteo_db_url, last, bucket_minutes, grid_km, grid_statistic)
 
     def provide_stations_by_datetimes(self, datetimes=None):
         return super().provide_stations_by_datetimes(column="pm10", datetimes=datetimes)
@@ -457,8 +681,9 @@ class PM10Provider(ESAProvider):
 
 class PM25Provider(ESAProvider):
 
-    def __init__(self, meteo_db_url, last=1):
-        super().__init__(meteo_db_url, last)
+    def __init__(self, meteo_db_url, last=1, bucket_minutes=ESA_BUCKET_MINUTES, grid_km=ESA_GRID_KM,
+                 grid_statistic=STATISTIC_MEDIAN):
+        super().__init__(meteo_db_url, last, bucket_minutes, grid_km, grid_statistic)
 
     def provide_stations_by_datetimes(self, datetimes=None):
         return super().provide_stations_by_datetimes(column="pm25", datetimes=datetimes)
@@ -467,3 +692,303 @@ class PM25Provider(ESAProvider):
         return super().provide_frames_by_type_and_datetimes("pm25", datetimes)
 
 
+
+class GiosProvider(DataProvider):
+    """
+    GIOS air quality indices (0 very good - 5 very bad) of one parameter. Measurements are stored
+    one row per station, parameter and datetime, provide_columns pivots all parameters of given
+    datetimes in a single query into columnar arrays. Coordinates of stations and ids of parameters
+    are cached within the process.
+    """
+
+    source = SOURCE_GIOS
+
+    def __init__(self, meteo_db_url, last=1, parameter='pm10'):
+        if parameter not in GIOS_PARAMETERS:
+            raise ValueError(f"Unsupported GIOS parameter: {parameter}")
+        super().__init__(meteo_db_url, last)
+        self.parameter = parameter
+        self.heatmap = f"gios_{parameter}"
+
+    def parameter_ids(self) -> dict:
+        """
+        Returns parameter name -> gios_parameter id.
+        """
+        with _gios_cache_lock:
+            parameter_ids = _gios_parameters.get(self.meteo_db_url)
+        if parameter_ids is None:
+            session = self.create_session()
+            parameter_ids = dict(session.execute(select(Parameter.name, Parameter.id)).all())
+            session.close()
+            if parameter_ids:
+                with _gios_cache_lock:
+                    _gios_parameters[self.meteo_db_url] = parameter_ids
+        return parameter_ids
+
+    def station_coordinates(self, station_ids):
+        """
+        Returns arrays of longitudes, latitudes (nan when unknown) and names of given stations,
+        stations are reloaded only when one of them is not cached yet.
+        """
+        with _gios_cache_lock:
+            stations = _gios_stations.get(self.meteo_db_url, {})
+            missing = any(station_id not in stations for station_id in station_ids)
+        if missing:
+            session = self.create_session()
+            rows = session.execute(
+                select(GiosStation.id, GiosStation.longitude, GiosStation.latitude, GiosStation.station_name)).all()
+            session.close()
+            stations = {station_id: (lon, lat, name) for station_id, lon, lat, name in rows}
+            with _gios_cache_lock:
+                _gios_stations[self.meteo_db_url] = stations
+
+        unknown = (None, None, None)
+        coordinates = [stations.get(station_id, unknown) for station_id in station_ids]
+        lons = np.array([lon for lon, _, _ in coordinates], dtype=np.float64)
+        lats = np.array([lat for _, lat, _ in coordinates], dtype=np.float64)
+        names = np.array([name for _, _, name in coordinates], dtype=object)
+        return lons, lats, names
+
+    def provide_columns(self, datetimes) -> GiosColumns:
+        """
+        Provides indices of all parameters for given datetimes in one query grouped by datetime
+        and station, each parameter becomes a column.
+        """
+        parameter_ids = self.parameter_ids()
+        names = [name for name in GIOS_PARAMETERS if name in parameter_ids]
+
+        rows = []
+        if datetimes and names:
+            session = self.create_session()
+            with metrics.timer('query.gios'):
+                rows = session.execute(
+                    select(
+                        GiosStationData.datetime,
+                        GiosStationData.gios_station_id,
+                        *[func.max(case((GiosStationData.parameter_id == parameter_ids[name], GiosStationData.value)))
+                          .label(name) for name in names]
+                    )
+                    # negative index means the index could not be computed
+                    .where(GiosStationData.datetime.in_(datetimes), GiosStationData.value >= 0)
+                    .group_by(GiosStationData.datetime, GiosStationData.gios_station_id)
+                    .order_by(GiosStationData.datetime.desc(), GiosStationData.gios_station_id)
+                ).all()
+            session.close()
+
+        columns = list(zip(*rows)) if rows else [()] * (len(names) + 2)
+        values = {name: np.full(len(rows), np.nan) for name in GIOS_PARAMETERS}
+        values.update({name: np.array(column, dtype=np.float64) for name, column in zip(names, columns[2:])})
+        return GiosColumns(datetimes=np.array(columns[0], dtype=object),
+                           station_ids=np.array(columns[1], dtype=np.int64),
+                           values=values)
+
+    def provide_stations_by_datetimes(self, datetimes=None):
+        columns = self.provide_columns(datetimes)
+
+        values = columns.values[self.parameter]
+        lons, lats, names = self.station_coordinates(columns.station_ids)
+        measured = ~np.isnan(values) & ~np.isnan(lons) & ~np.isnan(lats)
+
+        datetime_to_stations = defaultdict(list)
+        for date_time, lon, lat, value, name in zip(columns.datetimes[measured], lons[measured], lats[measured],
+                                                    values[measured], names[measured]):
+            datetime_to_stations[date_time].append(StationValue(lon, lat, value, name))
+
+        sorted_map = sorted(
+            datetime_to_stations.items(),
+            key=lambda x: x[0],
+            reverse=True
+        )
+
+        return sorted_map
+
+    def provide_frames_by_type_and_datetimes(self, datetimes = None):
+        return super().provide_frames_by_type_and_datetimes(self.heatmap, datetimes)
+
+
+class FusionProvider(DataProvider):
+    """
+    Merges points of all sources measuring a variable (see FUSION_SOURCES) into one point set per
+    frame, e.g. IMGW stations and ESA sensors for temperature. Every source is queried once for
+    all requested datetimes. Points of different sources closer than dedup_km are merged into one
+    by weighted average (weights per source), so denser input does not mean duplicated points for
+    interpolation. Projected coordinates of stations are cached per source.
+
+    Datetimes of frames are those of the first source, ESA buckets are aligned to them.
+    """
+
+    def __init__(self, meteo_db_url, last=1, variable='temperature', weights=None, dedup_km=FUSION_DEDUP_KM,
+                 esa_bucket_minutes=ESA_BUCKET_MINUTES, esa_grid_km=ESA_GRID_KM, esa_grid_statistic=STATISTIC_MEDIAN):
+        if variable not in FUSION_SOURCES:
+            raise ValueError(f"Unsupported fused variable: {variable}")
+        super().__init__(meteo_db_url, last)
+        self.variable = variable
+        self.heatmap = f"fused_{variable}"
+        self.sources = FUSION_SOURCES[variable]
+        self.source = self.sources[0]
+        self.weights = FUSION_WEIGHTS | (weights or {})
+        self.dedup_km = dedup_km
+
+        self.providers = dict()
+        for source in self.sources:
+            match source:
+                case 'imgw': self.providers[source] = DataProvider(meteo_db_url, last)
+                case 'esa': self.providers[source] = ESAProvider(meteo_db_url, last, esa_bucket_minutes,
+                                                                 esa_grid_km, esa_grid_statistic)
+                case 'gios': self.providers[source] = GiosProvider(meteo_db_url, last, variable)
+
+    def get_last_datetimes(self, last):
+        return self.providers[self.source].get_last_datetimes(last)
+
+    def _provide_source(self, source, datetimes) -> dict:
+        """
+        Returns datetime -> StationValue list of a source for given datetimes.
+        """
+        provider = self.providers[source]
+        match source:
+            case 'imgw':
+                return dict(provider.provide_stations_by_datetimes(self.variable, datetimes))
+            case 'esa':
+                buckets = dict(provider.provide_stations_by_datetimes(self.variable, datetimes))
+                return {date_time: buckets.get(provider.align(date_time), []) for date_time in datetimes}
+            case 'gios':
+                levels = np.array(GIOS_INDEX_CONCENTRATIONS[self.variable])
+                return {date_time: [StationValue(s.lon, s.lat, levels[min(int(s.value), len(levels) - 1)], s.name)
+                                    for s in stations]
+                        for date_time, stations in provider.provide_stations_by_datetimes(datetimes)}
+
+    def fuse(self, stations_by_source: dict) -> FusedPoints:
+        """
+        Merges StationValue lists of sources (source -> list) into one point set.
+        """
+        sources = [source for source, stations in stations_by_source.items() for _ in stations]
+        stations = [station for stations in stations_by_source.values() for station in stations]
+
+        lons = np.array([s.lon for s in stations], dtype=np.float64)
+        lats = np.array([s.lat for s in stations], dtype=np.float64)
+        values = np.array([s.value for s in stations], dtype=np.float64)
+        weights = np.array([self.weights[source] for source in sources], dtype=np.float64)
+        names = np.array([s.name for s in stations], dtype=object)
+        sources = np.array(sources, dtype=object)
+
+        x = np.empty(len(stations))
+        y = np.empty(len(stations))
+        for source in stations_by_source:
+            selected = sources == source
+            if selected.any():
+                x[selected], y[selected] = source_geometry(source).project(lons[selected], lats[selected])
+
+        kept, values, weights = deduplicate(x, y, values, weights, self.dedup_km * 1000.0, sources)
+        return FusedPoints(lons=lons[kept], lats=lats[kept], values=values, weights=weights,
+                           sources=sources[kept], names=names[kept])
+
+    def provide_points_by_datetimes(self, datetimes) -> dict:
+        """
+        :return: dict datetime -> FusedPoints, datetimes without any point are omitted
+        """
+        if not datetimes:
+            return dict()
+        by_source = {source: self._provide_source(source, datetimes) for source in self.sources}
+
+        points = dict()
+        for date_time in datetimes:
+            fused = self.fuse({source: by_source[source].get(date_time, []) for source in self.sources})
+            if len(fused):
+                points[date_time] = fused
+        return points
+
+    def provide_stations_by_datetimes(self, datetimes=None):
+        points = self.provide_points_by_datetimes(datetimes)
+        return sorted(
+            ((date_time, fused.stations()) for date_time, fused in points.items()),
+            key=lambda x: x[0],
+            reverse=True
+        )
+
+    def provide_frames_by_type_and_datetimes(self, datetimes = None):
+        return super().provide_frames_by_type_and_datetimes(self.heatmap, datetimes)
+
+
+class RollupProvider(DataProvider):
+    """
+    Provides aggregated measurements (count, mean, min, max) per station or city and time bucket
+    from rollup table instead of scanning raw measurements. The coarsest rollup able to answer
+    the requested range and resolution is read, e.g. monthly values of a year are combined from
+    month rollups, daily values of a year from day rollups.
+    """
+
+    def __init__(self, meteo_db_url, source):
+        super().__init__(meteo_db_url)
+        self.source = source
+
+    def select_resolution(self, resolution, from_time, until_time):
+        """
+        Returns the coarsest rollup resolution of the source not coarser than requested resolution
+        whose buckets align with the requested range.
+
+        Raises:
+            ValueError: when no rollup can answer the request (e.g. hourly imgw data, unaligned range).
+        """
+        if resolution not in RESOLUTIONS:
+            raise ValueError(f"Unsupported resolution: {resolution}")
+
+        candidates = [r for r in ROLLUP_RESOLUTIONS[self.source] if RESOLUTIONS.index(r) <= RESOLUTIONS.index(resolution)]
+        for candidate in reversed(candidates):
+            if bucket_start(from_time, candidate) == from_time and bucket_start(until_time, candidate) == until_time:
+                return candidate
+
+        raise ValueError(f"No {self.source} rollup for {resolution} resolution between {from_time} and {until_time}")
+
+    def provide_rollups(self, variable, resolution, from_time, until_time, station_ids=None, by_city=False) -> list:
+        """
+        Provides aggregates of a variable in buckets of requested resolution.
+
+        Args:
+            variable (str): measured variable, e.g. 'temperature', 'pm10'.
+            resolution (str): 'hour', 'day', 'month' or 'year'.
+            from_time (datetime): beginning of the range (inclusive).
+            until_time (datetime): end of the range (exclusive).
+            station_ids (list, optional): restricts result to given stations.
+            by_city (bool): aggregates esa stations of the same city.
+
+        Returns:
+            list: RollupValue objects sorted by bucket and key (station id or city).
+        """
+        rollup_resolution = self.select_resolution(resolution, from_time, until_time)
+        logger.debug(f"{self.source} {variable} {resolution} values from {rollup_resolution} rollups")
+
+        query = (
+            select(Rollup.bucket, Rollup.station_id, Rollup.count, Rollup.sum, Rollup.min, Rollup.max)
+            .where(Rollup.source == self.source,
+                   Rollup.resolution == rollup_resolution,
+                   Rollup.variable == variable,
+                   Rollup.bucket >= from_time,
+                   Rollup.bucket < until_time)
+        )
+        if station_ids is not None:
+            query = query.where(Rollup.station_id.in_(station_ids))
+
+        session = self.create_session()
+        try:
+            rows = session.execute(query).all()
+            cities = dict(session.execute(select(EsaStation.id, EsaStation.city)).all()) if by_city else None
+        finally:
+            session.close()
+
+        aggregates = dict()
+        for bucket, station_id, count, total, minimum, maximum in rows:
+            key = (bucket_start(bucket, resolution), cities.get(station_id) if by_city else station_id)
+            aggregate = aggregates.get(key)
+            if aggregate is None:
+                aggregates[key] = [count, total, minimum, maximum]
+            else:
+                aggregate[0] += count
+                aggregate[1] += total
+                aggregate[2] = min(aggregate[2], minimum)
+                aggregate[3] = max(aggregate[3], maximum)
+
+        return [
+            RollupValue(bucket, key, count, total / count, minimum, maximum)
+            for (bucket, key), (count, total, minimum, maximum)
+            in sorted(aggregates.items(), key=lambda item: (item[0][0], str(item[0][1])))
+        ]
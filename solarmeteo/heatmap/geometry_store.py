@@ -0,0 +1,229 @@
+###
+# SolarMeteo    : https://github.com/pa810p/solarmeteo
+# Author        : Pawel Prokop
+# License       : GNU GENERAL PUBLIC LICENSE v3
+###
+
+import hashlib
+import os
+import threading
+
+import numpy as np
+import shapely
+
+from solarmeteo.heatmap.station_geometry import CRS_LATLON, CRS_PROJECTED
+
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+GEOJSON_URL = "https://raw.githubusercontent.com/ppatrzyk/polska-geojson/master/wojewodztwa/wojewodztwa-medium.geojson"
+GEOJSON_LOCAL = "./data/wojewodztwa-medium.geojson"
+
+# tolerances (degrees) of simplified boundaries, the coarsest one not visible in rendered frames is drawn
+LEVELS_OF_DETAIL = {'thumbnail': 0.01, 'default': 0.004, 'high': 0.001}
+
+# version of the cache file layout, files of other versions are rebuilt
+_FORMAT = 2
+
+_geometries = dict()
+_geometries_lock = threading.Lock()
+
+
+class PolandGeometry:
+    """
+    Borders of Poland as used by heatmap creators: voivodeships in lat/lon, their union in projected CRS and
+    coordinates of voivodeship boundaries in lat/lon ready to be drawn as a line collection, in full detail
+    and simplified to LEVELS_OF_DETAIL. Masks of interpolation grids are computed once per grid.
+
+    Geometry loaded from a source file is pickled as a reference to it, so render workers load it from
+    the cache instead of receiving it with every frame.
+    """
+
+    def __init__(self, voivodeships, projected, boundaries, source=None, levels=None):
+        """
+        :param voivodeships: array of shapely geometries in lat/lon
+        :param projected: union of voivodeships in projected CRS
+        :param boundaries: list of (n, 2) arrays of lon, lat
+        :param source: GeoJSON file the geometry was loaded from
+        :param levels: level of detail -> simplified boundaries, computed when not given
+        """
+        self.voivodeships = voivodeships
+        self.projected = projected
+        self.boundaries = boundaries
+        self.source = source
+        self.levels = levels if levels is not None else {
+            level: simplified_boundaries(voivodeships, tolerance) for level, tolerance in LEVELS_OF_DETAIL.items()}
+        self._masks = dict()
+        self._masks_lock = threading.Lock()
+
+    @property
+    def latitudes(self) -> tuple:
+        """
+        :return: (min, max) latitude of boundaries
+        """
+        return (min(line[:, 1].min() for line in self.boundaries),
+                max(line[:, 1].max() for line in self.boundaries))
+
+    @property
+    def aspect(self) -> float:
+        """
+        Aspect of lat/lon axes correcting longitudes in the middle latitude of Poland (as geopandas plots).
+        """
+        return 1 / np.cos(np.radians(sum(self.latitudes) / 2))
+
+    def level_of_detail(self, height) -> str | None:
+        """
+        :param height: height of the map in pixels
+        :return: the coarsest level whose simplification stays within half a pixel, None for full detail
+        """
+        min_lat, max_lat = self.latitudes
+        pixel = (max_lat - min_lat) / height
+        levels = [level for level, tolerance in LEVELS_OF_DETAIL.items() if tolerance <= pixel / 2]
+        return max(levels, key=LEVELS_OF_DETAIL.get) if levels else None
+
+    def boundaries_for(self, height) -> list:
+        """
+        :param height: height of the map in pixels
+        :return: boundaries simplified to resolution of the map
+        """
+        level = self.level_of_detail(height)
+        return self.boundaries if level is None else self.levels[level]
+
+    def mask(self, xx, yy):
+        """
+        :return: read-only boolean array of grid points within Poland (with 1km buffer), borders are simplified
+            to half of a grid cell
+        """
+        key = (xx.shape, xx.flat[0], xx.flat[-1], yy.flat[0], yy.flat[-1])
+        with self._masks_lock:
+            mask = self._masks.get(key)
+        if mask is None:
+            cell = min(np.ptp(xx) / max(xx.shape[1] - 1, 1), np.ptp(yy) / max(yy.shape[0] - 1, 1))
+            poland = shapely.simplify(self.projected, cell / 2).buffer(1000)  # 1km buffer
+            shapely.prepare(poland)
+            mask = shapely.contains_xy(poland, xx, yy)
+            mask.setflags(write=False)
+            with self._masks_lock:
+                self._masks[key] = mask
+        return mask
+
+    def __reduce__(self):
+        if self.source is None:
+            return PolandGeometry, (self.voivodeships, self.projected, self.boundaries, None, self.levels)
+        return load_poland_geometry, (self.source,)
+
+
+def _boundary_lines(geometries) -> list:
+    return [np.asarray(line.coords)[:, :2] for line in shapely.get_parts(shapely.boundary(geometries))]
+
+
+def simplified_boundaries(voivodeships, tolerance) -> list:
+    return _boundary_lines(shapely.simplify(voivodeships, tolerance, preserve_topology=True))
+
+
+def from_geodataframe(gdf, source=None) -> PolandGeometry:
+    """
+    Builds geometry of GeoDataFrame of regions.
+    """
+    gdf = gdf.to_crs(CRS_LATLON)
+    voivodeships = np.asarray(gdf.geometry.values, dtype=object)
+    projected = gdf.to_crs(CRS_PROJECTED).geometry.union_all()
+    return PolandGeometry(voivodeships, projected, _boundary_lines(voivodeships), source)
+
+
+def _file_hash(path) -> str:
+    with open(path, 'rb') as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+
+def cache_path(path) -> str:
+    """
+    :return: path of the binary cache of GeoJSON file, named by hash of its content
+    """
+    directory, name = os.path.split(path)
+    return os.path.join(directory, f"{os.path.splitext(name)[0]}-{_file_hash(path)[:16]}.npz")
+
+
+def _pack_wkb(geometries):
+    wkb = shapely.to_wkb(geometries)
+    offsets = np.cumsum([0] + [len(item) for item in wkb])
+    return np.frombuffer(b''.join(wkb), dtype=np.uint8), offsets
+
+
+def _unpack_wkb(buffer, offsets):
+    data = buffer.tobytes()
+    return shapely.from_wkb([data[start:end] for start, end in zip(offsets[:-1], offsets[1:])])
+
+
+def _pack_lines(lines):
+    return np.concatenate(lines), np.cumsum([len(line) for line in lines])[:-1]
+
+
+def save(geometry, path):
+    voivodeships, voivodeship_offsets = _pack_wkb(geometry.voivodeships)
+    projected, _ = _pack_wkb([geometry.projected])
+    lines = {'boundaries': geometry.boundaries,
+             **{f'boundaries_{level}': boundaries for level, boundaries in geometry.levels.items()}}
+    packed = dict()
+    for name, boundaries in lines.items():
+        packed[name], packed[f'{name}_offsets'] = _pack_lines(boundaries)
+    with open(path, 'wb') as file:
+        np.savez(file, format=_FORMAT, voivodeships=voivodeships, voivodeship_offsets=voivodeship_offsets,
+                 projected=projected, **packed)
+
+
+def load(path, source=None) -> PolandGeometry:
+    with np.load(path) as data:
+        if int(data['format']) != _FORMAT:
+            raise ValueError(f"Unsupported geometry cache format: {int(data['format'])}")
+        return PolandGeometry(
+            voivodeships=_unpack_wkb(data['voivodeships'], data['voivodeship_offsets']),
+            projected=shapely.from_wkb(data['projected'].tobytes()),
+            boundaries=np.split(data['boundaries'], data['boundaries_offsets']),
+            source=source,
+            levels={level: np.split(data[f'boundaries_{level}'], data[f'boundaries_{level}_offsets'])
+                    for level in LEVELS_OF_DETAIL})
+
+
+def _download(url, path):
+    import requests
+    logger.info(f"Downloading borders of Poland from {url}")
+    response = requests.get(url)
+    response.raise_for_status()
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'wb') as file:
+        file.write(response.content)
+
+
+def _build(path) -> PolandGeometry:
+    if not os.path.exists(path):
+        _download(GEOJSON_URL, path)
+
+    cached = cache_path(path)
+    if os.path.exists(cached):
+        try:
+            return load(cached, source=path)
+        except Exception as e:
+            logger.warning(f"Rebuilding geometry cache {cached}: {e}")
+
+    import geopandas as gpd
+    logger.info(f"Building geometry cache {cached} of {path}")
+    geometry = from_geodataframe(gpd.read_file(path), source=path)
+    # written aside and renamed, so concurrent processes never read a partial file
+    temporary = f"{cached}.{os.getpid()}"
+    save(geometry, temporary)
+    os.replace(temporary, cached)
+    return geometry
+
+
+def load_poland_geometry(path=GEOJSON_LOCAL) -> PolandGeometry:
+    """
+    Returns borders of Poland of GeoJSON file (downloaded when missing). The file is parsed and
+    reprojected once, its binary cache is stored next to it and keyed by hash of its content. Loaded
+    geometry is shared by all creators of the process.
+    """
+    with _geometries_lock:
+        if path not in _geometries:
+            _geometries[path] = _build(path)
+        return _geometries[path]
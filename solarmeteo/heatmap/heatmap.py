@@ -1,17 +1,188 @@
-from concurrent.futures import ProcessPoolExecutor, as_completed
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from contextlib import nullcontext
 
 from solarmeteo.heatmap.data_provider import TemperatureProvider, PressureProvider, PrecipitationProvider, HumidityProvider, \
-    WindProvider, PM10Provider, PM25Provider
+    WindProvider, PM10Provider, PM25Provider, GiosProvider, FusionProvider, ESA_BUCKET_MINUTES, ESA_GRID_KM, \
+    FUSION_DEDUP_KM
+from solarmeteo.heatmap.spatial_binning import STATISTIC_MEDIAN
+from solarmeteo.heatmap.quality_control import quality_control, DEFAULT_NEIGHBOURS, DEFAULT_THRESHOLD, REASON_SPATIAL, \
+    REASON_HISTORY
 from solarmeteo.heatmap.heatmap_creator import TemperatureCreator, PressureCreator, PrecipitationCreator, HumidityCreator, \
-    WindCreator, PM10Creator, PM25Creator
+    WindCreator, PM10Creator, PM25Creator, GiosIndexCreator, DEFAULT_DPI, DEFAULT_GRID_SIZE
+from solarmeteo.metrics import metrics, profiler
+from solarmeteo.metrics.memory import MemoryTracker, rss_bytes, MB
 
 import imageio.v2 as imageio
 from datetime import datetime
 from logging import getLogger
-from PIL import Image
+import numpy as np
+from PIL import Image, GifImagePlugin
 
 logger = getLogger(__name__)
 
+def write_png(output_file, frame):
+    with metrics.timer('encode.png'):
+        imageio.imwrite(f"{output_file}", frame)
+
+
+class AnimationWriter:
+    """
+    Writes an animated GIF or WebP from frames appended in order of animation. Appended frames are
+    spooled to a temporary file, so neither rendered arrays nor images of the encoder are kept in memory
+    until the animation is complete. Frames are encoded on close, read back from the spool one at a time:
+    GIF frames are written as they are read (only the part changed since the previous frame), WebP frames
+    are handed to the encoder as images mapped on the spool.
+    """
+
+    # duration of a frame, the last WebP frame is displayed longer
+    DURATION = 300
+    LAST_DURATION = 3000
+
+    def __init__(self, output_file, file_format):
+        if file_format not in ('gif', 'webp'):
+            raise ValueError(f"Unsupported animation format: {file_format}")
+        self.output_file = output_file
+        self.file_format = file_format
+        self.count = 0
+        self._shapes = []
+        self._spool = None
+
+    def append(self, frame):
+        with metrics.timer(f'encode.{self.file_format}.append'):
+            if self._spool is None:
+                self._spool = tempfile.TemporaryFile(prefix='solarmeteo-frames-')
+            # spooled as RGBX which the encoders map without copying
+            height, width = frame.shape[:2]
+            rgbx = np.full((height, width, 4), 255, dtype=np.uint8)
+            rgbx[:, :, :3] = frame[:, :, :3]
+            self._spool.write(rgbx.data)
+            self._shapes.append((height, width))
+        self.count += 1
+
+    def _spooled(self):
+        """
+        Yields spooled frames as (height, width, 4) arrays mapped on the spool.
+        """
+        self._spool.flush()
+        offset = 0
+        for height, width in self._shapes:
+            yield np.memmap(self._spool, dtype=np.uint8, mode='r', offset=offset, shape=(height, width, 4))
+            offset += height * width * 4
+
+    def _write_gif(self, file):
+        previous = None
+        for frame in self._spooled():
+            rgb = frame[:, :, :3]
+            if previous is None:
+                image = Image.fromarray(np.ascontiguousarray(rgb)).quantize(256)
+                header, _ = GifImagePlugin.getheader(image, info={'loop': 0, 'duration': self.DURATION})
+                file.write(b''.join(header))
+                params, offset = dict(), (0, 0)
+            else:
+                # only the subrectangle changed since the previous frame is written, with its own palette
+                changed = np.any(rgb != previous, axis=2)
+                rows, columns = np.flatnonzero(changed.any(axis=1)), np.flatnonzero(changed.any(axis=0))
+                top, bottom = (rows[0], rows[-1] + 1) if rows.size else (0, 1)
+                left, right = (columns[0], columns[-1] + 1) if columns.size else (0, 1)
+                image = Image.fromarray(np.ascontiguousarray(rgb[top:bottom, left:right])).quantize(256)
+                params, offset = dict(include_color_table=True), (int(left), int(top))
+            file.write(b''.join(GifImagePlugin.getdata(image, offset, duration=self.DURATION, **params)))
+            previous = rgb
+        file.write(b';')
+
+    def _write_webp(self, file):
+        images = [Image.frombuffer('RGBX', (frame.shape[1], frame.shape[0]), frame, 'raw', 'RGBX', 0, 1)
+                  for frame in self._spooled()]
+        images[0].save(
+            file,
+            format='WEBP',
+            save_all=True,
+            append_images=images[1:],
+            duration=[self.DURATION] * (len(images) - 1) + [self.LAST_DURATION],
+            loop=0,
+            quality=85  # Adjust quality (0-100)
+        )
+
+    def close(self):
+        with metrics.timer(f'encode.{self.file_format}'):
+            if self.count == 0:
+                logger.error(f"No frames to write to {self.output_file}")
+            else:
+                with open(f"{self.output_file}", 'wb') as file:
+                    if self.file_format == 'gif':
+                        self._write_gif(file)
+                    else:
+                        self._write_webp(file)
+            if self._spool is not None:
+                self._spool.close()
+            self._spool = None
+            self._shapes = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+
+def write_gif(output_file, frames):
+    """
+    Writes frames (in order of animation) as an animated GIF.
+    """
+    with AnimationWriter(output_file, 'gif') as writer:
+        for frame in frames:
+            writer.append(frame)
+
+
+def write_webp(output_file, frames):
+    """
+    Writes frames (in order of animation) as an animated WebP, the last frame is displayed longer.
+    """
+    with AnimationWriter(output_file, 'webp') as writer:
+        for frame in frames:
+            writer.append(frame)
+
+
+class FrameSequence:
+    """
+    Passes frames completed in any order to consumer(datetime, frame) in chronological order, each frame
+    as soon as all earlier frames are done. Frames that failed to render are added as None and skipped.
+    """
+
+    def __init__(self, datetimes, consumer, frames=None):
+        """
+        :param datetimes: datetimes of all frames of the sequence
+        :param consumer: callable receiving (datetime, frame)
+        :param frames: dict of frames already available (e.g. cached), taken over by the sequence
+        """
+        self._order = sorted(set(datetimes) | set(frames or ()))
+        self._next = 0
+        self._pending = frames if frames is not None else dict()
+        self.consumer = consumer
+        self._release()
+
+    @property
+    def buffered(self):
+        """
+        Number of frames waiting for earlier frames.
+        """
+        return len(self._pending)
+
+    def add(self, datetime, frame):
+        self._pending[datetime] = frame
+        self._release()
+
+    def _release(self):
+        while self._next < len(self._order) and self._order[self._next] in self._pending:
+            datetime = self._order[self._next]
+            frame = self._pending.pop(datetime)
+            self._next += 1
+            if frame is not None:
+                self.consumer(datetime, frame)
+
+
 class CreatorFactory:
 
     @staticmethod
@@ -24,21 +195,34 @@ class CreatorFactory:
             case 'wind': return WindCreator()
             case 'pm10': return PM10Creator()
             case 'pm25': return PM25Creator()
+            case 'gios_pm10': return GiosIndexCreator('PM 10')
+            case 'gios_pm25': return GiosIndexCreator('PM 2.5')
+            case 'gios_no2': return GiosIndexCreator('NO2')
+            case 'gios_o3': return GiosIndexCreator('O3')
+            case 'gios_so2': return GiosIndexCreator('SO2')
+            case 'fused_temperature' | 'fused_humidity' | 'fused_pressure' | 'fused_pm10' | 'fused_pm25':
+                return CreatorFactory.creator(name.removeprefix('fused_'))
             case _: return None
 
 
 class ProviderFactory:
 
     @staticmethod
-    def provider(name, meteo_db_url, last):
+    def provider(name, meteo_db_url, last, esa_bucket_minutes=ESA_BUCKET_MINUTES, esa_grid_km=ESA_GRID_KM,
+                 esa_grid_statistic=STATISTIC_MEDIAN, fusion_weights=None, fusion_dedup_km=FUSION_DEDUP_KM):
         match name:
             case 'temperature': return TemperatureProvider(meteo_db_url, last)
             case 'pressure': return PressureProvider(meteo_db_url, last)
             case 'humidity' : return HumidityProvider(meteo_db_url, last)
             case 'precipitation': return PrecipitationProvider(meteo_db_url, last)
             case 'wind': return WindProvider(meteo_db_url, last)
-            case 'pm25': return PM25Provider(meteo_db_url, last)
-            case 'pm10': return PM10Provider(meteo_db_url, last)
+            case 'pm25': return PM25Provider(meteo_db_url, last, esa_bucket_minutes, esa_grid_km, esa_grid_statistic)
+            case 'pm10': return PM10Provider(meteo_db_url, last, esa_bucket_minutes, esa_grid_km, esa_grid_statistic)
+            case 'gios_pm10' | 'gios_pm25' | 'gios_no2' | 'gios_o3' | 'gios_so2':
+                return GiosProvider(meteo_db_url, last, name.removeprefix('gios_'))
+            case 'fused_temperature' | 'fused_humidity' | 'fused_pressure' | 'fused_pm10' | 'fused_pm25':
+                return FusionProvider(meteo_db_url, last, name.removeprefix('fused_'), fusion_weights, fusion_dedup_km,
+                                      esa_bucket_minutes, esa_grid_km, esa_grid_statistic)
             case _: return None
 
 
@@ -50,6 +234,8 @@ class HeatMap:
 
     Attributes:
         heatmaps (list): Supported heatmap types.
+        gios_heatmaps (list): Heatmap types of GIOS air quality indices.
+        fused_heatmaps (list): Heatmap types merging IMGW, ESA and GIOS points of a variable.
         display_labels (list): Labels for display on heatmaps.
         provider_classes (dict): Mapping of heatmap types to their data providers and creators.
 
@@ -64,18 +250,59 @@ class HeatMap:
         usedb (bool): Whether to use the database for persistence.
         persist (bool): Whether to persist generated frames.
         keep_frames (int): Number of last generated frames to be kept in database, older will be removed.
+        executor (Executor): Shared pool used for rendering, a private pool is created per run if not given.
+        esa_bucket_minutes (int): Size of time buckets ESA (pm10, pm25) frames are aggregated in.
+        esa_grid_km (float): Size of grid cells ESA sensors are binned to, 0 averages sensors per city.
+        esa_grid_statistic (str): Statistic of sensors in a cell, 'median' or 'trimmed_mean'.
+        qc (bool): Whether outlying readings are rejected before rendering.
+        qc_neighbours (int): Number of nearest neighbours a reading is compared with.
+        qc_threshold (float): Robust z-score above which a reading is rejected.
+        fusion_weights (dict): Weights of sources (imgw, esa, gios) merging co-located points of fused types.
+        fusion_dedup_km (float): Distance points of fused types are merged within.
+        dpi (int): Resolution of rendered frames, borders are simplified to it.
+        grid_sizes (dict): Points of interpolation grid along each axis by heatmap type, file format or 'default'.
+        preview_grid_size (int): Size of coarse grid frames are interpolated on in preview mode, None disables it.
     """
 
     heatmaps = [
         "temperature", "pressure", "precipitation", "humidity", "wind"
     ]
 
+    # air quality indices of GIOS stations
+    gios_heatmaps = [
+        "gios_pm10", "gios_pm25", "gios_no2", "gios_o3", "gios_so2"
+    ]
+
+    # variables measured by several sources merged into one map
+    fused_heatmaps = [
+        "fused_temperature", "fused_humidity", "fused_pressure", "fused_pm10", "fused_pm25"
+    ]
+
+    # station_data columns every heatmap type is rendered from
+    heatmap_columns = {
+        "temperature": {"temperature"},
+        "pressure": {"pressure"},
+        "precipitation": {"precipitation"},
+        "humidity": {"humidity"},
+        "wind": {"wind_speed", "wind_direction"},
+    }
+
+    # number of frames persisted at once while rendering
+    _PERSIST_BATCH = 24
+
+    # frames interpolated on a coarse grid, see preview_grid_size
+    preview = False
+
     display_labels = ['Kraków', 'Warszawa', 'Gdańsk', 'Wrocław', 'Szczecin', 'Poznań', 'Suwałki', 'Zakopane', 'Łódź',
                       'Olsztyn', 'Lublin', 'Rzeszów', 'Zielona Góra', 'Białystok']
 
 
     def __init__(self, meteo_db_url, last=1, file_format='png', output_file='temperature.png', heatmap_type='temperature', max_workers=2,
-                 overwrite=True, usedb=False, persist=False, keep_frames=0, ranges: dict | None = None):
+                 overwrite=True, usedb=False, persist=False, keep_frames=0, ranges: dict | None = None, executor=None,
+                 esa_bucket_minutes=ESA_BUCKET_MINUTES, esa_grid_km=ESA_GRID_KM, esa_grid_statistic=STATISTIC_MEDIAN,
+                 qc=True, qc_neighbours=DEFAULT_NEIGHBOURS, qc_threshold=DEFAULT_THRESHOLD,
+                 fusion_weights=None, fusion_dedup_km=FUSION_DEDUP_KM, profile_dir=None, memory_budget_mb=0,
+                 dpi=DEFAULT_DPI, grid_sizes: dict | None = None, preview_grid_size=None):
         """
         Initialize the HeatMap object with configuration for data source, output, and processing.
 
@@ -90,6 +317,20 @@ class HeatMap:
             usedb (bool): Use database for persistence.
             persist (bool): Persist generated frames.
             keep_frames (int): Number of last generated frames to be kept in database, older will be removed
+            executor (Executor): Shared render pool, e.g. of the resident daemon
+            esa_bucket_minutes (int): Size of ESA time buckets in minutes
+            esa_grid_km (float): Size of ESA grid cells in km, 0 disables binning
+            esa_grid_statistic (str): Statistic of ESA sensors in a cell
+            qc (bool): Reject outlying readings before rendering
+            qc_neighbours (int): Number of nearest neighbours compared
+            qc_threshold (float): Robust z-score threshold of rejection
+            fusion_weights (dict): Weights of sources of fused types
+            fusion_dedup_km (float): Distance in km co-located points of fused types are merged within
+            profile_dir (str): Run directory render workers write profiles of their frames to
+            memory_budget_mb (int): Resident memory of the process renders are throttled at, 0 is unlimited
+            dpi (int): Resolution of rendered frames, 100 renders 600x500 pixels
+            grid_sizes (dict): Interpolation grid sizes like {'default': 500, 'gif': 300, 'precipitation': 600}
+            preview_grid_size (int): Coarse grid of preview mode, preview frames are never persisted
         """
         self.meteo_db_url = meteo_db_url
         self.last = last
@@ -101,9 +342,31 @@ class HeatMap:
         self.usedb = usedb
         self.persist = persist
         self.keep_frames = keep_frames
-
-        self.dataprovider = ProviderFactory.provider(self.heatmap_type, self.meteo_db_url, self.last)
+        self.executor = executor
+
+        self.esa_bucket_minutes = esa_bucket_minutes
+        self.esa_grid_km = esa_grid_km
+        self.esa_grid_statistic = esa_grid_statistic
+        self.fusion_weights = fusion_weights
+        self.fusion_dedup_km = fusion_dedup_km
+        self.profile_dir = profile_dir
+        self.memory_budget = memory_budget_mb * MB
+        self.memory = MemoryTracker()
+
+        # history of stations is shared by heatmaps of the same type within the process
+        self.quality_control = quality_control(heatmap_type, neighbours=qc_neighbours, threshold=qc_threshold) \
+            if qc else None
+        self.qc_reports = []
+
+        self.dataprovider = ProviderFactory.provider(self.heatmap_type, self.meteo_db_url, self.last,
+                                                     self.esa_bucket_minutes, self.esa_grid_km,
+                                                     self.esa_grid_statistic, self.fusion_weights,
+                                                     self.fusion_dedup_km)
         self.heatmap_creator = CreatorFactory.creator(self.heatmap_type)
+        self.heatmap_creator.dpi = dpi
+        self.heatmap_creator.grid_size = self.grid_size(grid_sizes or {}, heatmap_type, file_format)
+        self.heatmap_creator.preview_grid_size = preview_grid_size
+        self.preview = preview_grid_size is not None
         # ranges is a mapping like {'temperature': (min, max), 'pressure': (min, max), ...}
         self.ranges = ranges or {}
         logger.info(f"HeatMap initialized with type: {heatmap_type}, last: {last}, file_format: {file_format}, output_file: {output_file}, max_workers: {max_workers}," \
@@ -121,41 +384,151 @@ class HeatMap:
         Returns:
             list: List of generated frames.
         """
+        frames = dict()
+        self._render_frames(date_times, frames.__setitem__, persist=persist)
+        return frames
+
+
+    @staticmethod
+    def grid_size(grid_sizes, heatmap_type, file_format) -> int:
+        """
+        Size of interpolation grid of heatmap type (fused types fall back to their variable), of file format
+        otherwise, of 'default' when neither is configured.
+        """
+        for key in (heatmap_type, heatmap_type.removeprefix('fused_'), file_format, 'default'):
+            if key in grid_sizes:
+                return grid_sizes[key]
+        return DEFAULT_GRID_SIZE
+
+    def _render_frames(self, date_times, consumer, persist=None, cached=None) -> int:
+        """
+        Renders heatmap frames of date_times in the render pool and passes them to consumer(datetime, frame)
+        in chronological order, each frame as soon as all earlier frames are done. Frames of cached are
+        passed in their place in the order, nothing is kept here once passed.
+
+        With a memory budget at most 2 * max_workers frames are rendered at a time and no frame is
+        submitted while the process is above the budget, until renders in flight are collected.
+
+        Args:
+            date_times (list): Datetimes of frames to render.
+            consumer (callable): Receives (datetime, frame) in chronological order.
+            persist (bool, optional): Whether to persist the frames.
+            cached (dict, optional): Already rendered frames by datetime, taken over.
+
+        Returns:
+            int: Number of rendered frames.
+        """
         if persist is None:
             persist = self.persist
+        if self.preview and persist:
+            # preview frames never replace stored frames of full quality
+            logger.info("Preview frames are not persisted")
+            persist = False
 
         logger.debug("Generate frames")
-        frames = dict()
-        stations = self.dataprovider.provide_stations_by_datetimes(datetimes=date_times)
-
-        with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+        with self.memory.stage('fetch'), metrics.timer(f'fetch.{self.heatmap_type}'):
+            stations = self.dataprovider.provide_stations_by_datetimes(datetimes=date_times) if date_times else []
+        if self.quality_control is not None:
+            with self.memory.stage('qc'), metrics.timer('heatmap.qc'):
+                stations, self.qc_reports = self.quality_control.filter_frames(stations)
+            for report in self.qc_reports:
+                metrics.count('qc.checked', report.checked)
+                metrics.count('qc.rejected_spatial', report.count(REASON_SPATIAL))
+                metrics.count('qc.rejected_history', report.count(REASON_HISTORY))
+
+        rendered = 0
+        unpersisted = dict()
+
+        def collect(displaydate, frame):
+            nonlocal rendered
+            rendered += 1
+            if persist:
+                unpersisted[displaydate] = frame
+                if len(unpersisted) >= self._PERSIST_BATCH:
+                    self._persist(unpersisted)
+            consumer(displaydate, frame)
+
+        sequence = FrameSequence([displaydate for displaydate, _ in stations], collect, cached)
+
+        pool = nullcontext(self.executor) if self.executor is not None \
+            else ProcessPoolExecutor(max_workers=self.max_workers)
+        with self.memory.stage('render'), pool as executor:
             # determine vmin/vmax for this heatmap type (centralized ranges passed from main)
-            type_range = self.ranges.get(self.heatmap_type)
+            # fused types share range of their variable
+            type_range = self.ranges.get(self.heatmap_type, self.ranges.get(self.heatmap_type.removeprefix('fused_')))
             if type_range is not None and len(type_range) >= 2:
                 vmin, vmax = type_range[0], type_range[1]
             else:
                 vmin, vmax = None, None
 
-            futures = [
-                executor.submit(
+            # workers return metrics of their frames along with the frame
+            collect_metrics = metrics.enabled()
+            # frames waiting for earlier ones are held as well as the rendered ones
+            max_in_flight = 2 * self.max_workers if self.memory_budget else None
+            in_flight = set()
+
+            def throttled():
+                if max_in_flight is not None and len(in_flight) + sequence.buffered >= max_in_flight:
+                    return True
+                return self._over_memory_budget()
+
+            def complete(return_when):
+                done, _ = wait(in_flight, return_when=return_when)
+                for future in done:
+                    in_flight.remove(future)
+                    (displaydate, frame), worker_metrics = future.result()
+                    metrics.merge(worker_metrics)
+                    if frame is None:
+                        metrics.count('heatmap.frames_failed')
+                    sequence.add(displaydate, frame)
+                self.memory.sample('render')
+
+            # frames are submitted in chronological order, so the sequence releases them as soon as possible,
+            # stations of submitted frames are not needed here anymore
+            stations.sort(key=lambda item: item[0], reverse=True)
+            while stations:
+                displaydate, frame_stations = stations.pop()
+                while in_flight and throttled():
+                    complete(FIRST_COMPLETED)
+                in_flight.add(executor.submit(
+                    metrics.collected,
+                    profiler.profiled,
+                    collect_metrics,
+                    self.profile_dir,
+                    profiler.profile_tag('render', self.heatmap_type, displaydate),
                     self.heatmap_creator.generate_image,
-                    stations=stations,
+                    stations=frame_stations,
                     displaydate=displaydate,
                     display_labels=self.display_labels,
                     vmin=vmin, vmax=vmax
-                )
-                for idx, (displaydate, stations) in enumerate(stations)
-            ]
+                ))
+            while in_flight:
+                complete(FIRST_COMPLETED)
 
-            for future in as_completed(futures):
-                (datetime, frame) = future.result()
-                if frame is not None:
-                    frames [datetime] = frame
+        if unpersisted:
+            self._persist(unpersisted)
+        metrics.count('heatmap.frames', rendered)
 
-        if persist:
-            self.dataprovider.store_frames(self.heatmap_type, frames)
+        return rendered
+
+
+    def _over_memory_budget(self):
+        if not self.memory_budget:
+            return False
+        rss = rss_bytes()
+        if rss <= self.memory_budget:
+            return False
+        metrics.count('heatmap.memory_waits')
+        logger.debug(f"Memory {rss / MB:.0f}MB over budget {self.memory_budget / MB:.0f}MB, waiting for renders")
+        return True
 
-        return frames
+
+    def _persist(self, frames):
+        """
+        Stores frames and clears the dict, frames are stored in batches while rendering.
+        """
+        self.dataprovider.store_frames(self.heatmap_type, frames)
+        frames.clear()
 
 
     def _get_frames_from_persistence(self, datetime):
@@ -179,12 +552,12 @@ class HeatMap:
         The output file is saved to the path specified by self.output_file.
         """
         last_datetimes =  self.dataprovider.get_last_datetimes(last=self.last)
-        frames = self._generate_frames_by_datetimes(last_datetimes)
-
-        # sorted_frames = [image for datetime, image in sorted(frames, key=lambda x: x[0])]
-        sorted_frames = dict(sorted(frames.items()))
 
-        imageio.mimsave(f"{self.output_file}", list(sorted_frames.values()), duration=300, palettesize=256, subrectangles=True)
+        # frames are streamed to the encoder in order of animation as they are rendered
+        writer = AnimationWriter(self.output_file, 'gif')
+        self._render_frames(last_datetimes, lambda displaydate, frame: writer.append(frame))
+        with self.memory.stage('encode'):
+            writer.close()
         # imageio.mimsave("animation.mp4", sorted_frames, format="mp4", duration=0.2)  # Save as MP4# Duration per frame (sec)
         logger.info(f"{self.heatmap_type.capitalize()} heatmap generation completed at {datetime.now()}")
 
@@ -202,7 +575,7 @@ class HeatMap:
         last_datetimes = self.dataprovider.get_last_datetimes(1)
         frames = self._generate_frames_by_datetimes(last_datetimes)
 
-        imageio.imwrite(f"{self.output_file}", next(iter(frames.values())))
+        write_png(self.output_file, next(iter(frames.values())))
         logger.info(f"{self.heatmap_type.capitalize()} heatmap generation completed at {datetime.now()}")
 
 
@@ -218,7 +591,8 @@ class HeatMap:
         """
         last_datetimes = self.dataprovider.get_last_datetimes(self.last)
         self.persist = True
-        self._generate_frames_by_datetimes(last_datetimes)
+        # frames are only persisted, nothing is kept
+        self._render_frames(last_datetimes, lambda displaydate, frame: None)
 
 
     def _generate_webp(self):
@@ -238,30 +612,63 @@ class HeatMap:
 
         cached_frames = dict()
         if self.usedb:
-            cached_frames = self.dataprovider.provide_frames_by_type_and_datetimes(datetimes=last_date_times)
+            cached_frames = self.dataprovider.provide_frames_by_type_and_datetimes(datetimes=last_date_times) or dict()
 
         map_keys = set(cached_frames.keys())
         list_set = set(last_date_times)
         missing = list(list_set - map_keys)
 
-        generated_frames = self._generate_frames_by_datetimes(missing)
+        # generated frames are streamed to the encoder in order of animation, cached ones in their place
+        writer = AnimationWriter(self.output_file, 'webp')
+        self._render_frames(missing, lambda displaydate, frame: writer.append(frame), cached=cached_frames)
+        with self.memory.stage('encode'):
+            writer.close()
+
+        logger.info(f"{self.heatmap_type.capitalize()} heatmap generation completed at {datetime.now()}")
 
-        frames = cached_frames | generated_frames
 
-        sorted_frames = dict(sorted(frames.items()))
+    @classmethod
+    def affected_frames(cls, changes: dict) -> dict:
+        """
+        Maps a change set of an updater to frames that need to be regenerated.
 
-        pil_frames = [Image.fromarray(frame) for frame in list(sorted_frames.values())]
-        durations = [300] * (len(pil_frames) - 1) + [3000]
-        pil_frames[0].save(
-            f"{self.output_file}",
-            save_all=True,
-            append_images=pil_frames[1:],
-            duration=durations,
-            loop=0,
-            quality=85  # Adjust quality (0-100)
-        )
+        Args:
+            changes (dict): datetime -> set of changed station_data columns.
 
-        logger.info(f"{self.heatmap_type.capitalize()} heatmap generation completed at {datetime.now()}")
+        Returns:
+            dict: heatmap type -> sorted list of datetimes, types without changes are omitted.
+        """
+        affected = dict()
+        for heatmap in cls.heatmaps:
+            columns = cls.heatmap_columns[heatmap]
+            datetimes = sorted(date_time for date_time, changed in changes.items() if columns & set(changed))
+            if datetimes:
+                affected[heatmap] = datetimes
+        return affected
+
+
+    def regenerate(self, datetimes):
+        """
+        Renders and persists frames of given datetimes only, used to refresh frames after an update
+        brought new data (including late rows for older hours).
+
+        Args:
+            datetimes (list): Datetimes of frames to regenerate, nothing is rendered when empty.
+
+        Returns:
+            dict: Regenerated frames by datetime.
+        """
+        if not datetimes:
+            return dict()
+
+        frames = self._generate_frames_by_datetimes(list(datetimes), persist=True)
+        logger.info(f"{self.heatmap_type.capitalize()} regenerated {len(frames)} frames.")
+
+        if self.keep_frames > 0:
+            removed = self.dataprovider.delete_older_frames(self.heatmap_type, self.keep_frames)
+            logger.info(f"Removed {removed} frames.")
+
+        return frames
 
 
     def generate(self):
@@ -277,6 +684,7 @@ class HeatMap:
             case 'webp': self._generate_webp()
             case 'cache': self._generate_cache()
             case _: raise ValueError(f"Unsupported file format: {self.file_format}")
+        self.memory.log(f"{self.heatmap_type.capitalize()} ")
 
         if self.keep_frames > 0:
             removed = self.dataprovider.delete_older_frames(self.heatmap_type, self.keep_frames)
@@ -1,18 +1,19 @@
-import requests
-import geopandas as gpd
+import threading
+
 import numpy as np
 
-from io import BytesIO
 from scipy.interpolate import Rbf
-
-from shapely.geometry import Point
-from shapely.prepared import prep
+from scipy.ndimage import zoom
 
 import matplotlib.pyplot as plt
 from matplotlib.colors import Normalize, LinearSegmentedColormap
 from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import LineCollection
 
 from solarmeteo.heatmap.data_provider import StationValue
+from solarmeteo.heatmap.geometry_store import load_poland_geometry, PolandGeometry, GEOJSON_LOCAL
+from solarmeteo.heatmap.station_geometry import project, unproject
+from solarmeteo.metrics import metrics
 
 from logging import getLogger
 
@@ -20,13 +21,37 @@ from logging import getLogger
 
 logger = getLogger(__name__)
 
+# resolution of rendered frames, 100 renders 600x500 pixels
+DEFAULT_DPI = 100
+# points of interpolation grid along each axis
+DEFAULT_GRID_SIZE = 500
+DEFAULT_PREVIEW_GRID_SIZE = 100
+
+
+_unprojected_grids = dict()
+_unprojected_grids_lock = threading.Lock()
+
+
+def unproject_grid(xx, yy):
+    """
+    Reprojects grid to geographic coordinates, every grid is reprojected once per process.
+    :return: tuple of read-only arrays (grid_lon, grid_lat)
+    """
+    key = (xx.shape, xx.flat[0], xx.flat[-1], yy.flat[0], yy.flat[-1])
+    with _unprojected_grids_lock:
+        grid = _unprojected_grids.get(key)
+    if grid is None:
+        grid = unproject(xx, yy)
+        for array in grid:
+            array.setflags(write=False)
+        with _unprojected_grids_lock:
+            _unprojected_grids[key] = grid
+    return grid
+
 
 class HeatmapCreator:
 
-    _GEOJSON_URL = "https://raw.githubusercontent.com/ppatrzyk/polska-geojson/master/wojewodztwa/wojewodztwa-medium.geojson"
-    _GEOJSON_LOCAL = "./data/wojewodztwa-medium.geojson"
-    _CRS_LATLON = "EPSG:4326"
-    _CRS_PROJECTED = "EPSG:2180"  # Poland CS92
+    _GEOJSON_LOCAL = GEOJSON_LOCAL
     _COLORMAP = LinearSegmentedColormap.from_list(
         'temp_cmap',
         [
@@ -39,28 +64,30 @@ class HeatmapCreator:
     )
 
 
+    _FIGSIZE = (6, 5)
+    # borders are simplified to resolution of frames
+    dpi = DEFAULT_DPI
+    grid_size = DEFAULT_GRID_SIZE
+    # in preview mode stations are interpolated on a coarse grid upsampled to grid_size, None disables it
+    preview_grid_size = None
+
     _geometry = None
 
     def __init__(self):
-        self._geometry = self._load_poland_geometry()
+        # borders are loaded on first use
+        self._geometry = None
 
-    def _load_poland_geometry_from_url(self, url=_GEOJSON_URL):
-        response = requests.get(url)
-        response.raise_for_status()
-        gdf = gpd.read_file(BytesIO(response.content))
-        return gdf, gdf.to_crs(self._CRS_PROJECTED).geometry.union_all()
+    def _load_poland_geometry(self) -> PolandGeometry:
+        return load_poland_geometry(self._GEOJSON_LOCAL)
 
-    def _load_poland_geometry_from_file(self, path=_GEOJSON_LOCAL):
-        gdf = gpd.read_file(path)
-        return gdf, gdf.to_crs(self._CRS_PROJECTED).geometry.union_all()
-
-    def _load_poland_geometry(self):
-        try:
-            _geometry = self._load_poland_geometry_from_file()
-        except:
-            _geometry = self._load_poland_geometry_from_url()
-
-        return _geometry
+    @property
+    def geometry(self) -> PolandGeometry:
+        """
+        Borders of Poland, loaded on first use from the geometry cache shared by creators of the process.
+        """
+        if self._geometry is None:
+            self._geometry = self._load_poland_geometry()
+        return self._geometry
 
 
     def generate_heatmap(self, stations: list[StationValue], colormap=_COLORMAP, displaydate='', vmin=None, vmax=None,
@@ -83,8 +110,6 @@ class HeatmapCreator:
 
         if display_labels is None:
             display_labels = []
-        voivodeships_ll, poland_shape_projected = self._geometry
-        prepared_poland = prep(poland_shape_projected.buffer(1000))  # 1km buffer
 
         # Prepare station data
         lons = np.array([s.lon for s in stations])
@@ -98,29 +123,16 @@ class HeatmapCreator:
         else:
             temps_scaled = temps
 
-        # Convert to projected CRS
-        gdf = gpd.GeoDataFrame(
-            {'temperature': temps, 'name': names},
-            geometry=gpd.points_from_xy(lons, lats),
-            crs=self._CRS_LATLON
-        ).to_crs(self._CRS_PROJECTED)
-
-        x, y = gdf.geometry.x.values, gdf.geometry.y.values
-        # t = gdf.temperature.values
-
-        # Create interpolation grid
-        bounds = poland_shape_projected.bounds
-        x_grid = np.linspace(bounds[0], bounds[2], 500)
-        y_grid = np.linspace(bounds[1], bounds[3], 500)
-        xx, yy = np.meshgrid(x_grid, y_grid)
+        with metrics.timer('heatmap.project'):
+            x, y = self.project_stations(lons, lats)
+        xx, yy = self.interpolation_grid()
 
-        # scaling because RBF requires normalized values because of problems with large values
-        # it uses absolute values for interpolation
         try:
-            rbf = Rbf(x, y, temps_scaled, function='linear', smooth=1)
-            grid_temp_scaled = rbf(xx, yy)
+            with metrics.timer('heatmap.interpolate'):
+                grid_temp_scaled = self.interpolate(x, y, temps_scaled, xx, yy)
         except Exception as e:
             logger.error(f"Interpolating heatmap exception {e} on datetime: {displaydate}")
+            metrics.count('heatmap.interpolation_errors')
             return None
 
         if scale_min is not None and scale_max is not None:
@@ -129,22 +141,91 @@ class HeatmapCreator:
             grid_temp = grid_temp_scaled
 
         # Mask areas outside Poland
-        points = np.column_stack([xx.ravel(), yy.ravel()])
-        mask = np.array([prepared_poland.contains(Point(p)) for p in points]).reshape(xx.shape)
-        grid_temp[~mask] = np.nan
+        with metrics.timer('heatmap.mask'):
+            grid_temp[~self.mask(xx, yy)] = np.nan
         grid_temp = np.clip(grid_temp, vmin, vmax)
 
-        # Reproject grid to geographic coordinates
-        grid_points = gpd.GeoDataFrame(
-            geometry=gpd.points_from_xy(xx.ravel(), yy.ravel()),
-            crs=self._CRS_PROJECTED
-        ).to_crs(self._CRS_LATLON)
+        with metrics.timer('heatmap.unproject'):
+            grid_lon, grid_lat = self.unproject_grid(xx, yy)
+
+        with metrics.timer('heatmap.render'):
+            return self.render(grid_lon, grid_lat, grid_temp, lons, lats, names, temps, directions,
+                               colormap=colormap, displaydate=displaydate, vmin=vmin, vmax=vmax, label=label,
+                               display_labels=display_labels)
+
+
+    # Stages of generate_heatmap, timed separately by solarmeteo.benchmark
+
+    def project_stations(self, lons, lats):
+        """
+        Converts station coordinates to projected CRS (with the transformer cached per process).
+        :return: tuple of numpy arrays (x, y)
+        """
+        return project(lons, lats)
+
+
+    def interpolation_grid(self):
+        """
+        Creates interpolation grid covering bounds of Poland in projected CRS.
+        :return: tuple of meshgrid arrays (xx, yy)
+        """
+        bounds = self.geometry.projected.bounds
+        x_grid = np.linspace(bounds[0], bounds[2], self.grid_size)
+        y_grid = np.linspace(bounds[1], bounds[3], self.grid_size)
+        return np.meshgrid(x_grid, y_grid)
+
+
+    @property
+    def interpolation_size(self):
+        """
+        :return: points along each axis stations are interpolated on
+        """
+        return min(self.preview_grid_size or self.grid_size, self.grid_size)
+
+
+    def interpolate(self, x, y, values, xx, yy):
+        """
+        Interpolates values of stations on the grid. In preview mode values are interpolated on a coarse
+        grid of the same extent and upsampled bilinearly.
+        """
+        # scaling because RBF requires normalized values because of problems with large values
+        # it uses absolute values for interpolation
+        rbf = Rbf(x, y, values, function='linear', smooth=1)
+        size = self.interpolation_size
+        if size >= min(xx.shape):
+            return rbf(xx, yy)
+
+        coarse_xx, coarse_yy = np.meshgrid(np.linspace(xx[0, 0], xx[0, -1], size),
+                                           np.linspace(yy[0, 0], yy[-1, 0], size))
+        # corners of both grids are aligned, as zoom maps them onto each other
+        return zoom(rbf(coarse_xx, coarse_yy), (xx.shape[0] / size, xx.shape[1] / size), order=1)
 
-        grid_lon = grid_points.geometry.x.values.reshape(xx.shape)
-        grid_lat = grid_points.geometry.y.values.reshape(yy.shape)
+
+    def mask(self, xx, yy):
+        """
+        :return: boolean array of grid points within Poland (with 1km buffer), cached per grid
+        """
+        return self.geometry.mask(xx, yy)
+
+
+    def unproject_grid(self, xx, yy):
+        """
+        Reprojects grid to geographic coordinates.
+        :return: tuple of arrays (grid_lon, grid_lat)
+        """
+        return unproject_grid(xx, yy)
+
+
+    def render(self, grid_lon, grid_lat, grid_temp, lons, lats, names, temps, directions, colormap=None,
+               displaydate='', vmin=None, vmax=None, label='', display_labels=()):
+        """
+        Plots interpolated grid, stations and boundaries.
+        :return: matplotlib figure
+        """
+        geometry = self.geometry
 
         # Create plot
-        fig, ax = plt.subplots(figsize=(6, 5))
+        fig, ax = plt.subplots(figsize=self._FIGSIZE, dpi=self.dpi)
 
         norm = Normalize(vmin=vmin, vmax=vmax)
         levels = np.linspace(vmin, vmax, 200)
@@ -220,11 +301,10 @@ class HeatmapCreator:
 
 
         # Add administrative boundaries
-        voivodeships_ll.boundary.plot(
-            ax=ax,
-            color='black',
-            linewidth=0.3
-        )
+        ax.set_aspect(geometry.aspect)
+        boundaries = geometry.boundaries_for(self._FIGSIZE[1] * self.dpi)
+        ax.add_collection(LineCollection(boundaries, color='black', linewidth=0.3))
+        ax.autoscale_view()
 
         # Colorbar
         cbar = fig.colorbar(contour, ax=ax, shrink=0.7)
@@ -250,21 +330,31 @@ class HeatmapCreator:
 
     def generate_image(self, stations, displaydate, display_labels, vmin=None, vmax=None):
         logger.debug(f"Generate image for: {displaydate}")
-        fig = self.generate(stations=stations, displaydate=displaydate, display_labels=display_labels,
-                    vmin=vmin, vmax=vmax)
+        # limits not configured fall back to the range of the creator
+        limits = {name: value for name, value in (('vmin', vmin), ('vmax', vmax)) if value is not None}
+        fig = self.generate(stations=stations, displaydate=displaydate, display_labels=display_labels, **limits)
         if fig is not None:
-            try:
+            return displaydate, self.figure_to_image(fig)
+        else:
+            return displaydate, None
+
+
+    @staticmethod
+    def figure_to_image(fig):
+        """
+        Draws figure and returns its RGB pixels, the figure is closed.
+        """
+        try:
+            with metrics.timer('heatmap.rasterize'):
                 canvas = FigureCanvasAgg(fig)
                 canvas.draw()
                 buf = canvas.buffer_rgba()
                 img = np.asarray(buf).reshape((*reversed(canvas.get_width_height()), 4))
                 # img = np.array(canvas.renderer.buffer_rgba())
                 img = img[:, :, :3]  # Drop alpha channel if present
-            finally:
-                plt.close(fig)
-            return displaydate, img
-        else:
-            return displaydate, None
+        finally:
+            plt.close(fig)
+        return img
 
 
 class TemperatureCreator(HeatmapCreator):
@@ -446,3 +536,33 @@ class PM25Creator(HeatmapCreator):
             scale_min=0, scale_max=50,
             display_labels=display_labels
         )
+
+
+class GiosIndexCreator(HeatmapCreator):
+    # colors of GIOS air quality index levels: very good, good, moderate, sufficient, bad, very bad
+    _COLORMAP = LinearSegmentedColormap.from_list(
+        'gios_index_cmap',
+        [
+            (0.0, '#57b108'),   # Very good
+            (0.2, '#b0dd10'),   # Good
+            (0.4, '#ffd911'),   # Moderate
+            (0.6, '#e58100'),   # Sufficient
+            (0.8, '#e50000'),   # Bad
+            (1.0, '#990000')    # Very bad
+        ]
+    )
+
+    def __init__(self, label):
+        super().__init__()
+        self.label = label
+
+    def generate(self, stations, displaydate, display_labels, vmin=0, vmax=5):
+        return self.generate_heatmap(
+            stations=stations,
+            colormap=self._COLORMAP,
+            displaydate=displaydate,
+            vmin=vmin, vmax=vmax,
+            label=f"{self.label} index (GIOS)",
+            scale_min=0, scale_max=5,
+            display_labels=display_labels
+        )
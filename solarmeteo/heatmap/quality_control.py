@@ -0,0 +1,225 @@
+###
+# SolarMeteo    : https://github.com/pa810p/solarmeteo
+# Author        : Pawel Prokop
+# License       : GNU GENERAL PUBLIC LICENSE v3
+###
+
+import threading
+import warnings
+from dataclasses import dataclass, field
+from datetime import datetime
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from solarmeteo.heatmap.station_geometry import project
+
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+# scale of normal distribution relative to median absolute deviation
+_MAD_SCALE = 0.6745
+
+DEFAULT_NEIGHBOURS = 8
+DEFAULT_THRESHOLD = 3.5
+DEFAULT_MIN_SCALE = 1.0
+DEFAULT_HISTORY_LENGTH = 6
+DEFAULT_MIN_HISTORY = 3
+
+# deviates from neighbours, station has no history yet
+REASON_SPATIAL = 'spatial'
+# deviates from neighbours more than usual for the station
+REASON_HISTORY = 'history'
+
+
+@dataclass
+class QualityReport:
+    displaydate: datetime
+    checked: int = 0
+    rejected: list = field(default_factory=list)
+
+    def count(self, reason):
+        return sum(1 for *_, rejected_reason in self.rejected if rejected_reason == reason)
+
+
+def robust_z(values, references, min_scale=DEFAULT_MIN_SCALE):
+    """
+    Robust z-score of values against rows of references (median and median absolute deviation),
+    nan references are ignored.
+
+    :param values: array of n values
+    :param references: array (n, k) of reference values per value
+    :param min_scale: lower bound of the deviation, so identical references do not reject tiny differences
+    :return: array of n absolute scores, nan where there are no references
+    """
+    values = np.asarray(values, dtype=np.float64)
+    with warnings.catch_warnings():
+        # rows without references
+        warnings.simplefilter('ignore', RuntimeWarning)
+        median = np.nanmedian(references, axis=1)
+        deviation = np.nanmedian(np.abs(references - median[:, None]), axis=1)
+    return np.abs(_MAD_SCALE * (values - median) / np.maximum(deviation, min_scale))
+
+
+class QualityControl:
+    """
+    Rejects outlying readings before interpolation, a single broken sensor otherwise dominates
+    the heatmap through RBF.
+
+    A reading is compared with its k nearest neighbours (KD-tree on projected coordinates): its
+    residual (difference from the neighbours' median) is scored against the neighbours' spread.
+    A station with enough history is rejected only when the residual is also unusual for the station
+    itself, so stations constantly differing from their surroundings (mountains, coast) are kept,
+    while sudden jumps of a sensor are not. Residuals of the last history_length accepted readings are
+    kept per station, so a broken sensor stuck at a wrong value never becomes its own normal. History is
+    keyed by datetime of the frame, so frames checked again (e.g. regenerated) replace their residuals
+    instead of counting twice. Counters of checked and rejected readings are available via stats().
+    """
+
+    def __init__(self, neighbours=DEFAULT_NEIGHBOURS, threshold=DEFAULT_THRESHOLD, min_scale=DEFAULT_MIN_SCALE,
+                 history_length=DEFAULT_HISTORY_LENGTH, min_history=DEFAULT_MIN_HISTORY):
+        self.neighbours = neighbours
+        self.threshold = threshold
+        self.min_scale = min_scale
+        self.history_length = history_length
+        self.min_history = min_history
+
+        self._history = dict()
+        self._lock = threading.Lock()
+        self.checked = 0
+        self.rejected_spatial = 0
+        self.rejected_history = 0
+
+    @staticmethod
+    def station_key(station):
+        return station.name, round(float(station.lon), 3), round(float(station.lat), 3)
+
+    def residuals(self, x, y, values):
+        """
+        :return: tuple of arrays (residuals from the neighbours' median, spatial robust z-scores),
+            None when there are too few stations to compare
+        """
+        k = min(self.neighbours, len(values) - 1)
+        if k < 2:
+            return None
+
+        points = np.column_stack([x, y])
+        _, indexes = cKDTree(points).query(points, k=k + 1)
+        # the nearest point is the reading itself
+        neighbours = values[indexes[:, 1:]]
+        median = np.median(neighbours, axis=1)
+        residuals = values - median
+        return residuals, robust_z(values, neighbours, self.min_scale)
+
+    def history_scores(self, keys, residuals, displaydate=None):
+        """
+        :param displaydate: datetime of the frame, its own remembered residuals are not part of the history
+        :return: array of robust z-scores of residuals against each station's own residual history,
+            nan for stations with too short history
+        """
+        references = np.full((len(residuals), self.history_length), np.nan)
+        with self._lock:
+            for row, key in enumerate(keys):
+                history = [residual for date_time, residual in self._history.get(key, {}).items()
+                           if date_time != displaydate]
+                if len(history) >= self.min_history:
+                    references[row, :len(history)] = history
+        return robust_z(residuals, references, self.min_scale)
+
+    def _remember(self, displaydate, accepted, residuals, rejected):
+        """
+        Stores residuals of accepted readings of a frame, residuals the frame stored before for
+        its rejected readings are forgotten. Only the newest history_length frames are kept.
+        """
+        with self._lock:
+            for key, residual in zip(accepted, residuals):
+                history = self._history.setdefault(key, dict())
+                history[displaydate] = residual
+                if len(history) > self.history_length:
+                    del history[min(history)]
+            for key in rejected:
+                self._history.get(key, {}).pop(displaydate, None)
+
+    def filter(self, displaydate, stations):
+        """
+        Filters readings of one frame.
+
+        :param displaydate: datetime of the frame
+        :param stations: list of StationValue
+        :return: tuple (accepted StationValue list, QualityReport)
+        """
+        report = QualityReport(displaydate=displaydate, checked=len(stations))
+        values = np.array([s.value for s in stations], dtype=np.float64)
+        x, y = project([s.lon for s in stations], [s.lat for s in stations]) if stations else ([], [])
+
+        compared = self.residuals(x, y, values)
+        if compared is None:
+            return stations, report
+        residuals, spatial_scores = compared
+
+        keys = [self.station_key(s) for s in stations]
+        history_scores = self.history_scores(keys, residuals, displaydate)
+
+        known = ~np.isnan(history_scores)
+        deviating = spatial_scores > self.threshold
+        spatial = deviating & ~known
+        history = deviating & known & (np.nan_to_num(history_scores) > self.threshold)
+        rejected = spatial | history
+
+        accepted = [station for station, reject in zip(stations, rejected) if not reject]
+        # only accepted readings make offsets of a station its normal
+        self._remember(displaydate, [key for key, reject in zip(keys, rejected) if not reject], residuals[~rejected],
+                       [key for key, reject in zip(keys, rejected) if reject])
+        for index in np.flatnonzero(rejected):
+            report.rejected.append((stations[index].name, float(values[index]),
+                                    REASON_SPATIAL if spatial[index] else REASON_HISTORY))
+
+        with self._lock:
+            self.checked += len(stations)
+            self.rejected_spatial += int(spatial.sum())
+            self.rejected_history += int(history.sum())
+
+        if report.rejected:
+            logger.info(f"QC {displaydate}: rejected {len(report.rejected)} of {report.checked} readings: "
+                        + ", ".join(f"{name} {value:.1f} ({reason})" for name, value, reason in report.rejected))
+        return accepted, report
+
+    def filter_frames(self, frames):
+        """
+        Filters (datetime, stations) pairs of provider, frames are checked from the oldest one,
+        so history of a station consists of preceding frames.
+
+        :return: tuple (filtered frames in original order, list of QualityReport)
+        """
+        filtered = dict()
+        reports = []
+        for displaydate, stations in sorted(frames, key=lambda frame: frame[0]):
+            filtered[displaydate], report = self.filter(displaydate, stations)
+            reports.append(report)
+        return [(displaydate, filtered[displaydate]) for displaydate, _ in frames], reports
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'checked': self.checked,
+                'rejected_spatial': self.rejected_spatial,
+                'rejected_history': self.rejected_history,
+            }
+
+
+_quality_controls = dict()
+_quality_controls_lock = threading.Lock()
+
+
+def quality_control(heatmap_type, neighbours=DEFAULT_NEIGHBOURS, threshold=DEFAULT_THRESHOLD,
+                    **kwargs) -> QualityControl:
+    """
+    Returns process wide quality control of a heatmap type and its settings, so station history survives
+    between heatmap runs of the resident daemon.
+    """
+    key = (heatmap_type, neighbours, threshold, tuple(sorted(kwargs.items())))
+    with _quality_controls_lock:
+        if key not in _quality_controls:
+            _quality_controls[key] = QualityControl(neighbours=neighbours, threshold=threshold, **kwargs)
+        return _quality_controls[key]
@@ -0,0 +1,151 @@
+###
+# SolarMeteo    : https://github.com/pa810p/solarmeteo
+# Author        : Pawel Prokop
+# License       : GNU GENERAL PUBLIC LICENSE v3
+###
+
+import threading
+from collections import Counter
+
+import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+from scipy.spatial import cKDTree
+from scipy.stats import trim_mean
+
+from solarmeteo.heatmap.station_geometry import project, unproject
+
+STATISTIC_MEDIAN = 'median'
+STATISTIC_TRIMMED_MEAN = 'trimmed_mean'
+
+DEFAULT_CELL_KM = 5
+DEFAULT_TRIM = 0.1
+
+
+class GridBinner:
+    """
+    Bins dense sensor readings into cells of a square grid in projected (CS92) coordinates, so
+    interpolation gets at most one point per cell instead of thousands of nearby sensors.
+
+    A cell value is a robust statistic (median or trimmed mean) of its sensors, its position is
+    the centroid of the sensors, which keeps detail of sparsely covered areas. A cell carries
+    the name of a city only if it holds most sensors of that city, so city labels are rendered once.
+
+    Projection and cell assignment of a sensor are computed once and remembered by sensor id.
+    """
+
+    def __init__(self, cell_km=DEFAULT_CELL_KM, statistic=STATISTIC_MEDIAN, trim=DEFAULT_TRIM):
+        if cell_km <= 0:
+            raise ValueError(f"Cell size has to be positive: {cell_km}")
+        if statistic not in (STATISTIC_MEDIAN, STATISTIC_TRIMMED_MEAN):
+            raise ValueError(f"Unsupported statistic: {statistic}")
+
+        self.cell_m = cell_km * 1000.0
+        self.statistic = statistic
+        self.trim = trim
+        # sensor id -> (lon, lat, x, y, cell)
+        self._sensors = {}
+        self._lock = threading.Lock()
+
+    def assign(self, sensor_ids, lons, lats):
+        """
+        Returns projected coordinates and grid cells of sensors, new or moved sensors are projected
+        in one batch, known sensors are read from cache.
+
+        :return: tuple of arrays x, y and list of cells (ix, iy)
+        """
+        with self._lock:
+            unknown = [i for i, sensor_id in enumerate(sensor_ids)
+                       if self._sensors.get(sensor_id, (None, None))[:2] != (lons[i], lats[i])]
+            if unknown:
+                x, y = project([lons[i] for i in unknown], [lats[i] for i in unknown])
+                for i, xi, yi in zip(unknown, x, y):
+                    cell = (int(np.floor(xi / self.cell_m)), int(np.floor(yi / self.cell_m)))
+                    self._sensors[sensor_ids[i]] = (lons[i], lats[i], float(xi), float(yi), cell)
+            located = [self._sensors[sensor_id] for sensor_id in sensor_ids]
+
+        return (np.array([s[2] for s in located]), np.array([s[3] for s in located]),
+                [s[4] for s in located])
+
+    def _aggregate(self, values):
+        if self.statistic == STATISTIC_TRIMMED_MEAN:
+            return float(trim_mean(values, self.trim))
+        return float(np.median(values))
+
+    def bin(self, sensor_ids, lons, lats, values, names) -> list[tuple]:
+        """
+        Bins sensor readings of one frame.
+
+        :param sensor_ids: unique sensor ids
+        :param lons: sensor longitudes
+        :param lats: sensor latitudes
+        :param values: sensor readings
+        :param names: city names of sensors
+        :return: list of tuples (lon, lat, value, name), one per non-empty cell
+        """
+        if len(sensor_ids) == 0:
+            return []
+
+        x, y, cells = self.assign(list(sensor_ids), list(lons), list(lats))
+        values = np.asarray(values, dtype=np.float64)
+
+        members = dict()
+        for index, cell in enumerate(cells):
+            members.setdefault(cell, []).append(index)
+
+        # the cell holding most sensors of a city is labelled with its name
+        labelled = set()
+        for city in set(names):
+            counts = Counter(cell for cell, name in zip(cells, names) if name == city)
+            labelled.add((counts.most_common(1)[0][0], city))
+
+        cell_x, cell_y, cell_values, cell_names = [], [], [], []
+        for cell, indexes in members.items():
+            cell_x.append(x[indexes].mean())
+            cell_y.append(y[indexes].mean())
+            cell_values.append(self._aggregate(values[indexes]))
+            cities = Counter(names[i] for i in indexes)
+            city = next((name for name, _ in cities.most_common() if (cell, name) in labelled), '')
+            cell_names.append(city)
+
+        cell_lons, cell_lats = unproject(cell_x, cell_y)
+        return list(zip(cell_lons, cell_lats, cell_values, cell_names))
+
+
+def deduplicate(x, y, values, weights, radius_m, sources=None):
+    """
+    Merges points closer than radius_m (and chains of such points) into one, with value averaged
+    by weights and position of the point of the highest weight. With sources given, only points of
+    different sources are merged (a chain may still join points of one source through another one).
+
+    :param x: projected x coordinates
+    :param y: projected y coordinates
+    :param values: values of points
+    :param weights: positive weights of points
+    :param radius_m: distance in meters points are merged within
+    :param sources: source of every point, None merges points of any source
+    :return: tuple of arrays (indexes of representative points, merged values, summed weights)
+    """
+    values = np.asarray(values, dtype=np.float64)
+    weights = np.asarray(weights, dtype=np.float64)
+    count = len(values)
+    if count < 2 or radius_m <= 0:
+        return np.arange(count), values, weights
+
+    pairs = cKDTree(np.column_stack([x, y])).query_pairs(radius_m, output_type='ndarray')
+    if sources is not None and len(pairs):
+        sources = np.asarray(sources)
+        pairs = pairs[sources[pairs[:, 0]] != sources[pairs[:, 1]]]
+    if len(pairs) == 0:
+        return np.arange(count), values, weights
+
+    graph = coo_matrix((np.ones(len(pairs)), (pairs[:, 0], pairs[:, 1])), shape=(count, count))
+    groups, labels = connected_components(graph, directed=False)
+
+    total = np.bincount(labels, weights, groups)
+    merged = np.bincount(labels, weights * values, groups) / total
+
+    # the heaviest point of every group, groups in order of their labels
+    order = np.lexsort((-weights, labels))
+    first = np.r_[True, labels[order][1:] != labels[order][:-1]]
+    return order[first], merged, total
@@ -0,0 +1,86 @@
+###
+# SolarMeteo    : https://github.com/pa810p/solarmeteo
+# Author        : Pawel Prokop
+# License       : GNU GENERAL PUBLIC LICENSE v3
+###
+
+import threading
+
+import numpy as np
+from pyproj import Transformer
+
+CRS_LATLON = "EPSG:4326"
+CRS_PROJECTED = "EPSG:2180"  # Poland CS92, meters
+
+_transformers = {}
+_transformers_lock = threading.Lock()
+
+
+def transformer(source=CRS_LATLON, target=CRS_PROJECTED) -> Transformer:
+    """
+    Returns coordinate transformer, transformers are expensive to create and are cached per process.
+    """
+    key = (source, target)
+    with _transformers_lock:
+        if key not in _transformers:
+            _transformers[key] = Transformer.from_crs(source, target, always_xy=True)
+        return _transformers[key]
+
+
+def _transform(source, target, a, b):
+    a = np.asarray(a, dtype=np.float64)
+    b = np.asarray(b, dtype=np.float64)
+    if a.size == 1:
+        # pyproj handles one element arrays as a point and converts them to scalars, which numpy deprecates
+        ta, tb = transformer(source, target).transform(float(a.ravel()[0]), float(b.ravel()[0]))
+        return np.full(a.shape, ta), np.full(b.shape, tb)
+    ta, tb = transformer(source, target).transform(a, b)
+    return np.asarray(ta), np.asarray(tb)
+
+
+def project(lons, lats):
+    """
+    Projects geographic coordinates to CS92 meters.
+    :return: tuple of numpy arrays (x, y)
+    """
+    return _transform(CRS_LATLON, CRS_PROJECTED, lons, lats)
+
+
+def unproject(x, y):
+    """
+    Converts CS92 meters back to geographic coordinates.
+    :return: tuple of numpy arrays (lons, lats)
+    """
+    return _transform(CRS_PROJECTED, CRS_LATLON, x, y)
+
+
+class ProjectionCache:
+    """
+    Projected coordinates of stations remembered by their geographic position, so a station
+    is projected once per process. Stations not seen yet are projected in one call.
+    """
+
+    def __init__(self):
+        self._points = dict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._points)
+
+    def project(self, lons, lats):
+        """
+        :return: tuple of numpy arrays (x, y)
+        """
+        keys = list(zip(np.asarray(lons, dtype=np.float64).tolist(), np.asarray(lats, dtype=np.float64).tolist()))
+        with self._lock:
+            missing = list({key for key in keys if key not in self._points})
+        if missing:
+            x, y = project([lon for lon, _ in missing], [lat for _, lat in missing])
+            with self._lock:
+                self._points.update(zip(missing, zip(x.tolist(), y.tolist())))
+
+        with self._lock:
+            points = [self._points[key] for key in keys]
+        return (np.array([x for x, _ in points], dtype=np.float64),
+                np.array([y for _, y in points], dtype=np.float64))
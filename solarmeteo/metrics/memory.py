@@ -0,0 +1,100 @@
+###
+# SolarMeteo    : https://github.com/pa810p/solarmeteo
+# Author        : Pawel Prokop
+# License       : GNU GENERAL PUBLIC LICENSE v3
+###
+
+import os
+import resource
+import sys
+import tracemalloc
+from contextlib import contextmanager
+
+from solarmeteo.metrics import metrics
+
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+MB = 1024 ** 2
+
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def peak_rss_bytes() -> int:
+    """
+    :return: peak resident set size of the process
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on linux, bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def rss_bytes() -> int:
+    """
+    :return: current resident set size of the process, peak where it is not available
+    """
+    try:
+        with open('/proc/self/statm', encoding='ascii') as file:
+            return int(file.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return peak_rss_bytes()
+
+
+def start_tracing():
+    """
+    Starts tracemalloc, so peaks of Python allocations are reported per stage too. Tracing slows
+    allocations down noticeably, it is meant for investigation rather than production runs.
+    """
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+class MemoryTracker:
+    """
+    Peak memory of stages of a run: resident set size sampled at the end of a stage (and by sample()
+    within long stages) and, while tracemalloc is tracing, peak of Python allocations during a stage.
+    Peaks are recorded to metrics as memory.<stage>.rss and memory.<stage>.traced.
+    """
+
+    def __init__(self):
+        self.rss_peaks = dict()
+        self.traced_peaks = dict()
+
+    def sample(self, name):
+        rss = rss_bytes()
+        if rss > self.rss_peaks.get(name, 0):
+            self.rss_peaks[name] = rss
+        metrics.peak(f'memory.{name}.rss', rss)
+        return rss
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Stages must not be nested, peak of traced allocations is reset at the start of every stage.
+        """
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.reset_peak()
+        try:
+            yield self
+        finally:
+            self.sample(name)
+            if tracing:
+                traced = tracemalloc.get_traced_memory()[1]
+                self.traced_peaks[name] = max(traced, self.traced_peaks.get(name, 0))
+                metrics.peak(f'memory.{name}.traced', traced)
+
+    def report(self) -> dict:
+        """
+        :return: stage -> dict of rss_peak and traced_peak (None unless traced) in bytes
+        """
+        return {name: {'rss_peak': rss, 'traced_peak': self.traced_peaks.get(name)}
+                for name, rss in self.rss_peaks.items()}
+
+    def log(self, prefix=''):
+        stages = ', '.join(
+            f"{name}={peaks['rss_peak'] / MB:.0f}MB"
+            + (f" (traced {peaks['traced_peak'] / MB:.0f}MB)" if peaks['traced_peak'] is not None else '')
+            for name, peaks in self.report().items())
+        logger.info(f'{prefix}memory peaks: {stages}, process peak {peak_rss_bytes() / MB:.0f}MB')
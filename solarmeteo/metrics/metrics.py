@@ -0,0 +1,251 @@
+###
+# SolarMeteo    : https://github.com/pa810p/solarmeteo
+# Author        : Pawel Prokop
+# License       : GNU GENERAL PUBLIC LICENSE v3
+###
+
+import json
+import os
+import re
+import threading
+import time
+from datetime import datetime
+
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+PROMETHEUS_PREFIX = 'solarmeteo'
+
+
+class _NoopTimer:
+    """
+    Timer returned while metrics are disabled, shared so disabled timing allocates nothing.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NOOP = _NoopTimer()
+
+
+class Registry:
+    """
+    Timers (count, total and max seconds per stage), counters and peaks (e.g. of memory) of a process.
+    """
+
+    def __init__(self):
+        self.started = datetime.now()
+        self.timers = dict()
+        self.counters = dict()
+        self.peaks = dict()
+        self._lock = threading.Lock()
+
+    def observe(self, name, seconds):
+        with self._lock:
+            count, total, maximum = self.timers.get(name, (0, 0.0, 0.0))
+            self.timers[name] = (count + 1, total + seconds, max(maximum, seconds))
+
+    def add(self, name, value):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe_peak(self, name, value):
+        with self._lock:
+            if value > self.peaks.get(name, value - 1):
+                self.peaks[name] = value
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {'timers': {name: list(timer) for name, timer in self.timers.items()},
+                    'counters': dict(self.counters),
+                    'peaks': dict(self.peaks)}
+
+    def merge(self, snapshot: dict):
+        """
+        Adds a snapshot of another registry, e.g. of a render worker process.
+        """
+        with self._lock:
+            for name, (count, total, maximum) in snapshot['timers'].items():
+                own_count, own_total, own_maximum = self.timers.get(name, (0, 0.0, 0.0))
+                self.timers[name] = (own_count + count, own_total + total, max(own_maximum, maximum))
+            for name, value in snapshot['counters'].items():
+                self.counters[name] = self.counters.get(name, 0) + value
+            for name, value in snapshot.get('peaks', {}).items():
+                self.peaks[name] = max(value, self.peaks.get(name, value))
+
+
+class _Timer:
+
+    __slots__ = ('registry', 'name', 'started')
+
+    def __init__(self, registry, name):
+        self.registry = registry
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.registry.observe(self.name, time.perf_counter() - self.started)
+        return False
+
+
+_registry = None
+
+
+def enable():
+    """
+    Starts collecting metrics of the process with an empty registry.
+    """
+    global _registry
+    _registry = Registry()
+
+
+def disable():
+    global _registry
+    _registry = None
+
+
+def enabled() -> bool:
+    return _registry is not None
+
+
+def timer(name):
+    """
+    Context manager measuring duration of a stage, e.g. with timer('imgw.download'): ...
+    Does nothing while metrics are disabled.
+    """
+    registry = _registry
+    if registry is None:
+        return _NOOP
+    return _Timer(registry, name)
+
+
+def count(name, value=1):
+    """
+    Increases a counter, does nothing while metrics are disabled.
+    """
+    registry = _registry
+    if registry is not None:
+        registry.add(name, value)
+
+
+def peak(name, value):
+    """
+    Records value as the peak of name if it is the highest so far, does nothing while metrics are disabled.
+    """
+    registry = _registry
+    if registry is not None:
+        registry.observe_peak(name, value)
+
+
+def snapshot():
+    """
+    :return: dict of timers and counters collected so far, None while metrics are disabled
+    """
+    registry = _registry
+    return registry.snapshot() if registry is not None else None
+
+
+def merge(worker_snapshot):
+    registry = _registry
+    if registry is not None and worker_snapshot is not None:
+        registry.merge(worker_snapshot)
+
+
+def collected(function, collect, *args, **kwargs):
+    """
+    Runs function in a worker process and returns (result, snapshot of metrics recorded by the call),
+    metrics of the parent are merged from the snapshot, see merge().
+
+    :param collect: whether metrics are enabled in the parent process
+    """
+    if not collect:
+        return function(*args, **kwargs), None
+    # pooled workers run many calls, every call reports its own metrics only
+    enable()
+    try:
+        return function(*args, **kwargs), snapshot()
+    finally:
+        disable()
+
+
+def _atomic_write(path, content):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temporary = f'{path}.tmp'
+    with open(temporary, 'w', encoding='utf-8') as file:
+        file.write(content)
+    os.replace(temporary, path)
+
+
+def _label(name):
+    return re.sub(r'([\\"])', r'\\\1', name)
+
+
+def prometheus_text(data: dict) -> str:
+    """
+    Formats a snapshot in Prometheus text exposition format.
+    """
+    timers = sorted(data['timers'].items())
+    counters = sorted(data['counters'].items())
+    peaks = sorted(data.get('peaks', {}).items())
+    lines = [
+        f'# HELP {PROMETHEUS_PREFIX}_stage_seconds_total Time spent in a stage.',
+        f'# TYPE {PROMETHEUS_PREFIX}_stage_seconds_total counter',
+        *(f'{PROMETHEUS_PREFIX}_stage_seconds_total{{stage="{_label(name)}"}} {total:.6f}'
+          for name, (_, total, _) in timers),
+        f'# HELP {PROMETHEUS_PREFIX}_stage_calls_total Number of runs of a stage.',
+        f'# TYPE {PROMETHEUS_PREFIX}_stage_calls_total counter',
+        *(f'{PROMETHEUS_PREFIX}_stage_calls_total{{stage="{_label(name)}"}} {calls}'
+          for name, (calls, _, _) in timers),
+        f'# HELP {PROMETHEUS_PREFIX}_stage_seconds_max Longest run of a stage.',
+        f'# TYPE {PROMETHEUS_PREFIX}_stage_seconds_max gauge',
+        *(f'{PROMETHEUS_PREFIX}_stage_seconds_max{{stage="{_label(name)}"}} {maximum:.6f}'
+          for name, (_, _, maximum) in timers),
+        f'# HELP {PROMETHEUS_PREFIX}_events_total Counted events.',
+        f'# TYPE {PROMETHEUS_PREFIX}_events_total counter',
+        *(f'{PROMETHEUS_PREFIX}_events_total{{name="{_label(name)}"}} {value}' for name, value in counters),
+        f'# HELP {PROMETHEUS_PREFIX}_peak Highest observed value, e.g. memory of a stage in bytes.',
+        f'# TYPE {PROMETHEUS_PREFIX}_peak gauge',
+        *(f'{PROMETHEUS_PREFIX}_peak{{name="{_label(name)}"}} {value}' for name, value in peaks),
+    ]
+    return '\n'.join(lines) + '\n'
+
+
+def summary(data: dict, started=None) -> dict:
+    finished = datetime.now()
+    return {
+        'started': started.isoformat(timespec='seconds') if started else None,
+        'finished': finished.isoformat(timespec='seconds'),
+        'duration': (finished - started).total_seconds() if started else None,
+        'timers': {name: {'count': calls, 'total': total, 'max': maximum, 'mean': total / calls if calls else 0.0}
+                   for name, (calls, total, maximum) in sorted(data['timers'].items())},
+        'counters': dict(sorted(data['counters'].items())),
+        'peaks': dict(sorted(data.get('peaks', {}).items())),
+    }
+
+
+def export(prometheus_file=None, summary_file=None):
+    """
+    Writes collected metrics to a Prometheus textfile (for node_exporter textfile collector) and
+    a JSON run summary. Files are replaced atomically. Does nothing while metrics are disabled.
+    """
+    registry = _registry
+    if registry is None:
+        return
+    data = registry.snapshot()
+    try:
+        if prometheus_file:
+            _atomic_write(prometheus_file, prometheus_text(data))
+        if summary_file:
+            _atomic_write(summary_file, json.dumps(summary(data, registry.started), indent=2))
+    except OSError as e:
+        logger.error(f'Unable to export metrics: {e}')
@@ -0,0 +1,148 @@
+###
+# SolarMeteo    : https://github.com/pa810p/solarmeteo
+# Author        : Pawel Prokop
+# License       : GNU GENERAL PUBLIC LICENSE v3
+###
+
+import cProfile
+import glob
+import io
+import os
+import pstats
+import re
+import threading
+from collections import defaultdict
+from datetime import datetime
+
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+# deeper call chains of collapsed stacks are cut off
+MAX_STACK_DEPTH = 64
+SUMMARY_LINES = 40
+
+_summary_lock = threading.Lock()
+
+
+def run_directory(directory, started=None) -> str:
+    """
+    Creates directory of a profiled run, e.g. logs/profile/20260101-120000.
+    """
+    path = os.path.abspath(os.path.join(directory, f'{started or datetime.now():%Y%m%d-%H%M%S}'))
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def profile_tag(*parts) -> str:
+    """
+    Joins parts (e.g. stage, heatmap type and datetime) to a name usable as a file name.
+    """
+    return re.sub(r'[^\w.-]+', '_', '-'.join(str(part) for part in parts)).strip('_')
+
+
+def _frame_name(function):
+    file_name, line, name = function
+    if file_name == '~':
+        return name.replace(';', ':')
+    return f'{os.path.basename(file_name)}:{name}:{line}'.replace(';', ':')
+
+
+def collapsed_stacks(stats: pstats.Stats) -> dict:
+    """
+    Converts profile to collapsed stacks (stack -> microseconds) of flame graph tools (flamegraph.pl,
+    speedscope, inferno). cProfile records caller/callee pairs, not whole stacks, so time of a function
+    is split among its stacks in proportion to the time of calls from each caller.
+    """
+    callees = defaultdict(dict)
+    for function, (_, _, _, _, callers) in stats.stats.items():
+        for caller, edge in callers.items():
+            callees[caller][function] = edge
+
+    stacks = defaultdict(float)
+
+    def expand(function, path, cumulative):
+        # below resolution of the output, also bounds number of expanded paths
+        if cumulative < 1e-6:
+            return
+        _, _, own, total, _ = stats.stats[function]
+        ratio = cumulative / total if total > 0 else 0.0
+        stack = path + (_frame_name(function),)
+        stacks[';'.join(stack)] += own * ratio
+        if len(stack) >= MAX_STACK_DEPTH:
+            return
+        for callee, (_, _, _, edge_cumulative) in callees[function].items():
+            # recursion is folded into the outermost call
+            if callee != function and _frame_name(callee) not in stack:
+                expand(callee, stack, edge_cumulative * ratio)
+
+    for function, (_, _, _, total, callers) in stats.stats.items():
+        if not callers:
+            expand(function, (), total)
+
+    return {stack: round(seconds * 1e6) for stack, seconds in stacks.items() if seconds * 1e6 >= 1}
+
+
+def write_profile(profile: cProfile.Profile, directory, tag):
+    """
+    Writes {tag}.prof (pstats, e.g. for snakeviz) and {tag}.collapsed (flame graph text) into directory.
+    """
+    path = os.path.join(directory, tag)
+    # written aside and renamed, so a summary written meanwhile never reads a partial profile
+    temporary = f'{path}.prof.{os.getpid()}'
+    profile.dump_stats(temporary)
+    os.replace(temporary, f'{path}.prof')
+    stacks = collapsed_stacks(pstats.Stats(profile))
+    with open(f'{path}.collapsed', 'w', encoding='utf-8') as file:
+        file.writelines(f'{stack} {value}\n' for stack, value in sorted(stacks.items()))
+
+
+def profiled(directory, tag, function, *args, **kwargs):
+    """
+    Calls function under cProfile and writes its profile into directory (see write_profile),
+    just calls it when directory is None. Used in render workers, whose time the profile of the
+    parent process cannot see.
+    """
+    if directory is None:
+        return function(*args, **kwargs)
+
+    profile = cProfile.Profile()
+    try:
+        profile.enable()
+    except ValueError as e:
+        # another profile is active in the process, e.g. a concurrent daemon job
+        logger.debug(f'Not profiling {tag}: {e}')
+        return function(*args, **kwargs)
+    try:
+        return function(*args, **kwargs)
+    finally:
+        profile.disable()
+        try:
+            write_profile(profile, directory, tag)
+        except OSError as e:
+            logger.error(f'Unable to write profile {tag}: {e}')
+
+
+def write_summary(directory, lines=SUMMARY_LINES):
+    """
+    Combines all profiles of a run directory into summary.txt, functions ordered by cumulative time.
+    The daemon refreshes the summary after every job, concurrent jobs write it one at a time.
+    """
+    files = sorted(glob.glob(os.path.join(directory, '*.prof')))
+    if not files:
+        return
+    output = io.StringIO()
+    stats = pstats.Stats(*files, stream=output)
+    stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(lines)
+    stats.sort_stats(pstats.SortKey.TIME).print_stats(lines)
+    path = os.path.join(directory, 'summary.txt')
+    with _summary_lock:
+        try:
+            with open(f'{path}.{os.getpid()}', 'w', encoding='utf-8') as file:
+                file.write(f'{len(files)} profiles\n')
+                file.write(output.getvalue())
+            os.replace(f'{path}.{os.getpid()}', path)
+        except OSError as e:
+            logger.error(f'Unable to write profile summary {path}: {e}')
+            return
+    logger.info(f'Profiles written to {directory}')
@@ -4,5 +4,7 @@ from .gios_station_data import GiosStationData
 from .gios_station_data import Parameter
 from .esa_station import  EsaStation
 from .esa_station_data import EsaStationData
+from .observed_datetime import ObservedDatetime
+from .rollup import Rollup
 
-__all__ = ['Base', 'GiosStation', 'GiosStationData', 'Parameter', 'EsaStation', 'EsaStationData']
\ No newline at end of file
+__all__ = ['Base', 'GiosStation', 'GiosStationData', 'Parameter', 'EsaStation', 'EsaStationData', 'ObservedDatetime', 'Rollup']
\ No newline at end of file
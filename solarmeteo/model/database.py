@@ -0,0 +1,167 @@
+###
+# SolarMeteo    : https://github.com/pa810p/solarmeteo
+# Author        : Pawel Prokop
+# License       : GNU GENERAL PUBLIC LICENSE v3
+###
+
+import threading
+from datetime import datetime
+
+from sqlalchemy import create_engine, event, func, cast, type_coerce, literal_column, Integer, DateTime
+from sqlalchemy.dialects import postgresql, sqlite
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+# pragmas of every SQLite connection: readers are not blocked by a writer (WAL) and writers wait
+# for each other instead of failing with 'database is locked'
+SQLITE_PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA busy_timeout=30000',
+)
+
+# bound parameters allowed in a single statement, SQLite limit is 32766 since 3.32
+MAX_PARAMETERS = {'sqlite': 32766, 'postgresql': 65535}
+
+
+def _configure_sqlite(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        for pragma in SQLITE_PRAGMAS:
+            cursor.execute(pragma)
+    finally:
+        cursor.close()
+
+
+def get_engine(db_url):
+    """
+    Returns engine for the database url, engines (and their connection pools) are created once
+    and shared within the process. Connections of SQLite databases are switched to WAL mode.
+    """
+    with _engines_lock:
+        engine = _engines.get(db_url)
+        if engine is None:
+            engine = create_engine(db_url, pool_pre_ping=True)
+            if engine.dialect.name == 'sqlite':
+                event.listen(engine, 'connect', _configure_sqlite)
+            _engines[db_url] = engine
+        return engine
+
+
+def dispose_engines():
+    """
+    Closes pooled connections of all shared engines, e.g. after fork.
+    """
+    with _engines_lock:
+        for engine in _engines.values():
+            engine.dispose()
+        _engines.clear()
+
+
+def dialect_name(bind):
+    """
+    :param bind: session, connection or engine
+    :return: name of the bind's database dialect, e.g. 'postgresql' or 'sqlite'
+    """
+    return bind.get_bind().dialect.name if hasattr(bind, 'get_bind') else bind.dialect.name
+
+
+def dialect_insert(bind, table):
+    """
+    Returns INSERT construct of the bind's dialect which supports ON CONFLICT clauses
+    (on_conflict_do_update, on_conflict_do_nothing) on PostgreSQL and SQLite.
+
+    :param bind: session, connection or engine
+    :param table: mapped class or table
+    """
+    if dialect_name(bind) == 'sqlite':
+        return sqlite.insert(table)
+    return postgresql.insert(table)
+
+
+def _batches(rows, size, key=None):
+    """
+    Splits rows into batches of at most size rows, a row whose key is already in the current batch
+    starts the next one.
+    """
+    batch, keys = [], set()
+    for row in rows:
+        row_key = key(row) if key is not None else None
+        if len(batch) >= size or (key is not None and row_key in keys):
+            yield batch
+            batch, keys = [], set()
+        batch.append(row)
+        keys.add(row_key)
+    if batch:
+        yield batch
+
+
+def bulk_upsert(session, table, rows, index_elements=None, set_=None, returning=None):
+    """
+    Inserts rows with multi-row INSERT ... ON CONFLICT statements, each statement carries as many rows
+    as the dialect's limit of bound parameters allows. Rows in conflict with an existing row (or with
+    an earlier row of rows) are skipped, or updated when set_ is given. PostgreSQL does not update a row
+    twice within a statement, so with set_ rows of the same index_elements go to separate statements
+    and are applied in order.
+
+    :param session: database session, statements are executed within its transaction
+    :param table: mapped class or table
+    :param rows: list of dicts with the same keys
+    :param index_elements: columns of the unique constraint in conflict, required with set_
+    :param set_: function of the statement's excluded columns returning dict of updated values
+    :param returning: columns returned for inserted (and updated) rows
+    :return: list of returned rows, empty when returning is not given
+    """
+    if not rows:
+        return []
+
+    table = getattr(table, '__table__', table)
+    per_statement = max(1, MAX_PARAMETERS.get(dialect_name(session), 999) // len(rows[0]))
+    key = None
+    if set_ is not None:
+        names = [getattr(column, 'key', column) for column in index_elements]
+        key = lambda row: tuple(row[name] for name in names)
+    returned = []
+    for batch in _batches(rows, per_statement, key):
+        statement = dialect_insert(session, table).values(batch)
+        if set_ is None:
+            statement = statement.on_conflict_do_nothing(index_elements=index_elements)
+        else:
+            statement = statement.on_conflict_do_update(index_elements=index_elements,
+                                                        set_=set_(statement.excluded))
+        if returning:
+            returned.extend(session.execute(statement.returning(*returning)).all())
+        else:
+            session.execute(statement)
+    return returned
+
+
+def to_datetime(value):
+    """
+    Converts ISO formatted string (as received from external services) or datetime to a naive datetime,
+    the same way the database casts strings into timestamp without time zone.
+    """
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return value.replace(tzinfo=None)
+
+
+def time_bucket(column, minutes, dialect):
+    """
+    Returns SQL expression aligning datetime column to the beginning of its bucket of given size,
+    buckets are aligned to unix epoch (e.g. 10 minute buckets start at full 10 minutes).
+
+    :param column: datetime column
+    :param minutes: bucket size in minutes
+    :param dialect: name of database dialect, 'postgresql' or 'sqlite'
+    """
+    # constants are rendered inline, so the expression is identical in SELECT and GROUP BY
+    seconds = literal_column(str(int(minutes * 60)), Integer)
+    if dialect == 'sqlite':
+        epoch = cast(func.strftime(literal_column("'%s'"), column), Integer)
+        expression = func.datetime((epoch // seconds) * seconds, literal_column("'unixepoch'"))
+    else:
+        epoch = func.extract('epoch', column)
+        expression = func.to_timestamp(func.floor(epoch / seconds) * seconds).op('AT TIME ZONE')(literal_column("'UTC'"))
+    return type_coerce(expression, DateTime)
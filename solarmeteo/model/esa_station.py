@@ -7,7 +7,7 @@ class EsaStation(Base):
     __tablename__ = 'esa_station'
 
     id = Column(Integer, Sequence('esa_station_id_seq'), primary_key=True)
-    name = Column(String, nullable=False)
+    name = Column(String, nullable=False, unique=True)
     street = Column(String)
     post_code = Column(String)
     city = Column(String)
@@ -1,10 +1,12 @@
-from sqlalchemy import Column, Float, DateTime, Integer, ForeignKey, Sequence
+from sqlalchemy import Column, Float, DateTime, Integer, ForeignKey, Sequence, UniqueConstraint, Index
 from sqlalchemy.orm import relationship
 
 from .base import Base
 
 class EsaStationData(Base):
     __tablename__ = 'esa_station_data'
+    __table_args__ = (UniqueConstraint('esa_station_id', 'datetime', name='uq_esa_station_id_datetime'),
+                      Index('ix_esa_station_data_datetime_brin', 'datetime', postgresql_using='brin'))
 
     id = Column(Integer, Sequence('esa_station_data_id_seq'), primary_key=True)
     esa_station_id = Column(Integer, ForeignKey('esa_station.id'), nullable=False)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, Sequence, DateTime, ForeignKey
+from sqlalchemy import Column, String, Integer, Sequence, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from .base import Base
 
@@ -6,13 +6,16 @@ class Parameter(Base):
     __tablename__ = 'gios_parameter'
 
     id = Column(Integer, Sequence('gios_parameter_id_seq'), primary_key=True)
-    name = Column(String, nullable=False)
+    name = Column(String, nullable=False, unique=True)
 
     station_data = relationship('GiosStationData', back_populates='parameter')
 
 
 class GiosStationData(Base):
     __tablename__ = 'gios_station_data'
+    __table_args__ = (Index('ix_gios_station_data_station_parameter_datetime',
+                            'gios_station_id', 'parameter_id', 'datetime', unique=True),
+                      Index('ix_gios_station_data_datetime_brin', 'datetime', postgresql_using='brin'))
 
     id = Column(Integer, Sequence('gios_station_data_id_seq'), primary_key=True)
     gios_station_id = Column(Integer, ForeignKey('gios_station.id'), nullable=False)
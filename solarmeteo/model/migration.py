@@ -0,0 +1,57 @@
+###
+# SolarMeteo    : https://github.com/pa810p/solarmeteo
+# Author        : Pawel Prokop
+# License       : GNU GENERAL PUBLIC LICENSE v3
+###
+
+from alembic import op
+from sqlalchemy import Sequence, text
+from sqlalchemy.sql.ddl import CreateSequence, DropSequence
+
+# Helpers of alembic migrations running on PostgreSQL and SQLite. SQLite has no sequences, integer
+# primary keys are filled by rowid, and constraints of existing tables are altered in batch mode.
+
+
+def is_postgresql() -> bool:
+    return op.get_bind().dialect.name == 'postgresql'
+
+
+def create_sequence(name):
+    if is_postgresql():
+        op.execute(CreateSequence(Sequence(name)))
+
+
+def drop_sequence(name):
+    if is_postgresql():
+        op.execute(DropSequence(Sequence(name)))
+
+
+def sequence_default(name):
+    """
+    :return: server default of an id column filled from the sequence, None on SQLite
+    """
+    return text(f"nextval('{name}'::regclass)") if is_postgresql() else None
+
+
+def create_unique_constraint(name, table, columns):
+    with op.batch_alter_table(table) as batch:
+        batch.create_unique_constraint(name, columns)
+
+
+def drop_unique_constraint(name, table):
+    with op.batch_alter_table(table) as batch:
+        batch.drop_constraint(name, type_='unique')
+
+
+def date_trunc(resolution, column) -> str:
+    """
+    :param resolution: 'hour', 'day' or 'month'
+    :param column: datetime column
+    :return: SQL expression truncating column to the beginning of its hour, day or month
+    """
+    if is_postgresql():
+        return f"date_trunc('{resolution}', {column})"
+    # formatted as SQLAlchemy stores DateTime in SQLite, so buckets compare and conflict with ORM ones
+    formats = {'hour': '%Y-%m-%d %H:00:00.000000', 'day': '%Y-%m-%d 00:00:00.000000',
+               'month': '%Y-%m-01 00:00:00.000000'}
+    return f"strftime('{formats[resolution]}', {column})"
@@ -0,0 +1,43 @@
+###
+# SolarMeteo    : https://github.com/pa810p/solarmeteo
+# Author        : Pawel Prokop
+# License       : GNU GENERAL PUBLIC LICENSE v3
+###
+
+from sqlalchemy import Column, String, DateTime
+
+from .base import Base
+from .database import dialect_insert, to_datetime
+
+SOURCE_IMGW = 'imgw'
+SOURCE_ESA = 'esa'
+SOURCE_GIOS = 'gios'
+
+
+class ObservedDatetime(Base):
+    """
+    Distinct measurement datetimes per data source, maintained by updaters. The primary key
+    (source, datetime) serves latest-N lookups without scanning measurement tables.
+    """
+    __tablename__ = 'observed_datetime'
+
+    source = Column(String, primary_key=True)
+    datetime = Column(DateTime, primary_key=True)
+
+    def __repr__(self):
+        return f"<ObservedDatetime(source={self.source}, datetime={self.datetime})>"
+
+
+def observe_datetimes(session, source, datetimes):
+    """
+    Records measurement datetimes of a source within the session's transaction,
+    datetimes already known are ignored.
+
+    :param session: database session
+    :param source: one of SOURCE_* constants
+    :param datetimes: iterable of datetimes or ISO formatted strings
+    """
+    values = [{'source': source, 'datetime': d} for d in {to_datetime(d) for d in datetimes if d is not None}]
+    if not values:
+        return
+    session.execute(dialect_insert(session, ObservedDatetime).values(values).on_conflict_do_nothing())
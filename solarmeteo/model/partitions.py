@@ -0,0 +1,186 @@
+###
+# SolarMeteo    : https://github.com/pa810p/solarmeteo
+# Author        : Pawel Prokop
+# License       : GNU GENERAL PUBLIC LICENSE v3
+###
+
+import re
+import threading
+from datetime import datetime
+
+from sqlalchemy import text, delete
+
+from .database import to_datetime
+from .observed_datetime import ObservedDatetime, SOURCE_IMGW, SOURCE_ESA, SOURCE_GIOS
+
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+# measurement tables partitioned monthly by datetime (PostgreSQL only) and their data sources
+PARTITIONED_TABLES = {
+    'station_data': SOURCE_IMGW,
+    'esa_station_data': SOURCE_ESA,
+    'gios_station_data': SOURCE_GIOS,
+}
+
+# partitions created ahead of the current month
+FUTURE_PARTITIONS = 2
+
+_PARTITION_NAME = re.compile(r'^(?P<table>.+)_y(?P<year>\d{4})m(?P<month>\d{2})$')
+
+_known = set()
+_partitioned = {}
+_lock = threading.Lock()
+
+
+def month_start(value) -> datetime:
+    return datetime(value.year, value.month, 1)
+
+
+def add_months(month: datetime, months: int) -> datetime:
+    index = month.year * 12 + month.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table: str, month: datetime) -> str:
+    return f'{table}_y{month.year:04d}m{month.month:02d}'
+
+
+def partition_month(name: str):
+    """
+    Returns first day of the month covered by partition of given name, None for other tables.
+    """
+    match = _PARTITION_NAME.match(name)
+    if match is None:
+        return None
+    return datetime(int(match.group('year')), int(match.group('month')), 1)
+
+
+def is_partitioned(engine, table: str) -> bool:
+    """
+    Checks (once per process) whether table is a partitioned PostgreSQL table.
+    """
+    key = (engine.url.render_as_string(hide_password=True), table)
+    with _lock:
+        if key in _partitioned:
+            return _partitioned[key]
+
+    if engine.dialect.name != 'postgresql':
+        partitioned = False
+    else:
+        with engine.connect() as connection:
+            partitioned = connection.execute(text(
+                'SELECT count(*) FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid '
+                'WHERE c.relname = :table AND pg_table_is_visible(c.oid)'), {'table': table}).scalar() > 0
+
+    with _lock:
+        _partitioned[key] = partitioned
+    return partitioned
+
+
+def create_partition(connection, table: str, month: datetime):
+    connection.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {partition_name(table, month)} PARTITION OF {table} "
+        f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{add_months(month, 1):%Y-%m-%d}')"))
+
+
+def ensure_partitions(engine, table: str, datetimes=(), future=FUTURE_PARTITIONS):
+    """
+    Creates monthly partitions of table for months of given datetimes and for the current month
+    and future months ahead, so inserts never miss a partition. Partitions known to exist are
+    remembered, so repeated calls are cheap. Does nothing when table is not partitioned.
+
+    Should be called before the data are inserted, outside of the transaction inserting them,
+    DDL is executed in its own transaction.
+
+    :param engine: database engine
+    :param table: one of PARTITIONED_TABLES
+    :param datetimes: datetimes (or ISO formatted strings) about to be inserted
+    :param future: number of months ahead of the current one
+    """
+    if not is_partitioned(engine, table):
+        return
+
+    current = month_start(datetime.now())
+    months = {add_months(current, months) for months in range(future + 1)}
+    months.update(month_start(to_datetime(d)) for d in datetimes if d is not None)
+
+    url = engine.url.render_as_string(hide_password=True)
+    with _lock:
+        missing = sorted(month for month in months if (url, table, month) not in _known)
+    if not missing:
+        return
+
+    with engine.begin() as connection:
+        for month in missing:
+            logger.debug(f'Ensure partition {partition_name(table, month)}')
+            create_partition(connection, table, month)
+
+    with _lock:
+        _known.update((url, table, month) for month in missing)
+
+
+def list_partitions(engine, table: str) -> dict:
+    """
+    Returns attached monthly partitions of table: partition name -> first day of month.
+    """
+    if not is_partitioned(engine, table):
+        return {}
+
+    with engine.connect() as connection:
+        names = connection.execute(text(
+            'SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid '
+            'JOIN pg_class p ON p.oid = i.inhparent WHERE p.relname = :table'), {'table': table}).scalars().all()
+
+    partitions = {name: partition_month(name) for name in names}
+    return {name: month for name, month in sorted(partitions.items()) if month is not None}
+
+
+def detach_partitions(engine, table: str, before: datetime, drop=False) -> list:
+    """
+    Retention of partitioned measurement tables: partitions of months entirely before given
+    datetime are detached (kept as standalone tables for archival) or dropped, which is
+    instant compared to DELETE of their rows.
+
+    :param engine: database engine
+    :param table: one of PARTITIONED_TABLES
+    :param before: datetime, partitions of older months are removed
+    :param drop: drop detached partitions
+    :return: list of detached partition names
+    """
+    boundary = month_start(before)
+    detached = [name for name, month in list_partitions(engine, table).items() if add_months(month, 1) <= boundary]
+
+    for name in detached:
+        with engine.begin() as connection:
+            connection.execute(text(f'ALTER TABLE {table} DETACH PARTITION {name}'))
+            if drop:
+                connection.execute(text(f'DROP TABLE {name}'))
+        logger.info(f"{'Dropped' if drop else 'Detached'} partition {name}")
+
+    url = engine.url.render_as_string(hide_password=True)
+    with _lock:
+        _known.difference_update((url, table, partition_month(name)) for name in detached)
+
+    return detached
+
+
+def apply_retention(engine, before: datetime, drop=False) -> dict:
+    """
+    Detaches (or drops) partitions older than given datetime of all partitioned measurement tables
+    and removes their datetimes from observed_datetime.
+
+    :return: dict table -> list of detached partition names
+    """
+    boundary = month_start(before)
+    result = {}
+    for table, source in PARTITIONED_TABLES.items():
+        if not is_partitioned(engine, table):
+            logger.warning(f'Table {table} is not partitioned, retention skipped.')
+            continue
+        result[table] = detach_partitions(engine, table, boundary, drop=drop)
+        with engine.begin() as connection:
+            connection.execute(delete(ObservedDatetime).where(
+                ObservedDatetime.source == source, ObservedDatetime.datetime < boundary))
+    return result
@@ -0,0 +1,124 @@
+###
+# SolarMeteo    : https://github.com/pa810p/solarmeteo
+# Author        : Pawel Prokop
+# License       : GNU GENERAL PUBLIC LICENSE v3
+###
+
+from datetime import datetime
+
+from sqlalchemy import Column, String, Integer, Float, DateTime, case
+
+from .base import Base
+from .database import bulk_upsert, to_datetime
+from .observed_datetime import SOURCE_IMGW, SOURCE_ESA, SOURCE_GIOS
+
+RESOLUTION_HOUR = 'hour'
+RESOLUTION_DAY = 'day'
+RESOLUTION_MONTH = 'month'
+RESOLUTION_YEAR = 'year'
+
+# from the finest to the coarsest
+RESOLUTIONS = (RESOLUTION_HOUR, RESOLUTION_DAY, RESOLUTION_MONTH, RESOLUTION_YEAR)
+
+# rollups maintained per source, imgw and gios measurements are hourly already
+ROLLUP_RESOLUTIONS = {
+    SOURCE_IMGW: (RESOLUTION_DAY, RESOLUTION_MONTH),
+    SOURCE_ESA: (RESOLUTION_HOUR, RESOLUTION_DAY, RESOLUTION_MONTH),
+    SOURCE_GIOS: (RESOLUTION_DAY, RESOLUTION_MONTH),
+}
+
+# rolled up columns, gios variables are names of gios parameters
+IMGW_ROLLUP_VARIABLES = ('temperature', 'wind_speed', 'humidity', 'precipitation', 'pressure')
+ESA_ROLLUP_VARIABLES = ('temperature', 'humidity', 'pressure', 'pm10', 'pm25')
+
+
+class Rollup(Base):
+    """
+    Aggregates (count, sum, min, max) of a measured variable per station and time bucket,
+    maintained incrementally by updaters. Mean is sum / count, aggregates of several buckets
+    or stations are combined by adding counts and sums.
+    """
+    __tablename__ = 'rollup'
+
+    source = Column(String, primary_key=True)
+    resolution = Column(String, primary_key=True)
+    variable = Column(String, primary_key=True)
+    bucket = Column(DateTime, primary_key=True)
+    station_id = Column(Integer, primary_key=True)
+    count = Column(Integer, nullable=False)
+    sum = Column(Float, nullable=False)
+    min = Column(Float, nullable=False)
+    max = Column(Float, nullable=False)
+
+    def __repr__(self):
+        return (f"<Rollup(source={self.source}, resolution={self.resolution}, variable={self.variable}, "
+                f"bucket={self.bucket}, station_id={self.station_id}, count={self.count}, sum={self.sum}, "
+                f"min={self.min}, max={self.max})>")
+
+
+def bucket_start(value: datetime, resolution: str) -> datetime:
+    match resolution:
+        case 'hour': return value.replace(minute=0, second=0, microsecond=0)
+        case 'day': return datetime(value.year, value.month, value.day)
+        case 'month': return datetime(value.year, value.month, 1)
+        case 'year': return datetime(value.year, 1, 1)
+        case _: raise ValueError(f"Unsupported resolution: {resolution}")
+
+
+def add_to_rollups(session, source, station_id, measured, values: dict):
+    """
+    Adds a stored measurement to rollups of all resolutions of the source, within the session's
+    transaction, so a measurement rejected by the database is not counted.
+
+    :param session: database session
+    :param source: one of SOURCE_* constants
+    :param station_id: id of the station in source's station table
+    :param measured: datetime (or ISO formatted string) of the measurement
+    :param values: variable -> value, None values are skipped
+    """
+    add_all_to_rollups(session, source, [(station_id, measured, values)])
+
+
+def add_all_to_rollups(session, source, measurements):
+    """
+    Adds stored measurements to rollups like add_to_rollups does. Measurements falling into the same
+    bucket are aggregated first, so every rollup row is upserted once by a few bulk statements.
+
+    :param session: database session
+    :param source: one of SOURCE_* constants
+    :param measurements: iterable of (station_id, measured datetime or ISO string, dict variable -> value)
+    """
+    aggregates = {}
+    for station_id, measured, values in measurements:
+        measured = to_datetime(measured)
+        for resolution in ROLLUP_RESOLUTIONS[source]:
+            bucket = bucket_start(measured, resolution)
+            for variable, value in values.items():
+                if value is None:
+                    continue
+                value = float(value)
+                aggregate = aggregates.get((resolution, variable, bucket, station_id))
+                if aggregate is None:
+                    aggregates[(resolution, variable, bucket, station_id)] = [1, value, value, value]
+                else:
+                    aggregate[0] += 1
+                    aggregate[1] += value
+                    aggregate[2] = min(aggregate[2], value)
+                    aggregate[3] = max(aggregate[3], value)
+    if not aggregates:
+        return
+
+    rows = [
+        {'source': source, 'resolution': resolution, 'variable': variable, 'bucket': bucket,
+         'station_id': station_id, 'count': count, 'sum': total, 'min': minimum, 'max': maximum}
+        for (resolution, variable, bucket, station_id), (count, total, minimum, maximum) in aggregates.items()
+    ]
+    bulk_upsert(
+        session, Rollup, rows,
+        index_elements=[Rollup.source, Rollup.resolution, Rollup.variable, Rollup.bucket, Rollup.station_id],
+        set_=lambda excluded: {
+            'count': Rollup.count + excluded['count'],
+            'sum': Rollup.sum + excluded['sum'],
+            'min': case((excluded['min'] < Rollup.min, excluded['min']), else_=Rollup.min),
+            'max': case((excluded['max'] > Rollup.max, excluded['max']), else_=Rollup.max),
+        })
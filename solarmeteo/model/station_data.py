@@ -6,7 +6,7 @@
 
 
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy import Column, Integer, Float, DateTime, Sequence
+from sqlalchemy import Column, Integer, Float, DateTime, Sequence, UniqueConstraint, Index
 
 Base = declarative_base()
 
@@ -22,6 +22,8 @@ IMGW_PRESSURE = 'cisnienie'
 
 class StationData(Base):
     __tablename__ = 'station_data'
+    __table_args__ = (UniqueConstraint('station_id', 'datetime', name='uq_station_id_datetime'),
+                      Index('ix_station_data_datetime_brin', 'datetime', postgresql_using='brin'))
 
     id = Column(Integer, Sequence('station_id_seq'), primary_key=True)
     station_id = Column(Integer, nullable=False)
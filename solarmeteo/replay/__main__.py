@@ -0,0 +1,59 @@
+###
+# SolarMeteo    : https://github.com/pa810p/solarmeteo
+# Author        : Pawel Prokop
+# License       : GNU GENERAL PUBLIC LICENSE v3
+###
+
+import optparse
+import sys
+
+from solarmeteo.logger.logs import get_log_level, setup_logging
+from solarmeteo.replay.server import ReplayServer
+
+
+def _parse_scale(values):
+    scale = dict()
+    for value in values or []:
+        prefix, _, factor = value.rpartition('=')
+        scale[prefix] = int(factor)
+    return scale
+
+
+def main(argv=None):
+    parser = optparse.OptionParser(
+        usage="%prog DIRECTORY [--port 8000] [--latency-ms 200] [--error-rate 0.01] [--scale HOST=10]",
+        description='Serves feeds recorded with solarmeteo --record, e.g. IMGW synop data recorded from '
+                    'https://danepubliczne.imgw.pl/api/data/synop is served at '
+                    'http://localhost:8000/danepubliczne.imgw.pl/api/data/synop')
+    parser.add_option('--host', dest='host', default='127.0.0.1', help='listening address, default is %default')
+    parser.add_option('--port', dest='port', type=int, default=8000, help='listening port, default is %default')
+    parser.add_option('--latency-ms', dest='latency_ms', type=int, default=0,
+                      help='delay of every response in milliseconds, default is %default')
+    parser.add_option('--jitter-ms', dest='jitter_ms', type=int, default=0,
+                      help='random delay added to latency in milliseconds, up to, default is %default')
+    parser.add_option('--error-rate', dest='error_rate', type=float, default=0.0,
+                      help='share of requests answered with 503, default is %default')
+    parser.add_option('--scale', dest='scale', action='append', metavar='PREFIX=FACTOR',
+                      help='multiply records of feeds starting with prefix, e.g. public-esa.ose.gov.pl=10, '
+                           'may be repeated')
+    parser.add_option('--seed', dest='seed', type=int, default=0, help='seed of random errors and delays')
+    parser.add_option('-l', '--log-level', dest='log_level', default='info', help='logging level')
+
+    (options, args) = parser.parse_args(argv)
+    if len(args) != 1:
+        parser.error('directory of recordings is required')
+
+    setup_logging(level=get_log_level(options.log_level), log_file="replay.log", project_prefix="solarmeteo")
+
+    server = ReplayServer(args[0], host=options.host, port=options.port, latency_ms=options.latency_ms,
+                          jitter_ms=options.jitter_ms, error_rate=options.error_rate,
+                          scale=_parse_scale(options.scale), seed=options.seed)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,92 @@
+###
+# SolarMeteo    : https://github.com/pa810p/solarmeteo
+# Author        : Pawel Prokop
+# License       : GNU GENERAL PUBLIC LICENSE v3
+###
+
+import hashlib
+import json
+import os
+import re
+import threading
+from urllib.parse import urlsplit, parse_qsl, urlencode
+
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+INDEX_FILE = 'index.json'
+# query parameters that are never recorded, requests are matched without them
+SECRET_PARAMETERS = ('api_key',)
+# response headers kept with a recorded body
+RECORDED_HEADERS = ('Content-Type', 'ETag', 'Last-Modified')
+
+
+def replay_key(url) -> str:
+    """
+    Key of a request in recordings: /host/path?query, without secret parameters. A replay server serving
+    recordings of several feeds is addressed as http://replay-host:port/host/path?query.
+    """
+    parts = urlsplit(url)
+    query = [(name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+             if name not in SECRET_PARAMETERS]
+    key = f'/{parts.netloc}{parts.path}' if parts.netloc else parts.path
+    return f'{key}?{urlencode(query)}' if query else key
+
+
+def replay_url(replay_base, url) -> str:
+    """
+    Address of recorded url on a replay server, e.g. replay_url('http://localhost:8000', IMGW url).
+    """
+    return replay_base.rstrip('/') + replay_key(url)
+
+
+def _file_name(key):
+    name = re.sub(r'[^\w.-]+', '_', key.split('?')[0]).strip('_')[:100]
+    return f'{name}-{hashlib.sha1(key.encode("utf-8")).hexdigest()[:10]}.body'
+
+
+class Recorder:
+    """
+    Stores responses downloaded by HttpClient in a directory, so feeds can be served later by
+    ReplayServer. Every distinct request keeps its latest response, the index maps request keys
+    (see replay_key) to body files, status and headers.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self.index = load_index(directory)
+
+    def record(self, url, response):
+        """
+        Records a response of url. The body of a streamed response is read here, later iteration of
+        its content is served from memory.
+        """
+        key = replay_key(url)
+        file_name = _file_name(key)
+        with open(os.path.join(self.directory, file_name), 'wb') as file:
+            file.write(response.content)
+        with self._lock:
+            self.index[key] = {
+                'file': file_name,
+                'status': response.status_code,
+                'headers': {name: response.headers[name] for name in RECORDED_HEADERS if name in response.headers},
+            }
+            self._save_index()
+        logger.debug(f'Recorded {key} to {file_name}')
+
+    def _save_index(self):
+        path = os.path.join(self.directory, INDEX_FILE)
+        with open(f'{path}.tmp', 'w', encoding='utf-8') as file:
+            json.dump(self.index, file, indent=1, sort_keys=True)
+        os.replace(f'{path}.tmp', path)
+
+
+def load_index(directory) -> dict:
+    path = os.path.join(directory, INDEX_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as file:
+        return json.load(file)
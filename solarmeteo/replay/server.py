@@ -0,0 +1,230 @@
+###
+# SolarMeteo    : https://github.com/pa810p/solarmeteo
+# Author        : Pawel Prokop
+# License       : GNU GENERAL PUBLIC LICENSE v3
+###
+
+import copy
+import gzip
+import json
+import os
+import random
+import re
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from solarmeteo.replay.recorder import load_index, replay_key
+
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+# identifiers of copies of scaled records are shifted by multiples of the offset
+SCALE_ID_OFFSET = 1_000_000
+# coordinates of copies of scaled records are moved randomly by up to the spread (degrees)
+SCALE_COORDINATE_SPREAD = 0.05
+
+_IDENTIFIER_KEYS = ('id_stacji', 'Identyfikator stacji')
+_NAME_KEYS = ('stacja', 'name', 'Nazwa stacji')
+_COORDINATE_KEYS = ('longitude', 'latitude', 'WGS84 λ E', 'WGS84 φ N')
+
+
+def _shift(value, delta):
+    if isinstance(value, str):
+        return type(value)(round(float(value) + delta, 6))
+    return value + delta
+
+
+def _distinguish(record, copy_number, rng):
+    for key, value in record.items():
+        if value is None:
+            continue
+        if isinstance(value, dict):
+            _distinguish(value, copy_number, rng)
+        elif key in _IDENTIFIER_KEYS:
+            record[key] = type(value)(int(value) + copy_number * SCALE_ID_OFFSET)
+        elif key in _NAME_KEYS:
+            record[key] = f'{value} #{copy_number}'
+        elif key in _COORDINATE_KEYS:
+            record[key] = _shift(value, rng.uniform(-SCALE_COORDINATE_SPREAD, SCALE_COORDINATE_SPREAD))
+
+
+def _records(document):
+    if isinstance(document, list):
+        return document
+    if isinstance(document, dict):
+        for value in document.values():
+            if isinstance(value, list) and value and isinstance(value[0], dict):
+                return value
+    return None
+
+
+def scale_payload(body: bytes, factor, seed=0) -> bytes:
+    """
+    Multiplies records of a json feed (a top level array or the first array of records of a top level
+    object, e.g. smog_data of ESA) by factor. Copies are distinct stations: identifiers are shifted by
+    multiples of SCALE_ID_OFFSET, names get a #n suffix and coordinates are moved slightly.
+    Documents without records are returned unchanged.
+    """
+    if factor == 1:
+        return body
+    try:
+        document = json.loads(body)
+    except ValueError:
+        return body
+    records = _records(document)
+    if records is None:
+        return body
+
+    rng = random.Random(seed)
+    originals = list(records)
+    for copy_number in range(1, int(factor)):
+        for record in originals:
+            duplicate = copy.deepcopy(record)
+            _distinguish(duplicate, copy_number, rng)
+            records.append(duplicate)
+    return json.dumps(document, ensure_ascii=False).encode('utf-8')
+
+
+def _original_key(key):
+    # requests of copies of scaled stations (e.g. GIOS index of a station) are served by the original
+    return re.sub(r'\d{7,}', lambda match: str(int(match.group()) % SCALE_ID_OFFSET), key)
+
+
+class ReplayServer:
+    """
+    Local stand-in of upstream feeds serving responses captured by Recorder. Latency, error rate and
+    scaling of payloads are configurable, so ingest of updaters can be load tested and benchmarked offline.
+    Conditional requests are answered with 304 when ETag matches and responses are gzipped on request.
+    """
+
+    def __init__(self, directory, host='127.0.0.1', port=0, latency_ms=0, jitter_ms=0, error_rate=0.0,
+                 scale=None, seed=0):
+        """
+        :param directory: directory of recordings
+        :param port: listening port, 0 picks a free one
+        :param latency_ms: delay of every response
+        :param jitter_ms: random delay added to latency, up to
+        :param error_rate: share of requests answered with 503 Service Unavailable
+        :param scale: dict of key prefix (e.g. public-esa.ose.gov.pl) -> factor records are multiplied by
+        :param seed: seed of random errors, delays and scaled coordinates
+        """
+        self.directory = directory
+        self.index = load_index(directory)
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.error_rate = error_rate
+        self.scale = {'/' + prefix.strip('/'): factor for prefix, factor in (scale or {}).items()}
+        self.seed = seed
+
+        self.requests = 0
+        self.errors = 0
+        self._random = random.Random(seed)
+        self._bodies = dict()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def _factor(self, key):
+        return next((factor for prefix, factor in self.scale.items() if key.startswith(prefix)), 1)
+
+    def lookup(self, path):
+        """
+        :return: (recorded entry, body) of requested path, (None, None) when it has not been recorded
+        """
+        key = replay_key(path)
+        entry = self.index.get(key) or self.index.get(_original_key(key))
+        if entry is None:
+            return None, None
+        with self._lock:
+            body = self._bodies.get(key)
+        if body is None:
+            with open(os.path.join(self.directory, entry['file']), 'rb') as file:
+                body = scale_payload(file.read(), self._factor(key), self.seed)
+            with self._lock:
+                self._bodies[key] = body
+        return entry, body
+
+    def _draw(self):
+        with self._lock:
+            self.requests += 1
+            delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0)
+            failed = self._random.random() < self.error_rate
+            if failed:
+                self.errors += 1
+        return delay, failed
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                delay, failed = server._draw()
+                if delay:
+                    time.sleep(delay)
+                if failed:
+                    return self._reply(503, b'', {})
+
+                entry, body = server.lookup(self.path)
+                if entry is None:
+                    logger.warning(f'Not recorded: {self.path}')
+                    return self._reply(404, b'', {})
+
+                headers = dict(entry['headers'])
+                factor = server._factor(replay_key(self.path))
+                if 'ETag' in headers and factor != 1:
+                    etag = headers['ETag'].rstrip('"')
+                    headers['ETag'] = f'{etag}-x{factor}"'
+                if headers.get('ETag') and self.headers.get('If-None-Match') == headers['ETag']:
+                    return self._reply(304, b'', headers)
+
+                if 'gzip' in self.headers.get('Accept-Encoding', ''):
+                    body = gzip.compress(body, compresslevel=1)
+                    headers['Content-Encoding'] = 'gzip'
+                self._reply(entry['status'], body, headers)
+
+            def _reply(self, status, body, headers):
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logger.debug(format % args)
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='replay-server', daemon=True)
+        self._thread.start()
+        logger.info(f'Replaying {len(self.index)} recorded responses on {self.url}')
+        return self
+
+    def serve_forever(self):
+        logger.info(f'Replaying {len(self.index)} recorded responses on {self.url}')
+        self._server.serve_forever()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+        return False
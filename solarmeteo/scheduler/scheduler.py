@@ -0,0 +1,163 @@
+###
+# SolarMeteo    : https://github.com/pa810p/solarmeteo
+# Author        : Pawel Prokop
+# License       : GNU GENERAL PUBLIC LICENSE v3
+###
+
+import json
+import os
+import signal
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable
+
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+
+@dataclass
+class Job:
+    name: str
+    interval: float
+    action: Callable = field(repr=False)
+    runs: int = 0
+    failures: int = 0
+    running: bool = False
+    last_start: datetime | None = None
+    last_end: datetime | None = None
+    last_duration: float | None = None
+    last_error: str | None = None
+    next_run: datetime | None = None
+
+    def status(self) -> dict:
+        return {
+            'interval': self.interval,
+            'runs': self.runs,
+            'failures': self.failures,
+            'running': self.running,
+            'last_start': self.last_start.isoformat(timespec='seconds') if self.last_start else None,
+            'last_end': self.last_end.isoformat(timespec='seconds') if self.last_end else None,
+            'last_duration': round(self.last_duration, 3) if self.last_duration is not None else None,
+            'last_error': self.last_error,
+            'next_run': self.next_run.isoformat(timespec='seconds') if self.next_run else None,
+        }
+
+
+class Scheduler:
+    """
+    In-process scheduler of the resident daemon. Every job runs in its own thread on its own interval,
+    so slow modules do not delay the others. An interval is measured from the start of the previous run,
+    a run longer than the interval is followed immediately by the next one (runs of one job never overlap).
+
+    Status of all jobs (last run, duration, errors) is available via status() and is written to
+    status_file after each run.
+    """
+
+    def __init__(self, status_file=None):
+        self.status_file = status_file
+        self.jobs = {}
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def add_job(self, name, interval, action):
+        """
+        :param name: unique job name
+        :param interval: seconds between starts of consecutive runs
+        :param action: callable without arguments
+        """
+        if name in self.jobs:
+            raise ValueError(f'Job {name} already scheduled')
+        job = Job(name=name, interval=float(interval), action=action)
+        self.jobs[name] = job
+        return job
+
+    def status(self) -> dict:
+        with self._lock:
+            return {name: job.status() for name, job in self.jobs.items()}
+
+    def run_job(self, job):
+        """
+        Runs job once and records its status, exceptions are logged and do not stop the scheduler.
+        """
+        with self._lock:
+            job.running = True
+            job.last_start = datetime.now()
+        logger.info(f'Job {job.name} started')
+        started = time.perf_counter()
+        error = None
+        try:
+            job.action()
+        except Exception as exception:
+            logger.exception(f'Job {job.name} failed: {exception}')
+            error = str(exception)
+
+        duration = time.perf_counter() - started
+        with self._lock:
+            job.running = False
+            job.runs += 1
+            job.last_end = datetime.now()
+            job.last_duration = duration
+            job.last_error = error
+            if error is not None:
+                job.failures += 1
+        logger.info(f'Job {job.name} finished in {duration:.3f}s')
+        self._write_status()
+
+    def _loop(self, job):
+        while not self._stop.is_set():
+            started = time.monotonic()
+            self.run_job(job)
+            delay = max(0.0, job.interval - (time.monotonic() - started))
+            with self._lock:
+                job.next_run = datetime.fromtimestamp(time.time() + delay)
+            self._write_status()
+            self._stop.wait(delay)
+
+    def _write_status(self):
+        if not self.status_file:
+            return
+        status = self.status()
+        try:
+            directory = os.path.dirname(self.status_file)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_file = f'{self.status_file}.{threading.get_ident()}.tmp'
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump({'updated': datetime.now().isoformat(timespec='seconds'), 'jobs': status}, f, indent=1)
+            os.replace(tmp_file, self.status_file)
+        except OSError as exception:
+            logger.warning(f'Cannot write scheduler status {self.status_file}: {exception}')
+
+    def start(self):
+        for job in self.jobs.values():
+            thread = threading.Thread(target=self._loop, args=(job,), name=f'job-{job.name}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def run_forever(self):
+        """
+        Starts all jobs and blocks until SIGINT or SIGTERM, then waits for running jobs to finish.
+        """
+        def terminate(signum, frame):
+            logger.info(f'Signal {signum} received, stopping scheduler.')
+            self._stop.set()
+
+        signal.signal(signal.SIGTERM, terminate)
+        logger.info(f'Scheduler starting jobs: {", ".join(self.jobs.keys())}')
+        self.start()
+        try:
+            while not self._stop.wait(1):
+                pass
+        except KeyboardInterrupt:
+            logger.info('Keyboard interrupt caught, terminating updates.')
+        self.stop()
+        logger.info('Goodbye.')
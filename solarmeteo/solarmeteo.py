@@ -6,16 +6,24 @@
 
 
 import configparser
+import functools
 import logging
+import multiprocessing
 import optparse
 import re
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
 
-from solarmeteo.heatmap.heatmap import HeatMap
 from solarmeteo.logger.logs import get_log_level, setup_logging
-from solarmeteo.updater.esa_updater import EsaUpdater
-from solarmeteo.updater.gios_updater import GiosUpdater
-from solarmeteo.updater.meteo_updater import MeteoUpdater
-from solarmeteo.updater.solar_updater import SolarUpdater
+from solarmeteo.metrics import metrics, profiler, memory
+from solarmeteo.model.database import get_engine
+from solarmeteo.model.partitions import apply_retention, add_months, month_start
+from solarmeteo.replay.recorder import Recorder
+from solarmeteo.scheduler.scheduler import Scheduler
+from solarmeteo.updater.http_client import HttpClient
+
+# Updaters and heatmaps are imported when used: heatmaps pull in geopandas, shapely, scipy, matplotlib,
+# imageio and PIL, which update-only runs never need (see python -m solarmeteo.benchmark --imports)
 
 
 _HEATMAP_RANGE_KEYS = (
@@ -26,9 +34,17 @@ _HEATMAP_RANGE_KEYS = (
     "precipitation",
     "pm10",
     "pm25",
+    "gios_pm10",
+    "gios_pm25",
+    "gios_no2",
+    "gios_o3",
+    "gios_so2",
 )
 
 
+_UPDATER_MODULES = ("imgw", "solar", "gios", "esa")
+
+
 def _parse_range_value(raw: str):
     """Parse dash-separated numeric range like 0-100 and return tuple or None."""
     if not raw:
@@ -51,6 +67,43 @@ def _load_heatmap_ranges(config: configparser.ConfigParser) -> dict:
     return ranges
 
 
+def _load_heatmap_grid_sizes(config: configparser.ConfigParser) -> dict:
+    """
+    Load interpolation grid sizes of [heatmap] section: grid_size as 'default' and every <key>_grid_size, where key
+    is a heatmap type (gios_* and fused_* included) or a file format.
+    """
+    grid_sizes = {}
+    if not config.has_section('heatmap'):
+        return grid_sizes
+    for option in config.options('heatmap'):
+        if option == 'grid_size':
+            grid_sizes['default'] = config.getint('heatmap', option)
+        elif option.endswith('_grid_size') and option != 'preview_grid_size':
+            grid_sizes[option.removesuffix('_grid_size')] = config.getint('heatmap', option)
+    return grid_sizes
+
+
+def _heatmap_class():
+    from solarmeteo.heatmap.heatmap import HeatMap
+    return HeatMap
+
+
+def _parse_modules(update: str) -> list:
+    """Parse comma separated list of updater modules, 'all' selects every module, 'none' no module."""
+    modules = []
+    for module in (update or '').split(','):
+        module = module.strip().lower()
+        if module == 'all':
+            return list(_UPDATER_MODULES)
+        if module == 'none':
+            return []
+        if module in _UPDATER_MODULES and module not in modules:
+            modules.append(module)
+        elif module:
+            raise ValueError(f"Unknown update module: {module}")
+    return modules
+
+
 def main():
     config = configparser.ConfigParser(interpolation=configparser.ExtendedInterpolation())
     config.read('meteo.properties')
@@ -59,7 +112,8 @@ def main():
 
     meteo_db_url = config['meteo.database']['url']
     log_level = config['meteo']['loglevel']
-    # meteo_daemonize = config['meteo.updater']['daemoinize'] == 'True'
+    daemonize = config.getboolean('meteo.updater', 'daemonize', fallback=False)
+    daemon_status_file = config.get('meteo.updater', 'status_file', fallback='logs/daemon_status.json')
 
     imgw_data_url = config['imgw']['url']
     imgw_update_interval = config['meteo.updater']['imgw_update_interval']
@@ -73,7 +127,12 @@ def main():
     height = config['solar']['height']
     solar_url = config['solar']['url']
     solar_update_interval = config['meteo.updater']['solar_update_interval']
-    # TODO: this will be a coma separated list
+    gios_update_interval = config.get('meteo.updater', 'gios_update_interval', fallback='3600')
+    esa_update_interval = config.get('meteo.updater', 'esa_update_interval', fallback='600')
+    solar_backfill_workers = config.getint('solar', 'backfill_workers', fallback=3)
+    solar_backfill_request_interval = config.getfloat('solar', 'backfill_request_interval', fallback=1.0)
+    solar_backfill_checkpoint_file = config.get('solar', 'backfill_checkpoint_file', fallback=None) or None
+    # comma separated list of imgw, solar, gios, esa or all
     update = config['meteo.updater']['modules']
     heatmap = None
     output_file = None
@@ -88,12 +147,41 @@ def main():
     gios_stations = False
     gios_max_delay_sec = int(config['gios']['max_delay_sec'])
     esa_url = config['esa']['url']
+    esa_bucket_minutes = config.getint('esa', 'bucket_minutes', fallback=60)
+    esa_grid_km = config.getfloat('esa', 'grid_km', fallback=5)
+    esa_grid_statistic = config.get('esa', 'grid_statistic', fallback='median')
+    qc = config.getboolean('heatmap', 'qc', fallback=True)
+    qc_neighbours = config.getint('heatmap', 'qc_neighbours', fallback=8)
+    qc_threshold = config.getfloat('heatmap', 'qc_threshold', fallback=3.5)
+    memory_budget_mb = config.getint('heatmap', 'memory_budget_mb', fallback=0)
+    memory_trace = config.getboolean('heatmap', 'memory_trace', fallback=False)
+    dpi = config.getint('heatmap', 'dpi', fallback=100)
+    preview_grid_size = config.getint('heatmap', 'preview_grid_size', fallback=100)
+    preview = False
+    fusion_weights = {source: config.getfloat('fusion', f'{source}_weight')
+                      for source in ('imgw', 'esa', 'gios') if config.has_option('fusion', f'{source}_weight')}
+    fusion_dedup_km = config.getfloat('fusion', 'dedup_km', fallback=1)
+    metrics_enabled = config.getboolean('metrics', 'enabled', fallback=False)
+    metrics_prometheus_file = config.get('metrics', 'prometheus_file', fallback=None) or None
+    metrics_summary_file = config.get('metrics', 'summary_file', fallback=None) or None
+    profile_directory = config.get('metrics', 'profile_directory', fallback='logs/profile')
+    profile = False
+    stream = config.getboolean('meteo.updater', 'stream', fallback=False)
+    stream_chunk_size = config.getint('meteo.updater', 'stream_chunk_size', fallback=500)
+    replay_file = None
+    record_directory = None
+    sun_backfill = False
+    retention_months = None
+    retention_drop = False
+    http_pool_size = config.getint('meteo.updater', 'http_pool_size', fallback=10)
+    http_gzip = config.getboolean('meteo.updater', 'http_gzip', fallback=True)
+    http_validators_file = config.get('meteo.updater', 'http_validators_file', fallback=None) or None
 
     # and now overwrite them with command line if exists
     parser = optparse.OptionParser(usage="%prog [-b] [-m] [-i] [-f] [-l] [-o]", version=ver, description=desc)
 
-    # parser.add_option('-d', '--daemonize', dest='daemonize', action='store_true', default=False,
-    #                   help='run as daemon process')
+    parser.add_option('-d', '--daemonize', dest='daemonize', action='store_true',
+                      help='run as resident daemon updating modules on their intervals')
     parser.add_option('-b', '--database', dest='meteo_db_url', help='database connection string')
     parser.add_option('-m', '--meteo_data', dest='imgw_data_url', help='imgw data url')
     parser.add_option('-i', '--imgw_update_interval', dest='imgw_update_interval',
@@ -113,7 +201,9 @@ def main():
     parser.add_option('--solar_url', dest='solar_url', help='solar base url')
     parser.add_option('--solar_update_interval', dest='solar_update_interval', help='solar update interval')
     parser.add_option('--solar-period', dest='solar_update_period', help='solar update from_date:to_date')
-    parser.add_option('--heatmap', dest='heatmap', help='generate map of: temperature, precipitation, humidity, pressure, windspeed')
+    parser.add_option('--heatmap', dest='heatmap', help='generate map of: temperature, precipitation, humidity, pressure, windspeed, pm10, pm25, '
+                      'gios_pm10, gios_pm25, gios_no2, gios_o3, gios_so2, fused_temperature, fused_humidity, '
+                      'fused_pressure, fused_pm10, fused_pm25')
     parser.add_option('--last-hours', dest='last_hours', help='generate animated map from last n hours', type=int, default=1)
     parser.add_option('--format', dest='file_format', help='file format for heatmap: png, gif (animated), default is png', default='png')
     parser.add_option('-o', '--output', dest='output_file', help='output file for heatmap, default is [heatmap].[png|gif]')
@@ -125,10 +215,34 @@ def main():
     parser.add_option('--usedb', dest='usedb', help='use database persisted frames if available', action='store_true')
     parser.add_option("--gios-stations", dest="gios_stations", help="update gios stations database", action='store_true')
     parser.add_option('--keep-frames', dest='keep_frames', help="keep latest frames after generating older will be removed", type=int)
+    parser.add_option('--stream', dest='stream', help='parse imgw and esa data incrementally while downloading', action='store_true')
+    parser.add_option('--sun-backfill', dest='sun_backfill', help='compute sun positions for stored solar data missing them', action='store_true')
+    parser.add_option('--replay-file', dest='replay_file', help='update imgw or esa (-u imgw|esa) from a local json file instead of downloading')
+    parser.add_option('--record', dest='record_directory',
+                      help='record downloaded responses to a directory to be served by python -m solarmeteo.replay')
+    parser.add_option('--esa-bucket-minutes', dest='esa_bucket_minutes', type=int,
+                      help='size of time buckets in minutes pm10 and pm25 heatmaps are aggregated in')
+    parser.add_option('--esa-grid-km', dest='esa_grid_km', type=float,
+                      help='size of grid cells in km esa sensors are binned to, 0 averages sensors per city')
+    parser.add_option('--no-qc', dest='no_qc', action='store_true',
+                      help='do not reject outlying readings before rendering heatmaps')
+    parser.add_option('--memory-budget', dest='memory_budget_mb', type=int,
+                      help='resident memory in MB heatmap rendering is throttled at, 0 is unlimited')
+    parser.add_option('--preview', dest='preview', action='store_true',
+                      help='interpolate heatmap on a coarse grid (preview_grid_size) upsampled to full size, '
+                           'frames are not persisted')
+    parser.add_option('--metrics', dest='metrics', action='store_true',
+                      help='export per-stage timings and counters')
+    parser.add_option('--profile', dest='profile', action='store_true',
+                      help='write cProfile and flame graph stacks of every stage and render worker to a run directory')
+    parser.add_option('--retention-months', dest='retention_months', type=int,
+                      help='detach partitions of measurement tables older than given number of months')
+    parser.add_option('--retention-drop', dest='retention_drop', action='store_true',
+                      help='drop partitions detached by --retention-months instead of keeping them for archival')
 
     # option not in properties
     # TODO: check if default can be set if empty in here
-    parser.add_option('-u', '--update', dest='update', help='service to update [imgw, solar, gios], default is all')
+    parser.add_option('-u', '--update', dest='update', help='comma separated services to update [imgw, solar, gios, esa, all, none], default is all')
 
     (options, args) = parser.parse_args()
 
@@ -138,8 +252,11 @@ def main():
     if options.imgw_data_url is not None and not '' and len(options.imgw_data_url) != 0:
         imgw_data_url = options.imgw_data_url
 
+    if options.daemonize is not None and not '':
+        daemonize = options.daemonize
+
     if options.imgw_update_interval is not None and not '' and len(options.imgw_update_interval) != 0:
-        imgw_update_interval = options.update_interval
+        imgw_update_interval = options.imgw_update_interval
 
     if options.updater_update_station_coordinates_file is not None and not '' and \
             len(options.updater_update_station_coordinates_file) != 0:
@@ -175,6 +292,9 @@ def main():
     if options.solar_update_interval is not None and not '' and len(options.solar_update_interval) != 0:
         solar_update_interval = options.solar_update_interval
 
+    if options.solar_update_period is not None and not '' and len(options.solar_update_period) != 0:
+        solar_update_period = options.solar_update_period
+
     if options.heatmap is not None and not '' and len(options.heatmap) != 0:
         heatmap = options.heatmap
 
@@ -208,45 +328,92 @@ def main():
     if options.keep_frames is not None and not '':
         keep_frames = options.keep_frames
 
+    if options.stream is not None and not '':
+        stream = options.stream
+
+    if options.sun_backfill is not None and not '':
+        sun_backfill = options.sun_backfill
+
+    if options.replay_file is not None and not '' and len(options.replay_file) != 0:
+        replay_file = options.replay_file
+
+    if options.record_directory is not None and not '' and len(options.record_directory) != 0:
+        record_directory = options.record_directory
+
+    if options.esa_bucket_minutes is not None and not '':
+        esa_bucket_minutes = options.esa_bucket_minutes
+
+    if options.esa_grid_km is not None and not '':
+        esa_grid_km = options.esa_grid_km
+
+    if options.no_qc:
+        qc = False
+
+    if options.memory_budget_mb is not None and not '':
+        memory_budget_mb = options.memory_budget_mb
+
+    if options.preview:
+        preview = True
+
+    if options.metrics:
+        metrics_enabled = True
+
+    if options.profile:
+        profile = True
+
+    if options.retention_months is not None and not '':
+        retention_months = options.retention_months
+
+    if options.retention_drop is not None and not '':
+        retention_drop = options.retention_drop
+
     setup_logging(level=get_log_level(log_level), project_prefix="solarmeteo")
     logger = logging.getLogger("solarmeteo.*")
     logger.info(f"Starting Solarmeteo...")
 
-    # if meteo_daemonize:
-    #     try:
-    #         logger.info('Go to daemonize mode')
-    #         if update == 'both' or update == 'imgw':
-    #             th_imgw_updater = threading.Thread(imgw_updater.update_daemonize())
-    #             th_imgw_updater.daemon = True
-    #             th_imgw_updater.start()  # it blocks
-    #         # it will not be called
-    #         if update == 'both' or update == 'solar':
-    #             th_solar_updater = threading.Thread(solar_updater.update_daemonize())
-    #             th_solar_updater.daemon = True
-    #             th_solar_updater.start()
-    #     except KeyboardInterrupt:
-    #         logger.info('Main: Keyboard interrupt caught, terminating updates.')
-    #         logger.info('Goodbye.')
-    # else:
+    if metrics_enabled:
+        metrics.enable()
+
+    if memory_trace:
+        memory.start_tracing()
+
+    profile_dir = profiler.run_directory(profile_directory) if profile else None
+    if profile_dir is not None:
+        logger.info(f"Profiling to {profile_dir}")
 
-    # TODO: should be a list imgw, solar, something, all
     # Load optional ranges from well-known keys inside [heatmap] section
     ranges = _load_heatmap_ranges(config)
+    grid_sizes = _load_heatmap_grid_sizes(config)
+
+    modules = _parse_modules(update)
 
-    if update == 'all' or update == 'imgw':
-        imgw_updater = MeteoUpdater(
+    # one pooled http session is shared by all updaters
+    http_client = HttpClient(pool_size=http_pool_size, gzip=http_gzip, validators_file=http_validators_file,
+                             recorder=Recorder(record_directory) if record_directory else None)
+
+    # render pool shared by heatmaps generated in daemon mode
+    # forkserver avoids forking the multithreaded daemon process
+    render_pool = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('forkserver')) \
+        if daemonize else None
+
+    # updaters are created (and their modules imported) on first use
+    @functools.cache
+    def imgw_updater():
+        from solarmeteo.updater.meteo_updater import MeteoUpdater
+        return MeteoUpdater(
             meteo_db_url=meteo_db_url,
             meteo_data_url=imgw_data_url,
             updater_interval=imgw_update_interval,
             updater_update_station_coordinates=updater_update_station_coordinates,
-            updater_update_station_coordinates_file=updater_update_station_coordinates_file)
-        imgw_updater.update()
-
-        if generate_frames:
-            for frametype in HeatMap.heatmaps:
-                hm = HeatMap(meteo_db_url=meteo_db_url, last=1, heatmap_type=frametype, max_workers=max_workers, ranges=ranges)
-                hm.persist_frame()
-        solar_updater = SolarUpdater(
+            updater_update_station_coordinates_file=updater_update_station_coordinates_file,
+            stream=stream,
+            stream_chunk_size=stream_chunk_size,
+            http_client=http_client)
+
+    @functools.cache
+    def solar_updater():
+        from solarmeteo.updater.solar_updater import SolarUpdater
+        return SolarUpdater(
             meteo_db_url=meteo_db_url,
             data_url=solar_url,
             updater_interval=solar_update_interval,
@@ -254,38 +421,142 @@ def main():
             solar_key=solar_key,
             lon=lon,
             lat=lat,
-            height=height)
-
-        if solar_update_period is not None:
-            solar_updater.update_datetime_period(solar_update_period)
+            height=height,
+            http_client=http_client,
+            backfill_workers=solar_backfill_workers,
+            backfill_request_interval=solar_backfill_request_interval,
+            backfill_checkpoint_file=solar_backfill_checkpoint_file)
+
+    @functools.cache
+    def gios_updater():
+        from solarmeteo.updater.gios_updater import GiosUpdater
+        return GiosUpdater(meteo_db_url=meteo_db_url, gios_url=gios_url, max_delay_sec=gios_max_delay_sec,
+                           http_client=http_client)
+
+    @functools.cache
+    def esa_updater():
+        from solarmeteo.updater.esa_updater import EsaUpdater
+        return EsaUpdater(meteo_db_url=meteo_db_url, esa_data_url=esa_url, stream=stream,
+                          stream_chunk_size=stream_chunk_size, http_client=http_client)
+
+    def update_imgw():
+        if replay_file is not None:
+            changes = imgw_updater().update_from_file(replay_file)
         else:
-            solar_updater.update()
-
-    if update == 'all' or update == 'gios':
-        gios_updater = GiosUpdater(meteo_db_url=meteo_db_url, gios_url=gios_url, max_delay_sec=gios_max_delay_sec)
-        gios_updater.update_all_stations_data()
+            changes = imgw_updater().update()
+
+        if generate_frames and changes:
+            HeatMap = _heatmap_class()
+            # only frames of datetimes and types that received new data are rendered
+            for frametype, datetimes in HeatMap.affected_frames(changes).items():
+                hm = HeatMap(meteo_db_url=meteo_db_url, heatmap_type=frametype, max_workers=max_workers,
+                             keep_frames=keep_frames, ranges=ranges, executor=render_pool,
+                             esa_bucket_minutes=esa_bucket_minutes, esa_grid_km=esa_grid_km,
+                             esa_grid_statistic=esa_grid_statistic, qc=qc, qc_neighbours=qc_neighbours,
+                             qc_threshold=qc_threshold, fusion_weights=fusion_weights,
+                             fusion_dedup_km=fusion_dedup_km, profile_dir=profile_dir,
+                             memory_budget_mb=memory_budget_mb, dpi=dpi, grid_sizes=grid_sizes)
+                hm.regenerate(datetimes)
+
+    def update_solar():
+        if solar_update_period is not None and not daemonize:
+            solar_updater().update_datetime_period(solar_update_period)
+        else:
+            solar_updater().update()
 
-    if update == 'all' or update == 'esa':
-        esa_updater = EsaUpdater(meteo_db_url=meteo_db_url, esa_data_url=esa_url)
-        esa_updater.update()
+    def update_esa():
+        if replay_file is not None:
+            esa_updater().update_from_file(replay_file)
+        else:
+            esa_updater().update()
+
+    def measured(module, action):
+        def run():
+            # every run of a daemon job gets a profile of its own
+            tag = profiler.profile_tag('job', module, f'{datetime.now():%Y%m%d-%H%M%S}') if daemonize \
+                else profiler.profile_tag('update', module)
+            with metrics.timer(f'job.{module}'):
+                profiler.profiled(profile_dir, tag, action)
+        return run
+
+    jobs = {
+        'imgw': (measured('imgw', update_imgw), imgw_update_interval),
+        'solar': (measured('solar', update_solar), solar_update_interval),
+        'gios': (measured('gios', lambda: gios_updater().update_all_stations_data()), gios_update_interval),
+        'esa': (measured('esa', update_esa), esa_update_interval),
+    }
+
+    if daemonize:
+        logger.info('Go to daemonize mode')
+        scheduler = Scheduler(status_file=daemon_status_file)
+        for module in modules:
+            action, interval = jobs[module]
+
+            # metrics accumulate over the lifetime of the daemon and are exported after every run,
+            # as well as the summary of all profiles written so far
+            def exported(action=action):
+                try:
+                    action()
+                finally:
+                    metrics.export(metrics_prometheus_file, metrics_summary_file)
+                    if profile_dir is not None:
+                        profiler.write_summary(profile_dir)
+
+            scheduler.add_job(module, int(interval), exported)
+        try:
+            scheduler.run_forever()
+        finally:
+            render_pool.shutdown()
+            http_client.close()
+        return
+
+    for module in modules:
+        action, interval = jobs[module]
+        action()
 
     if heatmap is not None:
         if output_file is None:
             output_file = heatmap
 
+        HeatMap = _heatmap_class()
         hm = HeatMap(meteo_db_url=meteo_db_url, last=last_hours, file_format=file_format,
                  output_file=output_file, heatmap_type=heatmap, max_workers=max_workers,
-                 persist=persist, usedb=usedb, keep_frames=keep_frames, ranges=ranges)
-        hm.generate()
+                 persist=persist, usedb=usedb, keep_frames=keep_frames, ranges=ranges,
+                 esa_bucket_minutes=esa_bucket_minutes, esa_grid_km=esa_grid_km,
+                 esa_grid_statistic=esa_grid_statistic, qc=qc, qc_neighbours=qc_neighbours,
+                 qc_threshold=qc_threshold, fusion_weights=fusion_weights,
+                 fusion_dedup_km=fusion_dedup_km, profile_dir=profile_dir,
+                 memory_budget_mb=memory_budget_mb, dpi=dpi, grid_sizes=grid_sizes,
+                 preview_grid_size=preview_grid_size if preview else None)
+        profiler.profiled(profile_dir, profiler.profile_tag('heatmap', heatmap, file_format), hm.generate)
     if generate_cache:
+        HeatMap = _heatmap_class()
         for frametype in HeatMap.heatmaps:
             hm = HeatMap(meteo_db_url=meteo_db_url, last=last_hours, heatmap_type=frametype, max_workers=max_workers,
-                         file_format='cache', keep_frames=keep_frames, ranges=ranges)
-            hm.generate()
+                         file_format='cache', keep_frames=keep_frames, ranges=ranges,
+                         esa_bucket_minutes=esa_bucket_minutes, esa_grid_km=esa_grid_km,
+                         esa_grid_statistic=esa_grid_statistic, qc=qc, qc_neighbours=qc_neighbours,
+                         qc_threshold=qc_threshold, fusion_weights=fusion_weights,
+                         fusion_dedup_km=fusion_dedup_km, profile_dir=profile_dir,
+                         memory_budget_mb=memory_budget_mb, dpi=dpi, grid_sizes=grid_sizes)
+            profiler.profiled(profile_dir, profiler.profile_tag('cache', frametype), hm.generate)
+
+    if sun_backfill:
+        solar_updater().backfill_sun_data()
 
     if gios_stations:
-        gios_updater = GiosUpdater(meteo_db_url=meteo_db_url, gios_url=gios_url)
-        gios_updater.update_stations()
+        gios_updater().update_stations()
+
+    if retention_months is not None:
+        before = add_months(month_start(datetime.now()), -retention_months)
+        logger.info(f"Retention of measurement partitions before {before:%Y-%m}")
+        for table, partitions in apply_retention(get_engine(meteo_db_url), before, drop=retention_drop).items():
+            logger.info(f"{table}: {len(partitions)} partitions {'dropped' if retention_drop else 'detached'}")
+
+    metrics.export(metrics_prometheus_file, metrics_summary_file)
+    if profile_dir is not None:
+        profiler.write_summary(profile_dir)
+    http_client.close()
 
 
 if __name__ == '__main__':
@@ -2,7 +2,13 @@ from operator import truediv
 
 import sqlalchemy
 
+from solarmeteo.metrics import metrics
 from solarmeteo.model import EsaStation, EsaStationData
+from solarmeteo.model.database import bulk_upsert, to_datetime
+from solarmeteo.model.observed_datetime import observe_datetimes, SOURCE_ESA
+from solarmeteo.model.partitions import ensure_partitions
+from solarmeteo.model.rollup import add_all_to_rollups, ESA_ROLLUP_VARIABLES
+from solarmeteo.updater import json_stream
 from solarmeteo.updater.updater import Updater
 
 from logging import getLogger
@@ -12,8 +18,12 @@ logger = getLogger(__name__)
 
 class EsaUpdater(Updater):
 
-    def __init__(self, meteo_db_url, esa_data_url):
-        super(EsaUpdater, self).__init__(meteo_db_url, 1)
+    metrics_prefix = SOURCE_ESA
+
+    def __init__(self, meteo_db_url, esa_data_url, stream=False, stream_chunk_size=json_stream.DEFAULT_CHUNK_SIZE,
+                 http_client=None):
+        super(EsaUpdater, self).__init__(meteo_db_url, 1, stream=stream, stream_chunk_size=stream_chunk_size,
+                                         http_client=http_client)
         self.esa_data_url = esa_data_url
 
 
@@ -50,6 +60,21 @@ class EsaUpdater(Updater):
             
         return station
 
+
+    def _get_stations(self, session, schools):
+        """
+        Returns stations of schools with a single query, unknown stations are created.
+
+        :return: dict station name -> station
+        """
+        names = {school["name"] for school in schools}
+        stations = {station.name: station
+                    for station in session.query(EsaStation).filter(EsaStation.name.in_(names))}
+        for school in schools:
+            if school["name"] not in stations:
+                stations[school["name"]] = self._save_station(session, school)
+        return stations
+
     @classmethod
     def _is_valid_esa_station_data(cls, esa_station_data) -> bool:
         if any(value is None for value in [
@@ -74,14 +99,22 @@ class EsaUpdater(Updater):
         return True
 
 
-    def update(self):
-        esa_json = self.get(self.esa_data_url)
+    def update_smog_data(self, session, smog_data):
+        """
+        Stores smog records of ESA stations with bulk inserts in a single transaction, unknown stations
+        are created on the fly. Records already present in database are skipped.
 
-        session = self.create_session()
-
-        for smog in esa_json["smog_data"]:
+        :param session: database session
+        :param smog_data: iterable of 'smog_data' records
+        :return: number of processed records
+        """
+        smog_data = list(smog_data)
+        ensure_partitions(session.get_bind(), EsaStationData.__tablename__, [smog["timestamp"] for smog in smog_data])
 
-            station = self._get_station(session, smog["school"])
+        stations = self._get_stations(session, [smog["school"] for smog in smog_data])
+        rows = []
+        for smog in smog_data:
+            station = stations[smog["school"]["name"]]
             data = smog.get("data", {})
 
             esa_station_data = EsaStationData(
@@ -95,18 +128,82 @@ class EsaUpdater(Updater):
                 )
 
             if self._is_valid_esa_station_data(esa_station_data):
-                try:
-                    session.add(esa_station_data)
-                    session.commit()
-                    logger.debug(f"Added new station data with id: {esa_station_data.id}")
-
-                except sqlalchemy.exc.IntegrityError as exception:
-                    session.rollback()
-                    logger.warning(f"Constraint violation on {esa_station_data.esa_station_id}, Exception: {exception.orig}")
+                rows.append({
+                    "esa_station_id": esa_station_data.esa_station_id,
+                    "humidity": esa_station_data.humidity,
+                    "pressure": esa_station_data.pressure,
+                    "temperature": esa_station_data.temperature,
+                    "pm10": esa_station_data.pm10,
+                    "pm25": esa_station_data.pm25,
+                    "datetime": to_datetime(esa_station_data.datetime),
+                })
             else:
+                metrics.count('esa.invalid')
                 logger.warning(f"Invalid EsaStationData object: {esa_station_data}")
 
-        # finally:
-        session.close_all()
-        logger.debug("Session closed")
+        try:
+            stored = bulk_upsert(session, EsaStationData, rows, returning=[
+                EsaStationData.esa_station_id, EsaStationData.datetime,
+                *(getattr(EsaStationData, variable) for variable in ESA_ROLLUP_VARIABLES)])
+            observe_datetimes(session, SOURCE_ESA, [row.datetime for row in stored])
+            add_all_to_rollups(session, SOURCE_ESA, [
+                (row.esa_station_id, row.datetime, {variable: getattr(row, variable) for variable in ESA_ROLLUP_VARIABLES})
+                for row in stored])
+            session.commit()
+            logger.debug(f"Added {len(stored)} new station data")
+            # aggregates of buckets already complete may have been cached by heatmaps of this process
+            from solarmeteo.heatmap.data_provider import invalidate_esa_buckets
+            invalidate_esa_buckets(self.meteo_db_url, [row.datetime for row in stored])
+        except sqlalchemy.exc.SQLAlchemyError as exception:
+            session.rollback()
+            logger.error(f"EsaStationData error: {exception}")
+            return len(smog_data)
+
+        if len(stored) < len(rows):
+            metrics.count('esa.duplicates', len(rows) - len(stored))
+            logger.debug(f"{len(rows) - len(stored)} station data already stored")
+
+        return len(smog_data)
+
+
+    def _update_chunks(self, chunks):
+        session = self.create_session()
+        count = 0
+        try:
+            for chunk in chunks:
+                with metrics.timer('esa.ingest'):
+                    processed = self.update_smog_data(session, chunk)
+                metrics.count('esa.records', processed)
+                count += processed
+                logger.debug(f"Processed {count} smog records")
+        finally:
+            session.close()
+            logger.debug("Session closed")
+
+        logger.info(f"Processed {count} smog records.")
+
+
+    def update(self):
+        if self.stream:
+            chunks = self.get_stream(self.esa_data_url, key="smog_data", conditional=True)
+        else:
+            esa_json = self.get(self.esa_data_url, conditional=True)
+            chunks = [esa_json["smog_data"]] if esa_json is not None else None
+
+        if chunks is None:
+            logger.info("ESA data not modified since last update.")
+            return
+
+        self._update_chunks(chunks)
+        self.confirm(self.esa_data_url)
+
+
+    def update_from_file(self, file_name):
+        """
+        Replays ESA smog data stored in a local json file.
+
+        :param file_name: json file with the same content as served by ESA api
+        """
+        logger.info(f"ESA updating from file {file_name}")
+        self._update_chunks(self.read_stream(file_name, key="smog_data"))
 
@@ -1,12 +1,16 @@
 from logging import getLogger
 import time
 import random
-from sqlite3 import IntegrityError
 
-from sqlalchemy.exc import IntegrityError
+from sqlalchemy.exc import SQLAlchemyError
 
+from solarmeteo.metrics import metrics
+from solarmeteo.model.database import bulk_upsert, to_datetime
 from solarmeteo.model.gios_station import GiosStation
 from solarmeteo.model.gios_station_data import GiosStationData, Parameter
+from solarmeteo.model.observed_datetime import observe_datetimes, SOURCE_GIOS
+from solarmeteo.model.partitions import ensure_partitions
+from solarmeteo.model.rollup import add_all_to_rollups
 
 logger = getLogger(__name__)
 
@@ -35,10 +39,11 @@ INDEX_MAP = {
 
 class GiosUpdater(Updater):
 
+    metrics_prefix = SOURCE_GIOS
 
-    def __init__(self, meteo_db_url, gios_url, max_delay_sec=3):
+    def __init__(self, meteo_db_url, gios_url, max_delay_sec=3, http_client=None):
         logger.info("Create Gios Updater")
-        super(GiosUpdater, self).__init__(meteo_db_url, 0)
+        super(GiosUpdater, self).__init__(meteo_db_url, 0, http_client=http_client)
         self.gios_url = gios_url
         self.max_delay_sec = max_delay_sec
 
@@ -54,11 +59,11 @@ class GiosUpdater(Updater):
 
         logger.debug(f"Downloaded {len(stations_json[LIST_OF_STATIONS])} stations")
 
-        session = self.create_session()
+        rows = []
         for station_json in stations_json[LIST_OF_STATIONS]:
             logger.debug(f"Got station name: {station_json['Nazwa stacji']}")
 
-            station = GiosStation(
+            rows.append(dict(
                 gios_id=station_json["Identyfikator stacji"],
                 station_code=station_json["Kod stacji"],
                 station_name=station_json["Nazwa stacji"],
@@ -70,12 +75,16 @@ class GiosUpdater(Updater):
                 district=station_json["Powiat"],
                 voivodeship=station_json["Województwo"],
                 street=station_json["Ulica"]
-            )
-
-            session.add(station)
+            ))
 
-        session.commit()
-        session.close_all()
+        # known stations are updated, so the list can be refreshed any time
+        session = self.create_session()
+        try:
+            bulk_upsert(session, GiosStation, rows, index_elements=[GiosStation.gios_id],
+                        set_=lambda excluded: {column: excluded[column] for column in rows[0] if column != 'gios_id'})
+            session.commit()
+        finally:
+            session.close()
 
     def update_all_stations_data(self):
         logger.debug("Update all stations data")
@@ -83,37 +92,57 @@ class GiosUpdater(Updater):
         logger.debug("Session created")
         stations = session.query(GiosStation).all()
         random.shuffle(stations)
+        parameter_ids = {parameter.name: parameter.id for parameter in session.query(Parameter).all()}
+        parameters = {parameter_id: name for name, parameter_id in parameter_ids.items()}
         try:
             for station in stations:
                 url = f"{self.gios_url}/aqindex/getIndex/{station.gios_id}"
                 station_data_json = self.get(url, timeout=5)
+                metrics.count('gios.stations')
+                ensure_partitions(session.get_bind(), GiosStationData.__tablename__,
+                                  [station_data_json["AqIndex"][f"{INDEX_DATE_BASE} {index}"] for index in INDEX_MAP])
+                rows = []
                 for index, column in INDEX_MAP.items():
                     datetime = station_data_json["AqIndex"][f"{INDEX_DATE_BASE} {index}"]
                     value = station_data_json["AqIndex"][f"{INDEX_VALUE_BASE} {index}"]
                     if datetime is not None and value is not None:
-                        param = session.query(Parameter).filter_by(name=column).first()
-                        station_data = GiosStationData(
-                            gios_station_id=station.id,
-                            parameter_id=param.id if param else None,
-                            datetime=datetime,
-                            value=value
-                        )
-                        try:
-                            session.add(station_data)
-                            session.commit()
-                            logger.debug(f"{station.gios_id} added {column}={value} on {datetime}")
-                        except IntegrityError:
-                            session.rollback()
-                            logger.warning(f"Constraint violation on {station.gios_id} added {column}={value} on {datetime}")
+                        rows.append(dict(gios_station_id=station.id, parameter_id=parameter_ids.get(column),
+                                         datetime=to_datetime(datetime), value=value))
                     else:
                         logger.debug(f"{station.gios_id} {index}=null ")
+                self._save_station_data(session, station, rows, parameters)
                 # randomized dela between requests
                 time.sleep(random.uniform(1, self.max_delay_sec))
         finally:
-            session.close_all()
+            session.close()
             logger.debug("Session closed")
 
-
-
-
-
+    @staticmethod
+    def _save_station_data(session, station, rows, parameters):
+        """
+        Stores index values of a station with a single bulk insert, values already present in database
+        are skipped.
+
+        :param session: database session
+        :param station: GIOS station
+        :param rows: gios_station_data rows
+        :param parameters: dict parameter id -> parameter name
+        """
+        try:
+            stored = bulk_upsert(session, GiosStationData, rows, returning=[
+                GiosStationData.parameter_id, GiosStationData.datetime, GiosStationData.value])
+            observe_datetimes(session, SOURCE_GIOS, [row.datetime for row in stored])
+            add_all_to_rollups(session, SOURCE_GIOS, [
+                (station.id, row.datetime, {parameters[row.parameter_id]: row.value}) for row in stored])
+            session.commit()
+        except SQLAlchemyError as exception:
+            session.rollback()
+            logger.error(f"GiosStationData error on {station.gios_id}: {exception}")
+            return
+
+        metrics.count('gios.records', len(stored))
+        if len(stored) < len(rows):
+            metrics.count('gios.duplicates', len(rows) - len(stored))
+            logger.debug(f"{station.gios_id} {len(rows) - len(stored)} values already stored")
+        for row in stored:
+            logger.debug(f"{station.gios_id} added {parameters[row.parameter_id]}={row.value} on {row.datetime}")
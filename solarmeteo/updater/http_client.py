@@ -0,0 +1,138 @@
+###
+# SolarMeteo    : https://github.com/pa810p/solarmeteo
+# Author        : Pawel Prokop
+# License       : GNU GENERAL PUBLIC LICENSE v3
+###
+
+import hashlib
+import json
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+DEFAULT_POOL_SIZE = 10
+
+
+class HttpClient:
+    """
+    Pooled http session shared by updaters. Connections are kept alive between requests and responses
+    are requested compressed. For conditional requests ETag, Last-Modified and a hash of the body are
+    remembered per url, so an unchanged feed is recognized either by 304 Not Modified or by its content.
+
+    Validators of a response become effective only after confirm(url) is called, which updaters do when
+    the downloaded data has been stored, so a failed ingest is retried on the next run.
+    """
+
+    def __init__(self, pool_size=DEFAULT_POOL_SIZE, gzip=True, validators_file=None, recorder=None):
+        """
+        :param pool_size: number of kept-alive connections per host
+        :param gzip: request compressed responses
+        :param validators_file: json file to persist validators between runs, None keeps them in memory only
+        :param recorder: solarmeteo.replay.recorder.Recorder storing downloaded responses for replay
+        """
+        self.pool_size = pool_size
+        self.validators_file = validators_file
+        self.recorder = recorder
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers['Accept-Encoding'] = 'gzip, deflate' if gzip else 'identity'
+
+        self._lock = threading.Lock()
+        self._pending = {}
+        self.validators = self._load_validators()
+
+    def _load_validators(self):
+        if self.validators_file and os.path.exists(self.validators_file):
+            try:
+                with open(self.validators_file, encoding='utf-8') as f:
+                    return json.load(f)
+            except (OSError, ValueError) as exception:
+                logger.warning(f'Cannot read http validators from {self.validators_file}: {exception}')
+        return {}
+
+    def _save_validators(self):
+        if not self.validators_file:
+            return
+        directory = os.path.dirname(self.validators_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_file = self.validators_file + '.tmp'
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(self.validators, f, indent=1)
+        os.replace(tmp_file, self.validators_file)
+
+    def get(self, url, timeout=30, conditional=False, stream=False):
+        """
+        Sends GET request using pooled session.
+
+        :param url: requested url
+        :param timeout: connection timeout
+        :param conditional: send stored validators and detect unchanged content
+        :param stream: do not download the body immediately
+        :return: response, or None when the resource has not changed since last confirmed download
+        """
+        headers = {}
+        with self._lock:
+            known = self.validators.get(url, {}) if conditional else {}
+        if known.get('etag'):
+            headers['If-None-Match'] = known['etag']
+        if known.get('last_modified'):
+            headers['If-Modified-Since'] = known['last_modified']
+
+        response = self.session.get(url, timeout=timeout, headers=headers, stream=stream)
+        if self.recorder is not None and response.status_code == 200:
+            self.recorder.record(url, response)
+
+        if not conditional:
+            return response
+
+        if response.status_code == 304:
+            logger.debug(f'Not modified (304): {url}')
+            response.close()
+            return None
+
+        if response.status_code != 200:
+            return response
+
+        validators = {
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+        }
+        if not stream:
+            validators['sha256'] = hashlib.sha256(response.content).hexdigest()
+            if known.get('sha256') == validators['sha256']:
+                logger.debug(f'Not modified (same content): {url}')
+                self._remember(url, validators)
+                self.confirm(url)
+                return None
+
+        self._remember(url, validators)
+        return response
+
+    def _remember(self, url, validators):
+        with self._lock:
+            self._pending[url] = validators
+
+    def confirm(self, url):
+        """
+        Makes validators of the last response for url effective, should be called when its content
+        has been processed.
+        """
+        with self._lock:
+            validators = self._pending.pop(url, None)
+            if validators is None:
+                return
+            self.validators[url] = validators
+            self._save_validators()
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,181 @@
+###
+# SolarMeteo    : https://github.com/pa810p/solarmeteo
+# Author        : Pawel Prokop
+# License       : GNU GENERAL PUBLIC LICENSE v3
+###
+
+import codecs
+import json
+import queue
+import re
+import threading
+
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 500
+DEFAULT_READ_SIZE = 64 * 1024
+DEFAULT_PREFETCH = 4
+
+_WHITESPACE = ' \t\n\r'
+_END_OF_STREAM = object()
+
+
+def _decode(byte_chunks, encoding='utf-8'):
+    """
+    Decodes an iterable of byte chunks into text chunks, multibyte characters split between
+    chunks are handled by the incremental decoder.
+    """
+    decoder = codecs.getincrementaldecoder(encoding)()
+    for chunk in byte_chunks:
+        if isinstance(chunk, str):
+            yield chunk
+        else:
+            text = decoder.decode(chunk)
+            if text:
+                yield text
+    tail = decoder.decode(b'', final=True)
+    if tail:
+        yield tail
+
+
+def iter_json_array(byte_chunks, key=None, encoding='utf-8'):
+    """
+    Incrementally parses items of a json array without loading the whole document.
+
+    :param byte_chunks: iterable of bytes (or str) chunks, e.g. response.iter_content()
+    :param key: name of the member holding the array (e.g. 'smog_data'),
+                None when the document itself is an array
+    :param encoding: payload encoding
+    :return: generator of parsed array items
+    """
+    decoder = json.JSONDecoder()
+    start = re.compile(r'"%s"\s*:\s*\[' % re.escape(key)) if key is not None else re.compile(r'\[')
+
+    chunks = _decode(byte_chunks, encoding)
+    buffer = ''
+    exhausted = False
+
+    def read():
+        nonlocal buffer, exhausted
+        try:
+            buffer += next(chunks)
+        except StopIteration:
+            exhausted = True
+
+    # find beginning of the array
+    while True:
+        match = start.search(buffer)
+        if match:
+            buffer = buffer[match.end():]
+            break
+        if exhausted:
+            raise ValueError(f"Array {key if key else ''} not found in json stream")
+        # keep enough of the tail to match a key split between chunks
+        buffer = buffer[-(len(key or '') + 64):]
+        read()
+
+    position = 0
+    while True:
+        while position < len(buffer) and (buffer[position] in _WHITESPACE or buffer[position] == ','):
+            position += 1
+
+        if position >= len(buffer):
+            if exhausted:
+                raise ValueError('Unexpected end of json stream')
+            buffer = buffer[position:]
+            position = 0
+            read()
+            continue
+
+        if buffer[position] == ']':
+            return
+
+        try:
+            item, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            if exhausted:
+                raise
+            buffer = buffer[position:]
+            position = 0
+            read()
+            continue
+
+        # a value touching the end of the buffer (e.g. a number) may still be incomplete
+        if end >= len(buffer) and not exhausted:
+            buffer = buffer[position:]
+            position = 0
+            read()
+            continue
+
+        yield item
+        position = end
+
+
+def chunked(items, size=DEFAULT_CHUNK_SIZE):
+    """
+    Groups items of an iterable into lists of at most size elements.
+    """
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def prefetch(iterable, depth=DEFAULT_PREFETCH):
+    """
+    Consumes an iterable in a background thread so producing (download and parsing) overlaps with
+    processing of already produced elements. At most depth elements are buffered, which keeps
+    memory bounded regardless of the total size.
+    """
+    buffer = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def put(element):
+        while not stop.is_set():
+            try:
+                buffer.put(element, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for element in iterable:
+                if not put(element):
+                    return
+            put(_END_OF_STREAM)
+        except BaseException as exception:
+            put(exception)
+
+    thread = threading.Thread(target=produce, name='json-stream-prefetch', daemon=True)
+    thread.start()
+
+    try:
+        while True:
+            element = buffer.get()
+            if element is _END_OF_STREAM:
+                return
+            if isinstance(element, BaseException):
+                raise element
+            yield element
+    finally:
+        stop.set()
+
+
+def read_file(file_name, read_size=DEFAULT_READ_SIZE):
+    """
+    Reads a file in binary chunks, used to replay locally stored payloads.
+    """
+    with open(file_name, 'rb') as f:
+        while True:
+            data = f.read(read_size)
+            if not data:
+                return
+            yield data
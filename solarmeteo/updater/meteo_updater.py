@@ -7,24 +7,52 @@
 
 import time
 from datetime import datetime, timedelta
+from solarmeteo.metrics import metrics
+from solarmeteo.model.database import bulk_upsert
 from solarmeteo.model.station_data import StationData, IMGW_DATE, IMGW_HOUR, IMGW_TEMPERATURE, IMGW_WIND_SPEED, \
     IMGW_WIND_DIRECTION, IMGW_HUMIDITY, IMGW_PRECIPITATION, IMGW_PRESSURE
 from solarmeteo.model.station import Station, IMGW_STATION_ID, IMGW_STATION_NAME
+from solarmeteo.model.observed_datetime import observe_datetimes, SOURCE_IMGW
+from solarmeteo.model.partitions import ensure_partitions
+from solarmeteo.model.rollup import add_all_to_rollups, IMGW_ROLLUP_VARIABLES
+from solarmeteo.updater import json_stream
 from solarmeteo.updater.updater import Updater
 
 from logging import getLogger
 
-import sqlalchemy.exc
-
 logger = getLogger(__name__)
 
+MEASUREMENT_COLUMNS = ('temperature', 'wind_speed', 'wind_direction', 'humidity', 'precipitation', 'pressure')
+
+
+def merge_changes(changes, other):
+    """
+    Merges change set other into changes.
+    :param changes: dict datetime -> set of changed columns, updated in place
+    :param other: dict datetime -> set of changed columns
+    :return: changes
+    """
+    for date_time, columns in other.items():
+        changes.setdefault(date_time, set()).update(columns)
+    return changes
+
+
 class MeteoUpdater (Updater):
     """
-    Downloads IMGW station data and stores it into a configured SQL database for further analyzes
+    Downloads IMGW station data and stores it into a configured SQL database for further analyzes.
+
+    Update methods return a change set: a dict of measurement datetime -> set of columns
+    (see MEASUREMENT_COLUMNS) that have actually been stored, rows already present in database
+    are not included, so an update that brings nothing new returns an empty dict.
     """
+
+    metrics_prefix = SOURCE_IMGW
+
     def __init__(self, meteo_db_url, meteo_data_url, updater_interval, updater_update_station_coordinates,
-                 updater_update_station_coordinates_file):
-        super(MeteoUpdater, self).__init__(meteo_db_url, updater_interval)
+                 updater_update_station_coordinates_file, stream=False,
+                 stream_chunk_size=json_stream.DEFAULT_CHUNK_SIZE, http_client=None):
+        super(MeteoUpdater, self).__init__(meteo_db_url, updater_interval, stream=stream,
+                                           stream_chunk_size=stream_chunk_size, http_client=http_client)
 
         self.meteo_data_url = meteo_data_url
         self.updater_update_station_coordinates = updater_update_station_coordinates
@@ -49,6 +77,17 @@ class MeteoUpdater (Updater):
         logger.error(f'station not found id: {imgw_station_id}')
         return None
 
+    @staticmethod
+    def find_stations_by_imgw_ids(session, imgw_station_ids):
+        """
+        Returns stations of given imgw station ids with a single query
+        :param session database session
+        :param imgw_station_ids ids of imgw stations
+        :return dict imgw id -> station, unknown stations are missing
+        """
+        imgw_ids = {int(imgw_station_id) for imgw_station_id in imgw_station_ids}
+        return {station.imgw_id: station for station in session.query(Station).filter(Station.imgw_id.in_(imgw_ids))}
+
     def save_station(self, session, station_json):
         """
         Stores new station to database.
@@ -117,57 +156,99 @@ class MeteoUpdater (Updater):
     def create_datetime(date, time):
         return datetime.strptime(date, '%Y-%m-%d') + timedelta(hours=int(time))
 
-    def update_station(self, session, station, station_json, coordinates):
+    def station_data_row(self, station_id, station_json):
         """
-        Updates station (if it's not recognized in the system) and station data
-        :param session database session
-        :param station station object
-        :param station_json whole station_data object that contains station data and conditions
-        :param coordinates station coordinates that have been read from external configuration file
+        Returns station_data row of a station for bulk insert
         """
-        if station is None:
-            station = self.save_station(session, station_json)
-            session.commit()
-            logger.info('Created new station %r' % station)
-        else:
-            logger.debug('Got station: %r' % station)
+        return {
+            'station_id': station_id,
+            'datetime': self.create_datetime(station_json[IMGW_DATE], station_json[IMGW_HOUR]),
+            'temperature': station_json[IMGW_TEMPERATURE],
+            'wind_speed': station_json[IMGW_WIND_SPEED],
+            'wind_direction': station_json[IMGW_WIND_DIRECTION],
+            'humidity': station_json[IMGW_HUMIDITY],
+            'precipitation': station_json[IMGW_PRECIPITATION],
+            'pressure': station_json[IMGW_PRESSURE],
+        }
 
-        if self.updater_update_station_coordinates:
-            logger.debug('Will update station coordinates')
-            (lon, lat) = self.find_station_coordinates(station.imgw_id, coordinates)
-            if lon is not None and lat is not None:
-                logger.debug('Update coordinates.')
-                station.longitude = lon
-                station.latitude = lat
-                session.commit()
+    def save_stations_data(self, session, rows):
+        """
+        Stores station_data rows with bulk inserts in a single transaction, rows already present in
+        database are skipped. Observed datetimes and rollups are maintained for stored rows only.
+        :param session database session
+        :param rows list of station_data rows, see station_data_row
+        :return change set: dict datetime -> set of stored columns
+        """
         try:
-            self.save_station_data(session, station.id, station_json)
-            logger.debug('Commit station info')
+            stored = bulk_upsert(session, StationData, rows, returning=[
+                StationData.station_id, StationData.datetime,
+                *(getattr(StationData, column) for column in MEASUREMENT_COLUMNS)])
+            observe_datetimes(session, SOURCE_IMGW, [row.datetime for row in stored])
+            add_all_to_rollups(session, SOURCE_IMGW, [
+                (row.station_id, row.datetime, {variable: getattr(row, variable) for variable in IMGW_ROLLUP_VARIABLES})
+                for row in stored])
+            logger.debug('Commit station data')
             session.commit()
-        except sqlalchemy.exc.IntegrityError as exception:
-            # it's a common error because third party meteo stations do not upgrade server regularly
-            logger.warning('StationData IntegrityError: %s' % exception.orig)
-            session.rollback()
         except Exception as exception:
             logger.error('StationData error: %s' % exception)
             session.rollback()
+            return {}
+
+        if len(stored) < len(rows):
+            # it's common because third party meteo stations do not upgrade server regularly
+            logger.debug(f'{len(rows) - len(stored)} station data already stored')
+
+        changes = {}
+        for row in stored:
+            changes.setdefault(row.datetime, set()).update(
+                column for column in MEASUREMENT_COLUMNS if getattr(row, column) is not None)
+        return changes
 
     def update_stations(self, session, stations_json, coordinates):
         """
-        Updates station_data for stations downloaded from imgw site
+        Updates station_data for stations downloaded from imgw site, stations that are not recognized
+        in the system are created
         :param session database session
         :param stations_json json format string for all stations to update
         :param coordinates station coordinates that have been read from external configuration file
+        :return change set: dict datetime -> set of stored columns
         """
+        ensure_partitions(session.get_bind(), StationData.__tablename__,
+                          [self.create_datetime(station_json[IMGW_DATE], station_json[IMGW_HOUR])
+                           for station_json in stations_json])
+
+        stations = self.find_stations_by_imgw_ids(
+            session, [station_json[IMGW_STATION_ID] for station_json in stations_json])
+        rows = []
         for station_json in stations_json:
-            station = self.find_station_by_imgw_id(session, station_json[IMGW_STATION_ID])
-            self.update_station(session, station, station_json, coordinates)
+            imgw_id = int(station_json[IMGW_STATION_ID])
+            station = stations.get(imgw_id)
+            if station is None:
+                logger.error(f'station not found id: {imgw_id}')
+                station = self.save_station(session, station_json)
+                session.commit()
+                logger.info('Created new station %r' % station)
+                stations[imgw_id] = station
+
+            if self.updater_update_station_coordinates:
+                (lon, lat) = self.find_station_coordinates(station.imgw_id, coordinates)
+                if lon is not None and lat is not None:
+                    station.longitude = lon
+                    station.latitude = lat
+
+            rows.append(self.station_data_row(station.id, station_json))
+
+        if self.updater_update_station_coordinates:
+            logger.debug('Update coordinates.')
+            session.commit()
+        return self.save_stations_data(session, rows)
 
     def update(self):
         """
         This is main update method that reads station coordinates, downloads data for all stations from external
         configured in properties file or command line parameters
         TODO: This method is not UNIT TESTED!
+        :return change set: dict datetime -> set of stored columns, empty when nothing new has been stored
         """
         logger.info('IMGW Updating')
 
@@ -175,14 +256,51 @@ class MeteoUpdater (Updater):
         if self.updater_update_station_coordinates:
             coordinates = self.read_coordinates()
 
-        session = self.create_session()
-        stations_json = self.get(self.meteo_data_url)
-        logger.info('Received %s stations.' % str(len(stations_json)))
+        if self.stream:
+            chunks = self.get_stream(self.meteo_data_url, conditional=True)
+        else:
+            stations_json = self.get(self.meteo_data_url, conditional=True)
+            chunks = [stations_json] if stations_json is not None else None
 
-        self.update_stations(session, stations_json, coordinates)
+        if chunks is None:
+            logger.info('IMGW data not modified since last update.')
+            return {}
+
+        changes = self._update_chunks(chunks, coordinates)
+        self.confirm(self.meteo_data_url)
+        return changes
+
+    def update_from_file(self, file_name):
+        """
+        Replays IMGW synop data stored in a local json file.
+        :param file_name: json file with the same content as served by IMGW api
+        :return change set: dict datetime -> set of stored columns
+        """
+        logger.info(f'IMGW updating from file {file_name}')
+
+        coordinates = None
+        if self.updater_update_station_coordinates:
+            coordinates = self.read_coordinates()
+
+        return self._update_chunks(self.read_stream(file_name), coordinates)
+
+    def _update_chunks(self, chunks, coordinates):
+        session = self.create_session()
+        count = 0
+        changes = {}
+        try:
+            for stations_json in chunks:
+                count += len(stations_json)
+                with metrics.timer('imgw.ingest'):
+                    merge_changes(changes, self.update_stations(session, stations_json, coordinates))
+                metrics.count('imgw.records', len(stations_json))
+        finally:
+            logger.debug('Closing connections')
+            session.close()
 
-        logger.debug('Closing connections')
-        session.close_all()
+        logger.info('Received %s stations.' % str(count))
+        logger.info(f'Stored new data for {len(changes)} datetimes.')
+        return changes
 
     def update_daemonize(self):
         """
@@ -0,0 +1,36 @@
+###
+# SolarMeteo    : https://github.com/pa810p/solarmeteo
+# Author        : Pawel Prokop
+# License       : GNU GENERAL PUBLIC LICENSE v3
+###
+
+import threading
+import time
+
+
+class RateLimiter:
+    """
+    Thread safe limiter that keeps at least min_interval seconds between consecutive acquisitions.
+    """
+
+    def __init__(self, min_interval):
+        self.min_interval = float(min_interval or 0)
+        self._lock = threading.Lock()
+        self._next = 0.0
+
+    def acquire(self):
+        if self.min_interval <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next - now
+            self._next = max(now, self._next) + self.min_interval
+        if wait > 0:
+            time.sleep(wait)
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return False
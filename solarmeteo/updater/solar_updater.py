@@ -4,26 +4,53 @@
 # License       : GNU GENERAL PUBLIC LICENSE v3
 ###
 
-from datetime import datetime
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
 from logging import getLogger
 
+from sqlalchemy import select, insert, exists
+
+from solarmeteo.metrics import metrics
+from solarmeteo.model.database import bulk_upsert
 from solarmeteo.updater import sun
 from solarmeteo.model.solar_data import SolarData
+from solarmeteo.updater.rate_limiter import RateLimiter
 from solarmeteo.updater.updater import Updater
 from solarmeteo.model.sun_data import SunData
 
 logger = getLogger(__name__)
 
+SUN_BACKFILL_CHUNK_SIZE = 50000
+
+# SolarEdge api allows at most 3 concurrent requests per site
+# and quarter of an hour resolution for periods of up to one month
+BACKFILL_MAX_WORKERS = 3
+
 
 class SolarUpdater(Updater):
-    def __init__(self, meteo_db_url, data_url, updater_interval, site_id, solar_key, lon, lat, height):
-        super(SolarUpdater, self).__init__(meteo_db_url, updater_interval)
+
+    metrics_prefix = 'solar'
+
+    def __init__(self, meteo_db_url, data_url, updater_interval, site_id, solar_key, lon, lat, height,
+                 http_client=None, backfill_workers=BACKFILL_MAX_WORKERS, backfill_request_interval=0,
+                 backfill_checkpoint_file=None):
+        """
+        :param backfill_workers: concurrent downloads of period backfill
+        :param backfill_request_interval: minimal interval in seconds between backfill requests
+        :param backfill_checkpoint_file: json file storing completed windows of period backfills, None disables
+        """
+        super(SolarUpdater, self).__init__(meteo_db_url, updater_interval, http_client=http_client)
         self.site_id = site_id
         self.data_url = data_url
         self.solar_key = solar_key
         self.lon = lon
         self.lat = lat
         self.height = height
+        self.backfill_workers = max(1, min(int(backfill_workers), BACKFILL_MAX_WORKERS))
+        self.rate_limiter = RateLimiter(backfill_request_interval)
+        self.backfill_checkpoint_file = backfill_checkpoint_file
 
     def download_current_solar_data(self):
         """
@@ -46,20 +73,21 @@ class SolarUpdater(Updater):
         power = solar_data['overview']['currentPower']['power']
         solar_datetime_str = solar_data['overview']['lastUpdateTime']
 
-        session = self.create_session()
+        with metrics.timer('solar.ingest'):
+            session = self.create_session()
 
-        solar_data_db = SolarData(solar_datetime_str, power)
+            solar_datetime = datetime.strptime(solar_datetime_str, '%Y-%m-%d %H:%M:%S')
+            solar_data_db = SolarData(solar_datetime, power)
 
-        # calculate solar position on this datetime
-        (azimuth, height) = sun.calculate_sun(
-            datetime.strptime(solar_datetime_str, '%Y-%m-%d %H:%M:%S'), self.lon, self.lat, self.height)
-        sun_data_db = SunData(solar_datetime_str, azimuth, height)
+            # calculate solar position on this datetime
+            (azimuth, height) = sun.calculate_sun(solar_datetime, self.lon, self.lat, self.height)
+            sun_data_db = SunData(solar_datetime, azimuth, height)
 
-        session.add(solar_data_db)
-        session.add(sun_data_db)
+            session.add(solar_data_db)
+            session.add(sun_data_db)
 
-        session.commit()
-        session.close()
+            session.commit()
+            session.close()
 
         logger.debug('Updated: %r' % solar_data)
 
@@ -74,32 +102,157 @@ class SolarUpdater(Updater):
 
     def update_datetime_period(self, date_period):
         """
+        Backfills solar data of a period. The period is split into month long windows (the longest period
+        the api serves in quarter of an hour resolution) that are downloaded concurrently under rate limit,
+        each window is merged into solar_data with a single upsert. Completed windows are checkpointed,
+        so an interrupted backfill of the same period resumes with the remaining windows.
+
         :param date_period: string date period from:to in format as follow: YYYYY-MM-DD:YYYY-MM-DD
+        :return: number of upserted rows
         """
         dates = date_period.split(':')
         from_date = datetime.strptime(dates[0], "%Y-%m-%d")
         to_date = datetime.strptime(dates[1], "%Y-%m-%d")
 
-        data = self.download_datetime_period(from_date, to_date)
+        checkpoint_key = f'{self.site_id} {from_date:%Y-%m-%d}:{to_date:%Y-%m-%d}'
+        checkpoint = self._load_checkpoint()
+        completed = set(checkpoint.get(checkpoint_key, []))
+
+        windows = [window for window in self.split_period(from_date, to_date)
+                   if self._window_key(window) not in completed]
+        logger.info(f'Solar backfill {checkpoint_key}: {len(windows)} windows to download, '
+                    f'{len(completed)} already done')
 
         session = self.create_session()
+        total = 0
+        try:
+            with ThreadPoolExecutor(max_workers=self.backfill_workers) as executor:
+                futures = {executor.submit(self._download_window, window): window for window in windows}
 
-        # propagate data to database
-        for measure in data['energy']['values']:
-            logger.debug('date: %s, measure: %s' % (measure['date'], measure['value']))
-            entity = session.query(SolarData).filter_by(datetime=measure['date'])
-            if entity is None:
-                # create new object
-                logger.debug('creating new solar_data entry')
-                solar_data = SolarData(datetime=measure['date'], power=measure['value'])
-                session.add(solar_data)
-                session.commit()
-            else:  # update existing data
-                logger.debug('updating existing solar_data entry')
-                entity.power = measure['value']
+                for future in as_completed(futures):
+                    window = futures[future]
+                    with metrics.timer('solar.ingest'):
+                        total += self.merge_energy_values(session, future.result()['energy']['values'])
+
+                    completed.add(self._window_key(window))
+                    checkpoint[checkpoint_key] = sorted(completed)
+                    self._save_checkpoint(checkpoint)
+                    logger.debug(f'Solar backfill window {self._window_key(window)} done')
+        finally:
+            session.close()
+
+        checkpoint.pop(checkpoint_key, None)
+        self._save_checkpoint(checkpoint)
+
+        logger.info(f'Solar backfill {checkpoint_key} completed, {total} rows merged.')
+        return total
+
+    @staticmethod
+    def split_period(from_date, to_date):
+        """
+        Splits period into windows aligned to calendar months.
+
+        :return: list of (start, end) tuples, end inclusive
+        """
+        windows = []
+        start = from_date
+        while start <= to_date:
+            next_month = (start.replace(day=1) + timedelta(days=32)).replace(day=1)
+            end = min(next_month - timedelta(days=1), to_date)
+            windows.append((start, end))
+            start = next_month
+        return windows
+
+    @staticmethod
+    def _window_key(window):
+        return f'{window[0]:%Y-%m-%d}:{window[1]:%Y-%m-%d}'
+
+    def _download_window(self, window):
+        with self.rate_limiter:
+            return self.download_datetime_period(window[0], window[1])
+
+    @staticmethod
+    def merge_energy_values(session, values):
+        """
+        Merges energy measures into solar_data with bulk INSERT ... ON CONFLICT (datetime) DO UPDATE.
+
+        :param session: database session
+        :param values: list of {'date': 'YYYY-MM-DD HH:MM:SS', 'value': power} as served by the api
+        :return: number of merged rows
+        """
+        rows = [
+            {'datetime': datetime.strptime(measure['date'], '%Y-%m-%d %H:%M:%S'), 'power': measure['value']}
+            for measure in values
+            if measure.get('value') is not None
+        ]
+        if not rows:
+            return 0
+
+        bulk_upsert(session, SolarData, rows, index_elements=[SolarData.datetime],
+                    set_=lambda excluded: {'power': excluded.power})
+        session.commit()
+        return len(rows)
+
+    def _load_checkpoint(self):
+        if not self.backfill_checkpoint_file or not os.path.exists(self.backfill_checkpoint_file):
+            return {}
+        with open(self.backfill_checkpoint_file, encoding='utf-8') as f:
+            return json.load(f)
+
+    def _save_checkpoint(self, checkpoint):
+        if not self.backfill_checkpoint_file:
+            return
+        directory = os.path.dirname(self.backfill_checkpoint_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_file = self.backfill_checkpoint_file + '.tmp'
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(checkpoint, f, indent=1)
+        os.replace(tmp_file, self.backfill_checkpoint_file)
+
+    def backfill_sun_data(self, chunk_size=SUN_BACKFILL_CHUNK_SIZE):
+        """
+        Computes sun positions for every solar_data datetime that has no sun_data entry yet.
+        Missing datetimes are processed in chunks, each chunk is computed in one vectorized call
+        and inserted with a single bulk insert.
+
+        :param chunk_size: number of datetimes processed at once
+        :return: number of inserted sun_data rows
+        """
+        logger.info('Backfilling sun data')
+
+        missing = (
+            select(SolarData.datetime)
+            .where(~exists().where(SunData.datetime == SolarData.datetime))
+            .order_by(SolarData.datetime)
+            .limit(chunk_size)
+        )
+
+        session = self.create_session()
+        total = 0
+        try:
+            while True:
+                datetimes = session.execute(missing).scalars().all()
+                if not datetimes:
+                    break
+
+                azimuths, heights = sun.solar_position(datetimes, float(self.lon), float(self.lat))
+                session.execute(
+                    insert(SunData),
+                    [
+                        {'datetime': solar_datetime, 'azimuth': float(azimuth), 'height': float(height)}
+                        for solar_datetime, azimuth, height in zip(datetimes, azimuths, heights)
+                    ]
+                )
                 session.commit()
 
-        session.close()
+                total += len(datetimes)
+                logger.debug(f'Inserted {total} sun data rows, last: {datetimes[-1]}')
+        finally:
+            session.close()
+
+        logger.info(f'Backfilled {total} sun data rows.')
+        return total
 
     def download_datetime_period(self, from_date, to_date):
         """
@@ -108,7 +261,8 @@ class SolarUpdater(Updater):
         """
         url = '%s/site/%s/energy?timeUnit=QUARTER_OF_AN_HOUR' \
               '&startDate=%s&endDate=%s&api_key=%s' \
-              % (self.data_url, self.site_id, from_date, to_date, self.solar_key)
+              % (self.data_url, self.site_id, from_date.strftime('%Y-%m-%d'), to_date.strftime('%Y-%m-%d'),
+                 self.solar_key)
         logger.debug(url)
         return self.get(url)
 
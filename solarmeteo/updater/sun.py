@@ -3,12 +3,138 @@
 # Author        : Pawel Prokop
 # License       : GNU GENERAL PUBLIC LICENSE v3
 ###
-import pytz
-import astropy
-from astropy.coordinates import EarthLocation, AltAz, get_sun
+from datetime import datetime, timezone
+
+import numpy as np
+
+_UNIX_EPOCH_JULIAN_DAY = 2440587.5
+_J2000_JULIAN_DAY = 2451545.0
+_SECONDS_PER_DAY = 86400.0
+
+
+def _to_utc_datetime64(datetimes):
+    """
+    Converts datetime, list of datetimes or numpy datetime64 array to datetime64[us] in UTC.
+    Naive datetime objects are interpreted as local time (same as datetime.astimezone does),
+    numpy datetime64 values are expected to be UTC already.
+    """
+    values = np.asarray(datetimes)
+    if np.issubdtype(values.dtype, np.datetime64):
+        return values.astype('datetime64[us]')
+
+    flat = [
+        np.datetime64(d.astimezone(timezone.utc).replace(tzinfo=None), 'us') if isinstance(d, datetime)
+        else np.datetime64(d, 'us')
+        for d in values.ravel()
+    ]
+    return np.array(flat, dtype='datetime64[us]').reshape(values.shape)
+
+
+def solar_position(datetimes, lon, lat, refraction=False):
+    """
+    Computes sun position using NOAA solar position algorithm, vectorized with numpy.
+    Accuracy is within a few hundredths of degree for years 1800-2100.
+
+    :param datetimes: datetime, sequence of datetimes or numpy datetime64 array (UTC)
+    :param lon: longitude(s) in degrees (east positive), broadcast against datetimes
+    :param lat: latitude(s) in degrees (north positive), broadcast against datetimes
+    :param refraction: apply approximate atmospheric refraction to altitude
+    :return: tuple of numpy arrays (azimuth, altitude) in degrees, azimuth measured from north to east
+    """
+    utc = _to_utc_datetime64(datetimes)
+    lon = np.asarray(lon, dtype=np.float64)
+    lat = np.asarray(lat, dtype=np.float64)
+
+    seconds = (utc - np.datetime64('1970-01-01T00:00:00', 'us')) / np.timedelta64(1, 's')
+    julian_day = seconds / _SECONDS_PER_DAY + _UNIX_EPOCH_JULIAN_DAY
+    julian_century = (julian_day - _J2000_JULIAN_DAY) / 36525.0
+    jc = julian_century
+
+    geom_mean_long = np.mod(280.46646 + jc * (36000.76983 + jc * 0.0003032), 360.0)
+    geom_mean_anom = 357.52911 + jc * (35999.05029 - 0.0001537 * jc)
+    eccentricity = 0.016708634 - jc * (0.000042037 + 0.0000001267 * jc)
+
+    anom = np.radians(geom_mean_anom)
+    equation_of_center = (np.sin(anom) * (1.914602 - jc * (0.004817 + 0.000014 * jc))
+                          + np.sin(2 * anom) * (0.019993 - 0.000101 * jc)
+                          + np.sin(3 * anom) * 0.000289)
+    true_long = geom_mean_long + equation_of_center
+
+    omega = np.radians(125.04 - 1934.136 * jc)
+    apparent_long = true_long - 0.00569 - 0.00478 * np.sin(omega)
+
+    mean_obliquity = 23.0 + (26.0 + (21.448 - jc * (46.815 + jc * (0.00059 - jc * 0.001813))) / 60.0) / 60.0
+    obliquity = np.radians(mean_obliquity + 0.00256 * np.cos(omega))
+
+    declination = np.arcsin(np.sin(obliquity) * np.sin(np.radians(apparent_long)))
+
+    var_y = np.tan(obliquity / 2) ** 2
+    mean_long = np.radians(geom_mean_long)
+    equation_of_time = 4 * np.degrees(
+        var_y * np.sin(2 * mean_long)
+        - 2 * eccentricity * np.sin(anom)
+        + 4 * eccentricity * var_y * np.sin(anom) * np.cos(2 * mean_long)
+        - 0.5 * var_y ** 2 * np.sin(4 * mean_long)
+        - 1.25 * eccentricity ** 2 * np.sin(2 * anom))
+
+    minutes_of_day = np.mod(seconds, _SECONDS_PER_DAY) / 60.0
+    true_solar_time = np.mod(minutes_of_day + equation_of_time + 4 * lon, 1440.0)
+    hour_angle = np.radians(true_solar_time / 4.0 - 180.0)
+
+    phi = np.radians(lat)
+    cos_zenith = np.sin(phi) * np.sin(declination) + np.cos(phi) * np.cos(declination) * np.cos(hour_angle)
+    zenith = np.degrees(np.arccos(np.clip(cos_zenith, -1.0, 1.0)))
+    altitude = 90.0 - zenith
+
+    azimuth = np.mod(np.degrees(np.arctan2(
+        np.sin(hour_angle),
+        np.cos(hour_angle) * np.sin(phi) - np.tan(declination) * np.cos(phi))) + 180.0, 360.0)
+
+    if refraction:
+        altitude = altitude + _refraction(altitude)
+
+    return azimuth, altitude
+
+
+def _refraction(altitude):
+    """
+    Approximate atmospheric refraction correction in degrees (NOAA).
+    """
+    tan_alt = np.tan(np.radians(altitude))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        correction = np.where(
+            altitude > 85.0, 0.0,
+            np.where(altitude > 5.0,
+                     58.1 / tan_alt - 0.07 / tan_alt ** 3 + 0.000086 / tan_alt ** 5,
+                     np.where(altitude > -0.575,
+                              1735.0 + altitude * (-518.2 + altitude * (103.4 + altitude * (-12.79 + altitude * 0.711))),
+                              -20.772 / tan_alt)))
+    return correction / 3600.0
 
 
 def calculate_sun(solar_datetime, lon, lat, height):
+    """
+    Calculates sun azimuth and altitude for a single datetime.
+
+    :param solar_datetime: datetime, naive datetime is interpreted as local time
+    :param lon: longitude in degrees
+    :param lat: latitude in degrees
+    :param height: height above sea level in meters, its influence is negligible and it is not used
+    :return: tuple (azimuth, altitude) in degrees
+    """
+    azimuth, altitude = solar_position([solar_datetime], float(lon), float(lat))
+    return float(azimuth[0]), float(altitude[0])
+
+
+def calculate_sun_astropy(solar_datetime, lon, lat, height):
+    """
+    Reference implementation using astropy, slow (IERS initialization, per call frame transformation)
+    but precise, kept for validation.
+    """
+    import astropy.time
+    import pytz
+    from astropy.coordinates import EarthLocation, AltAz, get_sun
+
     loc = EarthLocation.from_geodetic(lon, lat, height)
     altaz = AltAz(location=loc)
 
@@ -23,4 +149,3 @@ def calculate_sun(solar_datetime, lon, lat, height):
     sun_altitude = float(sunpos.alt.degree)
 
     return sun_azimuth, sun_altitude
-
@@ -5,46 +5,123 @@
 ###
 
 
-import requests
-from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
+from solarmeteo.metrics import metrics
+from solarmeteo.model.database import get_engine
+from solarmeteo.updater import json_stream
+from solarmeteo.updater.http_client import HttpClient
+
 from logging import getLogger
 
 logger = getLogger(__name__)
 
 class Updater:
 
-    def __init__(self, meteo_db_url, updater_interval):
+    # prefix of metrics of the updater, e.g. imgw.download
+    metrics_prefix = 'updater'
+
+    def __init__(self, meteo_db_url, updater_interval, stream=False, stream_chunk_size=json_stream.DEFAULT_CHUNK_SIZE,
+                 http_client=None):
         """
         Base class of updaters
 
         :param meteo_db_url:
         :param updater_interval: obsolete, daemon mode will not be used anymore
+        :param stream: parse downloaded json incrementally and process it in chunks
+        :param stream_chunk_size: number of records passed to the database per chunk in stream mode
+        :param http_client: shared HttpClient, a private one is created if not given
         """
         self.meteo_db_url = meteo_db_url
         self.updater_interval = updater_interval
+        self.stream = stream
+        self.stream_chunk_size = stream_chunk_size
+        self.http = http_client if http_client is not None else HttpClient()
 
     def create_connection(self):
         """
         Creates connection to database
         """
-        engine = create_engine(self.meteo_db_url)
-        return engine.connect()
+        return get_engine(self.meteo_db_url).connect()
 
     def create_session(self):
         """
-        Creates a database session
+        Creates a database session using shared connection pool
         """
-        session = sessionmaker(bind=self.create_connection())
+        session = sessionmaker(bind=get_engine(self.meteo_db_url))
         return session()
 
-    def get(self, url, timeout=30):
-        response = requests.get(url, timeout=timeout)
-        logger.debug('GET: %s status code: %s' % (url, str(response.status_code)))
-        if response.status_code == 200:
-            return response.json()
-        else:
-            logger.error('Error downloading solar information.')
-            raise Exception('Error downloading solar information.')
+    def get(self, url, timeout=30, conditional=False):
+        """
+        Downloads json document.
+
+        :param url: url of json document
+        :param timeout: connection timeout
+        :param conditional: skip the document if it has not changed since the last confirmed download
+        :return: parsed json, or None for an unchanged conditional download
+        """
+        with metrics.timer(f'{self.metrics_prefix}.download'):
+            response = self.http.get(url, timeout=timeout, conditional=conditional)
+            if response is None:
+                logger.debug('GET: %s not modified' % url)
+                metrics.count(f'{self.metrics_prefix}.not_modified')
+                return None
+            logger.debug('GET: %s status code: %s' % (url, str(response.status_code)))
+            if response.status_code == 200:
+                return response.json()
+        metrics.count(f'{self.metrics_prefix}.download_errors')
+        logger.error('Error downloading solar information.')
+        raise Exception('Error downloading solar information.')
+
+    def get_stream(self, url, key=None, timeout=30, conditional=False):
+        """
+        Downloads json array and yields its records in chunks of stream_chunk_size while the body is still
+        being received, so the whole document is never held in memory.
+
+        :param url: url of json document
+        :param key: name of the member holding the array, None if the document is an array itself
+        :param timeout: connection timeout
+        :param conditional: skip the document if it has not changed since the last confirmed download
+        :return: generator of record lists, or None for an unchanged conditional download
+        """
+        with metrics.timer(f'{self.metrics_prefix}.connect'):
+            response = self.http.get(url, timeout=timeout, conditional=conditional, stream=True)
+        if response is None:
+            logger.debug('GET (stream): %s not modified' % url)
+            metrics.count(f'{self.metrics_prefix}.not_modified')
+            return None
+        logger.debug('GET (stream): %s status code: %s' % (url, str(response.status_code)))
+        if response.status_code != 200:
+            response.close()
+            metrics.count(f'{self.metrics_prefix}.download_errors')
+            logger.error('Error downloading %s' % url)
+            raise Exception('Error downloading %s' % url)
 
+        return self._iter_stream(response, key)
+
+    def _iter_stream(self, response, key):
+        try:
+            records = json_stream.iter_json_array(response.iter_content(chunk_size=json_stream.DEFAULT_READ_SIZE),
+                                                  key=key, encoding=response.encoding or 'utf-8')
+            yield from json_stream.prefetch(json_stream.chunked(records, self.stream_chunk_size))
+        finally:
+            response.close()
+
+    def confirm(self, url):
+        """
+        Marks conditional download of url as processed, so unchanged content is skipped next time.
+        """
+        self.http.confirm(url)
+
+    def read_stream(self, file_name, key=None):
+        """
+        Yields records of json array stored in a local file in chunks of stream_chunk_size, used to replay
+        previously downloaded payloads.
+
+        :param file_name: json file
+        :param key: name of the member holding the array, None if the document is an array itself
+        :return: generator of record lists
+        """
+        logger.debug(f'Reading (stream): {file_name}')
+        records = json_stream.iter_json_array(json_stream.read_file(file_name), key=key)
+        yield from json_stream.prefetch(json_stream.chunked(records, self.stream_chunk_size))
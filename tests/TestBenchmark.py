@@ -0,0 +1,81 @@
+###
+# SolarMeteo    : https://github.com/pa810p/solarmeteo
+# Author        : Pawel Prokop
+# License       : GNU GENERAL PUBLIC LICENSE v3
+###
+
+import os
+import tempfile
+import unittest
+from datetime import datetime
+
+import numpy as np
+import shapely
+from shapely.geometry import Polygon
+
+from solarmeteo.benchmark.baseline import compare, save_baseline, load_baseline
+from solarmeteo.benchmark.pipeline import run_benchmark, time_frame_stages, benchmark_creator, STAGES
+from solarmeteo.benchmark.synthetic import synthetic_stations, POLAND_OUTLINE, CITIES, LAYOUT_ESA
+from solarmeteo.heatmap.data_provider import StationValue
+
+
+def result(**stages):
+    return {'results': {'imgw-60p-1f': {'stages': {'fetch': 0.1, 'render': 1.0, 'interpolate': None} | stages}}}
+
+
+class TestBenchmark(unittest.TestCase):
+
+    def test_synthetic_stations(self):
+        lons, lats, names = synthetic_stations(200, seed=1)
+
+        self.assertEqual(200, len(lons))
+        self.assertTrue(shapely.contains_xy(Polygon(POLAND_OUTLINE), lons, lats).all())
+        self.assertEqual(list(CITIES), list(names[:len(CITIES)]))
+
+        esa_lons, _, _ = synthetic_stations(200, LAYOUT_ESA, seed=1)
+        self.assertFalse(np.array_equal(lons, esa_lons))
+
+    def test_run_benchmark(self):
+        benchmark = run_benchmark(points=(30,), frames=(1, 3), sample_frames=1)
+
+        self.assertEqual({'imgw-30p-1f', 'imgw-30p-3f'}, set(benchmark['results']))
+        single, triple = benchmark['results']['imgw-30p-1f'], benchmark['results']['imgw-30p-3f']
+        self.assertEqual(list(STAGES), list(single['stages']))
+        self.assertEqual(3, triple['frames'])
+        self.assertEqual([], single['skipped'])
+        self.assertTrue(all(seconds > 0 for seconds in single['stages'].values()))
+        # stages of a single frame are measured once and scale with frames
+        self.assertAlmostEqual(single['stages']['render'] * 3, triple['stages']['render'])
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'baseline.json')
+            save_baseline(benchmark, path)
+            self.assertEqual([], compare(load_baseline(path), benchmark))
+
+    def test_large_interpolation_skipped(self):
+        creator = benchmark_creator()
+        creator.mask = lambda xx, yy: np.ones(xx.shape, dtype=bool)
+        stations = [(datetime(2025, 1, 1), [StationValue(19.9, 50.0, 10.0, 'Kraków'),
+                                            StationValue(21.0, 52.2, 12.0, 'Warszawa')])]
+
+        timings, images = time_frame_stages(creator, stations, memory_limit=0)
+
+        self.assertIsNone(timings['interpolate'])
+        self.assertIsNotNone(timings['render'])
+        self.assertEqual(1, len(images))
+
+    def test_compare(self):
+        baseline = result()
+
+        regressions = compare(baseline, result(render=1.3, fetch=0.11, interpolate=5.0), tolerance=0.25)
+
+        self.assertEqual([('imgw-60p-1f', 'render')], [(r.key, r.stage) for r in regressions])
+        self.assertAlmostEqual(1.3, regressions[0].ratio)
+        self.assertEqual([], compare(baseline, result(render=1.2), tolerance=0.25))
+        # noise of fast stages is ignored
+        self.assertEqual([], compare(result(fetch=0.001), result(fetch=0.005)))
+        self.assertEqual([], compare(baseline, {'results': {}}))
+
+
+if __name__ == '__main__':
+    unittest.main()
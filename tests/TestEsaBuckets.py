@@ -0,0 +1,129 @@
+###
+# SolarMeteo    : https://github.com/pa810p/solarmeteo
+# Author        : Pawel Prokop
+# License       : GNU GENERAL PUBLIC LICENSE v3
+###
+
+import os
+import tempfile
+import unittest
+from datetime import datetime
+
+from mockito import spy2, verify, unstub
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from solarmeteo.heatmap.data_provider import ESAProvider, PM10Provider
+from solarmeteo.model import Base, EsaStation, EsaStationData
+from solarmeteo.model.database import dispose_engines
+from solarmeteo.model.observed_datetime import observe_datetimes, SOURCE_ESA
+from solarmeteo.updater.esa_updater import EsaUpdater
+from tests.TestSqliteStorage import smog_json
+
+
+class TestEsaBuckets(unittest.TestCase):
+
+    def setUp(self):
+        self.db_dir = tempfile.mkdtemp()
+        self.db_url = 'sqlite:///' + os.path.join(self.db_dir, 'meteo.db')
+        self.engine = create_engine(self.db_url)
+        Base.metadata.create_all(self.engine)
+
+        with Session(self.engine) as session:
+            krakow = [EsaStation(name=f'Kraków {i}', city='Kraków', longitude=19.9 + i / 100, latitude=50.0)
+                      for i in range(2)]
+            zakopane = EsaStation(name='Zakopane', city='Zakopane', longitude=19.9, latitude=49.3)
+            session.add_all(krakow + [zakopane])
+            session.flush()
+            measurements = [
+                (krakow[0], datetime(2025, 1, 1, 10, 3, 17), 30.0),
+                (krakow[1], datetime(2025, 1, 1, 10, 7, 41), 50.0),
+                (zakopane, datetime(2025, 1, 1, 10, 11, 5), 20.0),
+                (krakow[0], datetime(2025, 1, 1, 10, 22, 0), 60.0),
+                (zakopane, datetime(2025, 1, 1, 10, 58, 59), 10.0),
+                (krakow[1], datetime(2025, 1, 1, 11, 1, 30), 80.0),
+            ]
+            for station, measured, pm10 in measurements:
+                session.add(EsaStationData(esa_station_id=station.id, humidity=50, pressure=1000, temperature=5,
+                                           pm10=pm10, pm25=pm10 / 2, datetime=measured))
+            observe_datetimes(session, SOURCE_ESA, [measured for _, measured, _ in measurements])
+            session.commit()
+
+    def tearDown(self):
+        unstub()
+        self.engine.dispose()
+        dispose_engines()
+        os.remove(os.path.join(self.db_dir, 'meteo.db'))
+        os.rmdir(self.db_dir)
+
+    def test_align(self):
+        provider = ESAProvider(self.db_url, bucket_minutes=10, grid_km=0)
+
+        self.assertEqual(datetime(2025, 1, 1, 10, 50), provider.align(datetime(2025, 1, 1, 10, 58, 59)))
+        self.assertEqual(datetime(2025, 1, 1, 11, 0), provider.align(datetime(2025, 1, 1, 11, 0)))
+
+    def test_last_datetimes_are_aligned(self):
+        provider = PM10Provider(self.db_url, bucket_minutes=30, grid_km=0)
+
+        self.assertEqual([datetime(2025, 1, 1, 11), datetime(2025, 1, 1, 10, 30), datetime(2025, 1, 1, 10)],
+                         provider.get_last_datetimes(3))
+
+    def test_buckets_aggregated_per_city(self):
+        # given
+        provider = PM10Provider(self.db_url, bucket_minutes=60, grid_km=0)
+
+        # when
+        buckets = provider.provide_stations_by_datetimes(datetimes=provider.get_last_datetimes(2))
+
+        # then
+        self.assertEqual([datetime(2025, 1, 1, 11), datetime(2025, 1, 1, 10)], [bucket for bucket, _ in buckets])
+        self.assertEqual({'Kraków': 80.0}, {s.name: s.value for s in buckets[0][1]})
+        self.assertEqual({'Kraków': 140.0 / 3, 'Zakopane': 15.0}, {s.name: s.value for s in buckets[1][1]})
+
+    def test_sensors_binned_to_grid(self):
+        # given
+        provider = PM10Provider(self.db_url, bucket_minutes=60, grid_km=5)
+
+        # when
+        buckets = dict(provider.provide_stations_by_datetimes(datetimes=[datetime(2025, 1, 1, 10)]))
+
+        # then: sensors of a city are binned, not averaged with equal weight per reading
+        stations = buckets[datetime(2025, 1, 1, 10)]
+        self.assertEqual(['Kraków', 'Zakopane'], sorted(s.name for s in stations if s.name))
+        self.assertEqual(15.0, next(s.value for s in stations if s.name == 'Zakopane'))
+        self.assertLessEqual(len(stations), 3)
+
+    def test_complete_buckets_cached(self):
+        # given
+        provider = PM10Provider(self.db_url, bucket_minutes=15, grid_km=0)
+        spy2(provider._query_buckets)
+        datetimes = provider.get_last_datetimes(5)
+
+        # when
+        first = provider.provide_stations_by_datetimes(datetimes=datetimes)
+        second = provider.provide_stations_by_datetimes(datetimes=datetimes)
+
+        # then: first call queries all buckets at once, second only the incomplete (latest) bucket
+        self.assertEqual(first, second)
+        verify(provider, times=1)._query_buckets('pm10', datetime(2025, 1, 1, 10), datetime(2025, 1, 1, 11, 15))
+        verify(provider, times=1)._query_buckets('pm10', datetime(2025, 1, 1, 11), datetime(2025, 1, 1, 11, 15))
+
+    def test_late_rows_invalidate_cached_buckets(self):
+        # given: the 10:00 bucket is complete and cached
+        provider = PM10Provider(self.db_url, bucket_minutes=60, grid_km=0)
+        datetimes = provider.get_last_datetimes(2)
+        provider.provide_stations_by_datetimes(datetimes=datetimes)
+
+        # when: a reading of 10:30 arrives late
+        with Session(self.engine) as session:
+            EsaUpdater(self.db_url, None).update_smog_data(session, [smog_json('Kraków 0', '2025-01-01T10:30:00', 110.0)])
+        spy2(provider._query_buckets)
+        buckets = dict(provider.provide_stations_by_datetimes(datetimes=datetimes))
+
+        # then
+        self.assertEqual({'Kraków': 62.5, 'Zakopane': 15.0}, {s.name: s.value for s in buckets[datetime(2025, 1, 1, 10)]})
+        verify(provider, times=1)._query_buckets('pm10', datetime(2025, 1, 1, 10), datetime(2025, 1, 1, 12))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+###
+# SolarMeteo    : https://github.com/pa810p/solarmeteo
+# Author        : Pawel Prokop
+# License       : GNU GENERAL PUBLIC LICENSE v3
+###
+
+import os
+import tempfile
+import unittest
+from datetime import datetime
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+from solarmeteo.heatmap.heatmap import HeatMap
+from solarmeteo.model import Base
+from solarmeteo.model.database import dispose_engines
+from solarmeteo.model.station import Station
+from solarmeteo.model.station_data import StationData
+from solarmeteo.updater.meteo_updater import MeteoUpdater
+
+
+def station_json(imgw_id, date, hour, temperature='15.1', wind_speed='1', wind_direction='320', humidity='58.4',
+                 precipitation='0', pressure='1017.2'):
+    return {
+        'id_stacji': imgw_id, 'stacja': f'Station {imgw_id}', 'data_pomiaru': date, 'godzina_pomiaru': hour,
+        'temperatura': temperature, 'predkosc_wiatru': wind_speed, 'kierunek_wiatru': wind_direction,
+        'wilgotnosc_wzgledna': humidity, 'suma_opadu': precipitation, 'cisnienie': pressure,
+    }
+
+
+class TestFrameRegeneration(unittest.TestCase):
+
+    def setUp(self):
+        self.db_dir = tempfile.mkdtemp()
+        self.db_url = 'sqlite:///' + os.path.join(self.db_dir, 'meteo.db')
+        self.engine = create_engine(self.db_url)
+        Station.metadata.create_all(self.engine)
+        StationData.metadata.create_all(self.engine)
+        Base.metadata.create_all(self.engine)
+        with self.engine.begin() as connection:
+            connection.execute(text('CREATE UNIQUE INDEX station_data_uq ON station_data (station_id, datetime)'))
+
+        self.updater = MeteoUpdater(meteo_db_url=self.db_url, meteo_data_url=None, updater_interval=None,
+                                    updater_update_station_coordinates=False,
+                                    updater_update_station_coordinates_file=None)
+
+    def tearDown(self):
+        self.engine.dispose()
+        dispose_engines()
+        os.remove(os.path.join(self.db_dir, 'meteo.db'))
+        os.rmdir(self.db_dir)
+
+    def test_update_stations_returns_stored_changes(self):
+        # given
+        stations = [
+            station_json('12295', '2025-06-23', '8'),
+            station_json('12600', '2025-06-23', '8', pressure=None),
+        ]
+
+        # when
+        with Session(self.engine) as session:
+            changes = self.updater.update_stations(session, stations, None)
+
+        # then
+        self.assertEqual({datetime(2025, 6, 23, 8):
+                              {'temperature', 'wind_speed', 'wind_direction', 'humidity', 'precipitation',
+                               'pressure'}}, changes)
+
+    def test_repeated_and_late_data(self):
+        # given
+        with Session(self.engine) as session:
+            self.updater.update_stations(session, [station_json('12295', '2025-06-23', '8')], None)
+
+        # when: the same data again plus a late row of an older hour with temperature only
+        with Session(self.engine) as session:
+            changes = self.updater.update_stations(session, [
+                station_json('12295', '2025-06-23', '8'),
+                station_json('12600', '2025-06-23', '6', wind_speed=None, wind_direction=None, humidity=None,
+                             precipitation=None, pressure=None),
+            ], None)
+
+        # then
+        self.assertEqual({datetime(2025, 6, 23, 6): {'temperature'}}, changes)
+
+    def test_no_changes_no_frames(self):
+        # given
+        with Session(self.engine) as session:
+            self.updater.update_stations(session, [station_json('12295', '2025-06-23', '8')], None)
+
+        # when
+        with Session(self.engine) as session:
+            changes = self.updater.update_stations(session, [station_json('12295', '2025-06-23', '8')], None)
+
+        # then
+        self.assertEqual({}, changes)
+        self.assertEqual({}, HeatMap.affected_frames(changes))
+
+    def test_affected_frames(self):
+        # given
+        first, second = datetime(2025, 6, 23, 6), datetime(2025, 6, 23, 8)
+        changes = {second: {'temperature', 'wind_direction'}, first: {'temperature'}}
+
+        # when
+        affected = HeatMap.affected_frames(changes)
+
+        # then
+        self.assertEqual({'temperature': [first, second], 'wind': [second]}, affected)
+
+
+if __name__ == '__main__':
+    unittest.main()
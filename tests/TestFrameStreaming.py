@@ -0,0 +1,224 @@
+###
+# SolarMeteo    : https://github.com/pa810p/solarmeteo
+# Author        : Pawel Prokop
+# License       : GNU GENERAL PUBLIC LICENSE v3
+###
+
+import os
+import tempfile
+import threading
+import time
+import tracemalloc
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from unittest import mock
+
+import numpy as np
+from PIL import Image
+
+from solarmeteo.benchmark.synthetic import synthetic_geometry, synthetic_stations
+from solarmeteo.heatmap.heatmap import HeatMap, FrameSequence, AnimationWriter
+from solarmeteo.heatmap.heatmap_creator import GiosIndexCreator
+from solarmeteo.heatmap.data_provider import StationValue
+from solarmeteo.metrics.memory import MemoryTracker, start_tracing
+
+START = datetime(2025, 1, 1)
+
+
+def frame(value):
+    return np.full((20, 30, 3), value, dtype=np.uint8)
+
+
+class SlowCreator:
+    """
+    Renders frames in threads and records how many render at a time, later datetimes finish first.
+    """
+
+    def __init__(self):
+        self.running = 0
+        self.max_running = 0
+        self.lock = threading.Lock()
+
+    def generate_image(self, stations, displaydate, display_labels, vmin=None, vmax=None):
+        with self.lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        time.sleep(0.05 - (displaydate - START).total_seconds() / 3600 * 0.005)
+        with self.lock:
+            self.running -= 1
+        return displaydate, frame(int(stations[0].value))
+
+
+def create_heatmap(hours, memory_budget_mb=0, persist=False):
+    datetimes = [START + timedelta(hours=hour) for hour in range(hours)]
+    heatmap = HeatMap.__new__(HeatMap)
+    heatmap.heatmap_type = 'temperature'
+    heatmap.dataprovider = mock.Mock()
+    heatmap.dataprovider.provide_stations_by_datetimes.return_value = [
+        (date_time, [StationValue(19.9, 50.0, float(hour), 'Kraków')])
+        for hour, date_time in reversed(list(enumerate(datetimes)))]
+    heatmap.quality_control = None
+    heatmap.heatmap_creator = SlowCreator()
+    heatmap.executor = ThreadPoolExecutor(max_workers=4)
+    heatmap.max_workers = 2
+    heatmap.persist = persist
+    heatmap.ranges = {}
+    heatmap.profile_dir = None
+    heatmap.memory_budget = memory_budget_mb * 1024 ** 2
+    heatmap.memory = MemoryTracker()
+    return heatmap, datetimes
+
+
+class TestFrameStreaming(unittest.TestCase):
+
+    def test_frame_sequence(self):
+        received = []
+        hours = [START + timedelta(hours=hour) for hour in range(5)]
+        sequence = FrameSequence(hours[1:], lambda date_time, image: received.append(date_time),
+                                 frames={hours[0]: frame(0), hours[3]: frame(3)})
+
+        self.assertEqual([hours[0]], received)
+        sequence.add(hours[4], frame(4))
+        sequence.add(hours[2], None)
+        self.assertEqual(3, sequence.buffered)
+        sequence.add(hours[1], frame(1))
+
+        # failed frame is skipped, cached one is passed in its place
+        self.assertEqual([hours[0], hours[1], hours[3], hours[4]], received)
+        self.assertEqual(0, sequence.buffered)
+
+    def test_animation_writer(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for file_format in ('gif', 'webp'):
+                path = os.path.join(directory, f'animation.{file_format}')
+                with AnimationWriter(path, file_format) as writer:
+                    for value in (0, 100, 200):
+                        writer.append(frame(value))
+                with Image.open(path) as image:
+                    self.assertEqual(3, image.n_frames)
+
+            with AnimationWriter(os.path.join(directory, 'empty.gif'), 'gif'):
+                pass
+            self.assertFalse(os.path.exists(os.path.join(directory, 'empty.gif')))
+
+        with self.assertRaises(ValueError):
+            AnimationWriter('animation.mp4', 'mp4')
+
+    def test_animation_writer_spools_frames(self):
+        frames = []
+        for value in range(12):
+            image = np.full((200, 300, 3), 40, dtype=np.uint8)
+            image[50:80, 20 * value:20 * value + 40] = (200, 10 * value, 30)
+            frames.append(image)
+
+        with tempfile.TemporaryDirectory() as directory:
+            for file_format in ('gif', 'webp'):
+                path = os.path.join(directory, f'animation.{file_format}')
+                with AnimationWriter(path, file_format) as writer:
+                    for image in frames:
+                        writer.append(image)
+                    # appended frames are kept on disk only
+                    self.assertEqual(len(frames) * 200 * 300 * 4, writer._spool.tell())
+                self.assertIsNone(writer._spool)
+
+                with Image.open(path) as animation:
+                    self.assertEqual(len(frames), animation.n_frames)
+                    for index, image in enumerate(frames):
+                        animation.seek(index)
+                        decoded = np.asarray(animation.convert('RGB'), dtype=int)
+                        self.assertLess(np.abs(decoded - image).mean(), 2)
+
+    def test_frames_streamed_in_order(self):
+        heatmap, datetimes = create_heatmap(8)
+        received = []
+
+        self.assertEqual(8, heatmap._render_frames(datetimes, lambda date_time, image: received.append(date_time)))
+
+        self.assertEqual(datetimes, received)
+        self.assertEqual({'fetch', 'render'}, set(heatmap.memory.report()))
+        heatmap.executor.shutdown()
+
+    def test_memory_budget_limits_renders_in_flight(self):
+        heatmap, datetimes = create_heatmap(8, memory_budget_mb=1, persist=True)
+        heatmap._PERSIST_BATCH = 3
+        stored = []
+        heatmap.dataprovider.store_frames.side_effect = lambda heatmap_type, frames: stored.append(sorted(frames))
+        received = []
+
+        heatmap._render_frames(datetimes, lambda date_time, image: received.append(int(image[0, 0, 0])))
+
+        # process is always above 1MB, so frames are rendered one by one
+        self.assertEqual(1, heatmap.heatmap_creator.max_running)
+        self.assertEqual(list(range(8)), received)
+        self.assertEqual([3, 3, 2], [len(batch) for batch in stored])
+        self.assertEqual(datetimes, [date_time for batch in stored for date_time in batch])
+        heatmap.executor.shutdown()
+
+        heatmap, datetimes = create_heatmap(8)
+        heatmap._generate_frames_by_datetimes(datetimes)
+        self.assertGreater(heatmap.heatmap_creator.max_running, 1)
+        heatmap.executor.shutdown()
+
+    def test_buffered_frames_limit_renders_in_flight(self):
+        heatmap, datetimes = create_heatmap(10, memory_budget_mb=1024 ** 2)
+        # the first frame renders long, later ones are buffered until it is done
+        delays = iter([0.3] + [0.01] * 9)
+        generate_image = heatmap.heatmap_creator.generate_image
+        heatmap.heatmap_creator.generate_image = lambda **kwargs: (time.sleep(next(delays)), generate_image(**kwargs))[1]
+        buffered = []
+        add = FrameSequence.add
+
+        def record(sequence, date_time, image):
+            add(sequence, date_time, image)
+            buffered.append(sequence.buffered)
+
+        with mock.patch.object(FrameSequence, 'add', record):
+            self.assertEqual(10, heatmap._render_frames(datetimes, lambda date_time, image: None))
+        heatmap.executor.shutdown()
+
+        # rendering and buffered frames together stay within 2 * max_workers
+        self.assertLessEqual(max(buffered), 2 * heatmap.max_workers - 1)
+
+    def test_gios_frames_rendered_without_configured_range(self):
+        heatmap, datetimes = create_heatmap(2)
+        lons, lats, names = synthetic_stations(30)
+        heatmap.dataprovider.provide_stations_by_datetimes.return_value = [
+            (date_time, [StationValue(lon, lat, float(index % 6), name)
+                         for index, (lon, lat, name) in enumerate(zip(lons, lats, names))])
+            for date_time in datetimes]
+        heatmap.heatmap_type = 'gios_pm10'
+        heatmap.heatmap_creator = GiosIndexCreator('PM 10')
+        heatmap.heatmap_creator._geometry = synthetic_geometry()
+        heatmap.heatmap_creator.grid_size = 100
+        received = []
+
+        heatmap._render_frames(datetimes, lambda date_time, image: received.append(image))
+        heatmap.executor.shutdown()
+
+        # index range of the creator is used
+        self.assertEqual(2, len(received))
+        self.assertTrue(all(image is not None and image.ndim == 3 for image in received))
+
+    def test_memory_tracker(self):
+        tracker = MemoryTracker()
+        tracing = tracemalloc.is_tracing()
+        start_tracing()
+        try:
+            with tracker.stage('render'):
+                buffer = bytearray(8 * 1024 ** 2)
+                del buffer
+        finally:
+            if not tracing:
+                tracemalloc.stop()
+        with tracker.stage('encode'):
+            pass
+
+        report = tracker.report()
+        self.assertGreater(report['render']['rss_peak'], 0)
+        self.assertGreaterEqual(report['render']['traced_peak'], 8 * 1024 ** 2)
+        self.assertIsNone(report['encode']['traced_peak'])
+
+
+if __name__ == '__main__':
+    unittest.main()
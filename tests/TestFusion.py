@@ -0,0 +1,154 @@
+###
+# SolarMeteo    : https://github.com/pa810p/solarmeteo
+# Author        : Pawel Prokop
+# License       : GNU GENERAL PUBLIC LICENSE v3
+###
+
+import os
+import tempfile
+import unittest
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from solarmeteo.heatmap.data_provider import FusionProvider
+from solarmeteo.heatmap.heatmap import ProviderFactory
+from solarmeteo.heatmap.spatial_binning import deduplicate
+from solarmeteo.heatmap.station_geometry import ProjectionCache, project
+from solarmeteo.model import Base, EsaStation, EsaStationData, GiosStation, GiosStationData, Parameter
+from solarmeteo.model.database import dispose_engines
+from solarmeteo.model.observed_datetime import observe_datetimes, SOURCE_IMGW, SOURCE_ESA, SOURCE_GIOS
+from solarmeteo.model.station import Station
+from solarmeteo.model.station_data import StationData
+
+T = datetime(2025, 4, 1, 12)
+
+
+class TestFusion(unittest.TestCase):
+
+    def setUp(self):
+        self.db_dir = tempfile.mkdtemp()
+        self.db_url = 'sqlite:///' + os.path.join(self.db_dir, 'meteo.db')
+        self.engine = create_engine(self.db_url)
+        Station.metadata.create_all(self.engine)
+        StationData.metadata.create_all(self.engine)
+        Base.metadata.create_all(self.engine)
+
+        with Session(self.engine) as session:
+            balice = Station('Kraków-Balice', 12566, lon=19.80, lat=50.08)
+            session.add(balice)
+            session.flush()
+            session.add(StationData(balice.id, T, 10.0, 2, 180, 60.0, 0.0, 1010.0))
+
+            # one sensor next to IMGW station, one far away
+            next_to_balice = EsaStation(name='Balice', city='Balice', longitude=19.803, latitude=50.081)
+            zakopane = EsaStation(name='Zakopane', city='Zakopane', longitude=19.95, latitude=49.30)
+            session.add_all([next_to_balice, zakopane])
+            session.flush()
+            session.add_all([
+                EsaStationData(esa_station_id=next_to_balice.id, humidity=50, pressure=1000, temperature=14.0,
+                               pm10=30.0, pm25=20.0, datetime=datetime(2025, 4, 1, 12, 10)),
+                EsaStationData(esa_station_id=zakopane.id, humidity=80, pressure=900, temperature=4.0,
+                               pm10=60.0, pm25=40.0, datetime=datetime(2025, 4, 1, 12, 20)),
+            ])
+
+            pm10 = Parameter(name='pm10')
+            gios = GiosStation('Kraków, Balice', 400, longitude=19.801, latitude=50.079)
+            session.add_all([pm10, gios])
+            session.flush()
+            session.add(GiosStationData(gios.id, T, pm10.id, 1))
+
+            observe_datetimes(session, SOURCE_IMGW, [T])
+            observe_datetimes(session, SOURCE_ESA, [datetime(2025, 4, 1, 12, 20)])
+            observe_datetimes(session, SOURCE_GIOS, [T])
+            session.commit()
+
+    def tearDown(self):
+        self.engine.dispose()
+        dispose_engines()
+        os.remove(os.path.join(self.db_dir, 'meteo.db'))
+        os.rmdir(self.db_dir)
+
+    def test_deduplicate(self):
+        # given: a chain of two close points, a lone point
+        x = np.array([0.0, 400.0, 10000.0])
+        y = np.zeros(3)
+
+        kept, values, weights = deduplicate(x, y, [10.0, 16.0, 5.0], [1.0, 0.5, 0.5], 1000.0)
+
+        self.assertEqual([0, 2], list(kept))
+        np.testing.assert_allclose([12.0, 5.0], values)
+        np.testing.assert_allclose([1.5, 0.5], weights)
+
+    def test_deduplicate_different_sources_only(self):
+        # given: two close sensors of one source, an IMGW station close to the second one
+        x = np.array([0.0, 400.0, 1200.0])
+        y = np.zeros(3)
+
+        kept, values, weights = deduplicate(x, y, [10.0, 16.0, 4.0], [0.5, 0.5, 1.0], 1000.0,
+                                            ['esa', 'esa', 'imgw'])
+
+        self.assertEqual([0, 2], list(kept))
+        np.testing.assert_allclose([10.0, 8.0], values)
+        np.testing.assert_allclose([0.5, 1.5], weights)
+
+    def test_projection_cache(self):
+        cache = ProjectionCache()
+
+        x, y = cache.project([19.8, 21.0, 19.8], [50.0, 52.2, 50.0])
+
+        self.assertEqual(2, len(cache))
+        expected_x, expected_y = project([19.8, 21.0, 19.8], [50.0, 52.2, 50.0])
+        np.testing.assert_allclose(expected_x, x)
+        np.testing.assert_allclose(expected_y, y)
+
+    def test_fused_temperature(self):
+        provider = ProviderFactory.provider('fused_temperature', self.db_url, 1, esa_grid_km=0)
+
+        self.assertIsInstance(provider, FusionProvider)
+        self.assertEqual([T], provider.get_last_datetimes(1))
+
+        [(displaydate, stations)] = provider.provide_stations_by_datetimes(provider.get_last_datetimes(1))
+
+        self.assertEqual(T, displaydate)
+        by_name = {s.name: s for s in stations}
+        self.assertEqual({'Kraków-Balice', 'Zakopane'}, set(by_name))
+        # IMGW station and ESA sensor weighted 1.0 and 0.5, at position of IMGW station
+        self.assertAlmostEqual((10.0 + 14.0 * 0.5) / 1.5, by_name['Kraków-Balice'].value)
+        self.assertEqual((19.80, 50.08), (by_name['Kraków-Balice'].lon, by_name['Kraków-Balice'].lat))
+        self.assertEqual(4.0, by_name['Zakopane'].value)
+
+    def test_fused_pm10(self):
+        provider = FusionProvider(self.db_url, 1, 'pm10', esa_grid_km=0)
+
+        points = provider.provide_points_by_datetimes(provider.get_last_datetimes(1))[T]
+
+        # measured ESA value outweighs midpoint of GIOS index 1 (35 µg/m³), at position of the ESA sensor
+        by_name = dict(zip(points.names, zip(points.values, points.weights)))
+        self.assertAlmostEqual((30.0 * 0.5 + 35.0 * 0.2) / 0.7, by_name['Balice'][0])
+        self.assertAlmostEqual(0.7, by_name['Balice'][1])
+        self.assertEqual((60.0, 0.5), by_name['Zakopane'])
+
+    def test_fused_pm10_with_custom_weights(self):
+        provider = FusionProvider(self.db_url, 1, 'pm10', weights={SOURCE_ESA: 1.0, SOURCE_GIOS: 1.0}, esa_grid_km=0)
+
+        points = provider.provide_points_by_datetimes(provider.get_last_datetimes(1))[T]
+
+        # GIOS index 1 is fused as 35 µg/m³, equal weights
+        by_name = dict(zip(points.names, zip(points.values, points.weights)))
+        self.assertEqual({'Balice', 'Zakopane'}, set(by_name))
+        self.assertAlmostEqual((30.0 + 35.0) / 2, by_name['Balice'][0])
+        self.assertEqual(2.0, by_name['Balice'][1])
+        self.assertEqual((60.0, 1.0), by_name['Zakopane'])
+
+    def test_no_datetimes(self):
+        provider = FusionProvider(self.db_url, 1, 'humidity')
+
+        self.assertEqual([], provider.provide_stations_by_datetimes([]))
+        self.assertRaises(ValueError, FusionProvider, self.db_url, 1, 'wind_speed')
+
+
+if __name__ == '__main__':
+    unittest.main()
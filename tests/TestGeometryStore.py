@@ -0,0 +1,134 @@
+###
+# SolarMeteo    : https://github.com/pa810p/solarmeteo
+# Author        : Pawel Prokop
+# License       : GNU GENERAL PUBLIC LICENSE v3
+###
+
+import os
+import pickle
+import tempfile
+import unittest
+from unittest import mock
+
+import geopandas as gpd
+import numpy as np
+import shapely
+from shapely.geometry import Polygon, box
+
+from solarmeteo.benchmark.synthetic import POLAND_OUTLINE
+from solarmeteo.heatmap import geometry_store
+from solarmeteo.heatmap.geometry_store import load_poland_geometry, cache_path, from_geodataframe
+from solarmeteo.heatmap.heatmap_creator import TemperatureCreator
+
+
+def write_voivodeships(path, split_lon=19.5):
+    # detailed borders as of the source GeoJSON
+    outline = shapely.segmentize(Polygon(POLAND_OUTLINE), 0.001)
+    regions = [outline.intersection(box(14, 49, split_lon, 55)), outline.intersection(box(split_lon, 49, 25, 55))]
+    gpd.GeoDataFrame({'nazwa': ['west', 'east']}, geometry=regions, crs='EPSG:4326').to_file(path, driver='GeoJSON')
+
+
+class TestGeometryStore(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'wojewodztwa.geojson')
+        write_voivodeships(self.path)
+
+    def tearDown(self):
+        geometry_store._geometries.clear()
+        self.directory.cleanup()
+
+    def test_cache(self):
+        geometry = load_poland_geometry(self.path)
+
+        self.assertTrue(os.path.exists(cache_path(self.path)))
+        self.assertIs(geometry, load_poland_geometry(self.path))
+        self.assertEqual(2, len(geometry.voivodeships))
+        # union is projected to meters
+        self.assertAlmostEqual(Polygon(POLAND_OUTLINE).area, sum(region.area for region in geometry.voivodeships),
+                               places=6)
+        self.assertGreater(geometry.projected.area, 2e11)
+
+        geometry_store._geometries.clear()
+        with mock.patch('geopandas.read_file') as read_file:
+            cached = load_poland_geometry(self.path)
+        read_file.assert_not_called()
+        self.assertTrue(cached.projected.equals(geometry.projected))
+        self.assertEqual(len(geometry.boundaries), len(cached.boundaries))
+        for line, cached_line in zip(geometry.boundaries, cached.boundaries):
+            np.testing.assert_array_equal(line, cached_line)
+        for level, boundaries in geometry.levels.items():
+            self.assertEqual(sum(map(len, boundaries)), sum(map(len, cached.levels[level])))
+
+    def test_changed_source(self):
+        first = cache_path(self.path)
+        load_poland_geometry(self.path)
+
+        geometry_store._geometries.clear()
+        write_voivodeships(self.path, split_lon=20.5)
+        geometry = load_poland_geometry(self.path)
+
+        self.assertNotEqual(first, cache_path(self.path))
+        self.assertAlmostEqual(20.5, geometry.voivodeships[0].bounds[2])
+
+    def test_download(self):
+        missing = os.path.join(self.directory.name, 'data', 'missing.geojson')
+        with open(self.path, 'rb') as file:
+            response = mock.Mock(content=file.read())
+
+        with mock.patch('requests.get', return_value=response) as get:
+            geometry = load_poland_geometry(missing)
+
+        get.assert_called_once_with(geometry_store.GEOJSON_URL)
+        self.assertTrue(os.path.exists(cache_path(missing)))
+        self.assertEqual(2, len(geometry.voivodeships))
+
+    def test_levels_of_detail(self):
+        geometry = load_poland_geometry(self.path)
+
+        self.assertEqual('thumbnail', geometry.level_of_detail(250))
+        self.assertEqual('default', geometry.level_of_detail(500))
+        self.assertEqual('high', geometry.level_of_detail(1500))
+        self.assertIsNone(geometry.level_of_detail(5000))
+
+        vertices = [sum(map(len, geometry.boundaries_for(height))) for height in (250, 500, 1500, 5000)]
+        self.assertEqual(sorted(vertices), vertices)
+        self.assertLess(vertices[1] * 10, vertices[3])
+
+    def test_mask(self):
+        geometry = load_poland_geometry(self.path)
+        creator = TemperatureCreator()
+        creator._geometry = geometry
+        xx, yy = creator.interpolation_grid()
+
+        mask = creator.mask(xx, yy)
+
+        exact = shapely.contains_xy(geometry.projected.buffer(1000), xx, yy)
+        # borders are simplified to half of a grid cell
+        self.assertLess(np.count_nonzero(mask != exact), 0.001 * mask.size)
+        self.assertIs(mask, creator.mask(xx, yy))
+        self.assertFalse(mask.flags.writeable)
+
+    def test_synthetic_geometry_pickled_whole(self):
+        geometry = from_geodataframe(gpd.read_file(self.path))
+
+        unpickled = pickle.loads(pickle.dumps(geometry))
+
+        self.assertTrue(unpickled.projected.equals(geometry.projected))
+        self.assertEqual(geometry.levels.keys(), unpickled.levels.keys())
+
+    def test_shared_by_creators(self):
+        creators = [TemperatureCreator(), TemperatureCreator()]
+        for creator in creators:
+            creator._GEOJSON_LOCAL = self.path
+
+        self.assertIs(creators[0].geometry, creators[1].geometry)
+        # render workers receive a reference to the source, not the geometry
+        pickled = pickle.dumps(creators[0])
+        self.assertLess(len(pickled), 1000)
+        self.assertIs(creators[0].geometry, pickle.loads(pickled).geometry)
+
+
+if __name__ == '__main__':
+    unittest.main()
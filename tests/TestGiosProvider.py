@@ -0,0 +1,120 @@
+###
+# SolarMeteo    : https://github.com/pa810p/solarmeteo
+# Author        : Pawel Prokop
+# License       : GNU GENERAL PUBLIC LICENSE v3
+###
+
+import os
+import tempfile
+import unittest
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import create_engine, update
+from sqlalchemy.orm import Session
+
+from solarmeteo.heatmap.data_provider import GiosProvider, GIOS_PARAMETERS
+from solarmeteo.heatmap.heatmap import ProviderFactory
+from solarmeteo.model import Base, GiosStation, GiosStationData, Parameter
+from solarmeteo.model.database import dispose_engines
+from solarmeteo.model.observed_datetime import observe_datetimes, SOURCE_GIOS
+
+T1 = datetime(2025, 3, 1, 10)
+T2 = datetime(2025, 3, 1, 11)
+
+
+class TestGiosProvider(unittest.TestCase):
+
+    def setUp(self):
+        self.db_dir = tempfile.mkdtemp()
+        self.db_url = 'sqlite:///' + os.path.join(self.db_dir, 'meteo.db')
+        self.engine = create_engine(self.db_url)
+        Base.metadata.create_all(self.engine)
+
+        with Session(self.engine) as session:
+            parameters = {name: Parameter(name=name) for name in GIOS_PARAMETERS}
+            krakow = GiosStation('Kraków, Aleja Krasińskiego', 400, longitude=19.926, latitude=50.058)
+            warszawa = GiosStation('Warszawa, Marszałkowska', 500, longitude=21.012, latitude=52.226)
+            unknown = GiosStation('Unknown position', 600)
+            session.add_all(list(parameters.values()) + [krakow, warszawa, unknown])
+            session.flush()
+            self.station_ids = (krakow.id, warszawa.id, unknown.id)
+
+            measurements = [
+                (krakow, T1, 'pm10', 3), (krakow, T1, 'no2', 1), (krakow, T1, 'o3', 0),
+                (warszawa, T1, 'pm10', 1),
+                (krakow, T2, 'pm10', 4), (krakow, T2, 'so2', 0),
+                # index could not be computed
+                (warszawa, T2, 'pm10', -1), (warszawa, T2, 'pm25', 2),
+                (unknown, T2, 'pm10', 5),
+            ]
+            session.add_all(GiosStationData(station.id, measured, parameters[name].id, value)
+                            for station, measured, name, value in measurements)
+            observe_datetimes(session, SOURCE_GIOS, [T1, T2])
+            session.commit()
+
+    def tearDown(self):
+        self.engine.dispose()
+        dispose_engines()
+        os.remove(os.path.join(self.db_dir, 'meteo.db'))
+        os.rmdir(self.db_dir)
+
+    def test_columns_are_pivoted(self):
+        krakow, warszawa, unknown = self.station_ids
+
+        columns = GiosProvider(self.db_url).provide_columns([T1, T2])
+
+        self.assertEqual([T2, T2, T2, T1, T1], list(columns.datetimes))
+        self.assertEqual([krakow, warszawa, unknown, krakow, warszawa], list(columns.station_ids))
+        np.testing.assert_array_equal([4, np.nan, 5, 3, 1], columns.values['pm10'])
+        np.testing.assert_array_equal([np.nan, 2, np.nan, np.nan, np.nan], columns.values['pm25'])
+        np.testing.assert_array_equal([np.nan, np.nan, np.nan, 1, np.nan], columns.values['no2'])
+        np.testing.assert_array_equal([np.nan, np.nan, np.nan, 0, np.nan], columns.values['o3'])
+        np.testing.assert_array_equal([0, np.nan, np.nan, np.nan, np.nan], columns.values['so2'])
+
+    def test_empty_columns(self):
+        columns = GiosProvider(self.db_url).provide_columns([datetime(2020, 1, 1)])
+
+        self.assertEqual(0, len(columns.datetimes))
+        self.assertEqual(set(GIOS_PARAMETERS), set(columns.values))
+
+    def test_stations_by_datetimes(self):
+        provider = GiosProvider(self.db_url, parameter='pm10')
+
+        stations = provider.provide_stations_by_datetimes(provider.get_last_datetimes(2))
+
+        self.assertEqual([T2, T1], [displaydate for displaydate, _ in stations])
+        # only stations with known position and valid index
+        self.assertEqual([('Kraków, Aleja Krasińskiego', 4.0)], [(s.name, s.value) for s in stations[0][1]])
+        self.assertEqual({('Kraków, Aleja Krasińskiego', 19.926, 50.058, 3.0),
+                          ('Warszawa, Marszałkowska', 21.012, 52.226, 1.0)},
+                         {(s.name, s.lon, s.lat, s.value) for s in stations[1][1]})
+
+    def test_station_coordinates_cached(self):
+        provider = GiosProvider(self.db_url, parameter='pm10')
+        provider.provide_stations_by_datetimes([T1])
+
+        with Session(self.engine) as session:
+            session.execute(update(GiosStation).values(longitude=0.0))
+            session.commit()
+
+        # cached coordinates are used as long as all stations are known
+        lons, _, _ = provider.station_coordinates(list(self.station_ids[:2]))
+        np.testing.assert_array_equal([19.926, 21.012], lons)
+
+        # an unknown station reloads them
+        lons, _, _ = provider.station_coordinates([self.station_ids[0], 9999])
+        np.testing.assert_array_equal([0.0, np.nan], lons)
+
+    def test_factory(self):
+        provider = ProviderFactory.provider('gios_no2', self.db_url, 3)
+
+        self.assertIsInstance(provider, GiosProvider)
+        self.assertEqual('no2', provider.parameter)
+        self.assertEqual('gios_no2', provider.heatmap)
+        self.assertEqual(3, provider.last)
+        self.assertRaises(ValueError, GiosProvider, self.db_url, 1, 'co')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+###
+# SolarMeteo    : https://github.com/pa810p/solarmeteo
+# Author        : Pawel Prokop
+# License       : GNU GENERAL PUBLIC LICENSE v3
+###
+
+import configparser
+import time
+import unittest
+
+import numpy as np
+
+from solarmeteo.benchmark.pipeline import benchmark_creator
+from solarmeteo.benchmark.synthetic import synthetic_stations
+from solarmeteo.heatmap.heatmap import HeatMap
+from solarmeteo.heatmap.heatmap_creator import DEFAULT_GRID_SIZE
+from solarmeteo.solarmeteo import _load_heatmap_grid_sizes
+from tests.TestFrameStreaming import create_heatmap
+
+
+class TestGridResolution(unittest.TestCase):
+
+    def test_grid_sizes(self):
+        config = configparser.ConfigParser()
+        config.read_string("[heatmap]\ngrid_size = 400\ngif_grid_size = 250\nprecipitation_grid_size = 600\n"
+                           "gios_pm10_grid_size = 150\nfused_humidity_grid_size = 300\npreview_grid_size = 100\n")
+        grid_sizes = _load_heatmap_grid_sizes(config)
+
+        self.assertEqual({'default': 400, 'gif': 250, 'precipitation': 600, 'gios_pm10': 150, 'fused_humidity': 300},
+                         grid_sizes)
+        self.assertEqual(150, HeatMap.grid_size(grid_sizes, 'gios_pm10', 'gif'))
+        self.assertEqual(300, HeatMap.grid_size(grid_sizes, 'fused_humidity', 'png'))
+        self.assertEqual(400, HeatMap.grid_size(grid_sizes, 'temperature', 'png'))
+        self.assertEqual(250, HeatMap.grid_size(grid_sizes, 'fused_temperature', 'gif'))
+        # heatmap type overrides format
+        self.assertEqual(600, HeatMap.grid_size(grid_sizes, 'precipitation', 'gif'))
+        self.assertEqual(DEFAULT_GRID_SIZE, HeatMap.grid_size({}, 'temperature', 'png'))
+        self.assertEqual({}, _load_heatmap_grid_sizes(configparser.ConfigParser()))
+
+    def test_preview_interpolation(self):
+        lons, lats, _ = synthetic_stations(60)
+        full = benchmark_creator(grid_size=200)
+        preview = benchmark_creator(grid_size=200, preview_grid_size=40)
+        x, y = full.project_stations(lons, lats)
+        values = (lons - 14) / 10 + np.sin(lats)
+        xx, yy = full.interpolation_grid()
+
+        started = time.perf_counter()
+        expected = full.interpolate(x, y, values, xx, yy)
+        full_seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        upsampled = preview.interpolate(x, y, values, xx, yy)
+        preview_seconds = time.perf_counter() - started
+
+        self.assertEqual(xx.shape, upsampled.shape)
+        mask = full.mask(xx, yy)
+        self.assertLess(np.abs(upsampled - expected)[mask].mean(), 0.01)
+        # corners of the coarse grid are kept
+        self.assertAlmostEqual(expected[0, 0], upsampled[0, 0])
+        self.assertAlmostEqual(expected[-1, -1], upsampled[-1, -1])
+        self.assertLess(preview_seconds, full_seconds)
+
+    def test_preview_frames_not_persisted(self):
+        heatmap, datetimes = create_heatmap(3, persist=True)
+        heatmap.preview = True
+        received = []
+
+        heatmap._render_frames(datetimes, lambda date_time, image: received.append(date_time))
+
+        self.assertEqual(datetimes, received)
+        heatmap.dataprovider.store_frames.assert_not_called()
+        heatmap.executor.shutdown()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -8,6 +8,7 @@ from solarmeteo.heatmap.heatmap_creator import (
     PM10Creator,
     PM25Creator,
 )
+from solarmeteo.heatmap.station_geometry import project
 
 
 class TestHeatmapCreators(unittest.TestCase):
@@ -79,6 +80,17 @@ class TestHeatmapCreators(unittest.TestCase):
             vmax=40,
         )
 
+    def test_project_stations_shares_cached_transformer(self):
+        creator = self._create_creator(WindCreator)
+
+        with mock.patch('geopandas.GeoDataFrame') as geodataframe:
+            x, y = creator.project_stations([19.9, 21.0], [50.0, 52.2])
+
+        geodataframe.assert_not_called()
+        expected_x, expected_y = project([19.9, 21.0], [50.0, 52.2])
+        self.assertEqual(expected_x.tolist(), x.tolist())
+        self.assertEqual(expected_y.tolist(), y.tolist())
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,101 @@
+###
+# SolarMeteo    : https://github.com/pa810p/solarmeteo
+# Author        : Pawel Prokop
+# License       : GNU GENERAL PUBLIC LICENSE v3
+###
+
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from solarmeteo.updater.http_client import HttpClient
+from solarmeteo.updater.updater import Updater
+
+URL = 'https://danepubliczne.imgw.pl/api/data/synop'
+
+
+def create_response(status_code=200, content=b'[]', headers=None):
+    response = mock.Mock()
+    response.status_code = status_code
+    response.content = content
+    response.headers = headers or {}
+    response.json.return_value = json.loads(content) if content else None
+    return response
+
+
+class TestHttpClient(unittest.TestCase):
+
+    def setUp(self):
+        self.client = HttpClient(pool_size=4)
+        self.client.session = mock.Mock()
+
+    def test_session_requests_compression(self):
+        client = HttpClient(gzip=True)
+        self.assertEqual('gzip, deflate', client.session.headers['Accept-Encoding'])
+        client.close()
+
+    def test_unconditional_get_sends_no_validators(self):
+        self.client.session.get.return_value = create_response(headers={'ETag': '"abc"'})
+
+        self.client.get(URL)
+        self.client.confirm(URL)
+
+        self.assertEqual({}, self.client.session.get.call_args.kwargs['headers'])
+        self.assertNotIn(URL, self.client.validators)
+
+    def test_conditional_get_sends_confirmed_validators(self):
+        self.client.session.get.return_value = create_response(
+            headers={'ETag': '"abc"', 'Last-Modified': 'Wed, 21 Oct 2025 07:28:00 GMT'})
+        self.client.get(URL, conditional=True)
+
+        # not confirmed yet, validators are not used
+        self.client.get(URL, conditional=True)
+        self.assertEqual({}, self.client.session.get.call_args.kwargs['headers'])
+
+        self.client.confirm(URL)
+        self.client.session.get.return_value = create_response(status_code=304, content=b'')
+        self.assertIsNone(self.client.get(URL, conditional=True))
+        self.assertEqual({'If-None-Match': '"abc"', 'If-Modified-Since': 'Wed, 21 Oct 2025 07:28:00 GMT'},
+                         self.client.session.get.call_args.kwargs['headers'])
+
+    def test_conditional_get_detects_same_content(self):
+        self.client.session.get.return_value = create_response(content=b'[{"id_stacji": "12295"}]')
+        self.assertIsNotNone(self.client.get(URL, conditional=True))
+        self.client.confirm(URL)
+
+        self.assertIsNone(self.client.get(URL, conditional=True))
+
+        self.client.session.get.return_value = create_response(content=b'[{"id_stacji": "12375"}]')
+        self.assertIsNotNone(self.client.get(URL, conditional=True))
+
+    def test_validators_are_persisted(self):
+        with tempfile.TemporaryDirectory() as directory:
+            validators_file = os.path.join(directory, 'validators.json')
+            client = HttpClient(validators_file=validators_file)
+            client.session = mock.Mock()
+            client.session.get.return_value = create_response(headers={'ETag': '"abc"'})
+
+            client.get(URL, conditional=True)
+            client.confirm(URL)
+
+            self.assertEqual('"abc"', HttpClient(validators_file=validators_file).validators[URL]['etag'])
+
+    def test_updater_get_returns_none_when_not_modified(self):
+        self.client.session.get.return_value = create_response(status_code=304, content=b'')
+        updater = Updater('sqlite://', 0, http_client=self.client)
+
+        self.assertIsNone(updater.get(URL, conditional=True))
+        self.assertIsNone(updater.get_stream(URL, conditional=True))
+
+    def test_updater_get_raises_on_error(self):
+        self.client.session.get.return_value = create_response(status_code=500, content=b'')
+        updater = Updater('sqlite://', 0, http_client=self.client)
+
+        with self.assertRaises(Exception):
+            updater.get(URL)
+
+
+if __name__ == '__main__':
+    unittest.main()
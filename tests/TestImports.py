@@ -0,0 +1,34 @@
+###
+# SolarMeteo    : https://github.com/pa810p/solarmeteo
+# Author        : Pawel Prokop
+# License       : GNU GENERAL PUBLIC LICENSE v3
+###
+
+import unittest
+
+from solarmeteo.benchmark.baseline import compare
+from solarmeteo.benchmark.imports import cold_import, heavy_modules, run_import_benchmark, ENTRY_POINT, IMPORT_PATHS
+
+
+class TestImports(unittest.TestCase):
+
+    def test_update_paths_are_lightweight(self):
+        for path in ('imgw', 'solar', 'gios', 'esa'):
+            with self.subTest(path=path):
+                loaded = cold_import((ENTRY_POINT, *IMPORT_PATHS[path]))['modules']
+                self.assertEqual([], heavy_modules(loaded))
+                self.assertNotIn('solarmeteo.heatmap.heatmap', loaded)
+
+    def test_import_benchmark(self):
+        result = run_import_benchmark(('gios', 'heatmap'), repeat=1)
+
+        gios, heatmap = result['results']['import-gios'], result['results']['import-heatmap']
+        self.assertEqual([], gios['heavy'])
+        self.assertIn('matplotlib', heatmap['heavy'])
+        self.assertNotIn('astropy', heatmap['heavy'])
+        self.assertGreater(heatmap['stages']['import'], gios['stages']['import'])
+        self.assertEqual([], compare(result, result))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+###
+# SolarMeteo    : https://github.com/pa810p/solarmeteo
+# Author        : Pawel Prokop
+# License       : GNU GENERAL PUBLIC LICENSE v3
+###
+
+import json
+import os
+import tempfile
+import unittest
+
+from solarmeteo.updater import json_stream
+
+
+def split_bytes(document, size):
+    data = document.encode('utf-8')
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+class TestJsonStream(unittest.TestCase):
+
+    SMOG = {
+        "smog_data": [
+            {"school": {"name": "Szkoła Podstawowa nr 1", "city": "Kraków"}, "data": {"pm10_avg": 12.5},
+             "timestamp": "2025-07-10 10:00:00"},
+            {"school": {"name": "Zespół Szkół", "city": "Łódź"}, "data": {"pm10_avg": 1234},
+             "timestamp": "2025-07-10 10:05:00"},
+        ]
+    }
+
+    def test_iter_json_array_with_key(self):
+        document = json.dumps(self.SMOG, ensure_ascii=False)
+
+        for size in (1, 3, 7, 64, len(document)):
+            items = list(json_stream.iter_json_array(split_bytes(document, size), key="smog_data"))
+            self.assertEqual(self.SMOG["smog_data"], items)
+
+    def test_iter_json_array_top_level(self):
+        document = json.dumps([1, 22, 333, {"a": [1, 2]}, "x,y]"])
+
+        for size in (1, 2, 5, len(document)):
+            items = list(json_stream.iter_json_array(split_bytes(document, size)))
+            self.assertEqual([1, 22, 333, {"a": [1, 2]}, "x,y]"], items)
+
+    def test_iter_json_array_empty(self):
+        self.assertEqual([], list(json_stream.iter_json_array([b'{"smog_data": [ ]}'], key="smog_data")))
+
+    def test_iter_json_array_missing_key(self):
+        with self.assertRaises(ValueError):
+            list(json_stream.iter_json_array([b'{"other": []}'], key="smog_data"))
+
+    def test_iter_json_array_truncated(self):
+        with self.assertRaises(ValueError):
+            list(json_stream.iter_json_array([b'[{"a": 1}, {"b"']))
+
+    def test_chunked(self):
+        self.assertEqual([[0, 1, 2], [3, 4, 5], [6]], list(json_stream.chunked(range(7), 3)))
+
+    def test_prefetch_preserves_order(self):
+        self.assertEqual(list(range(100)), list(json_stream.prefetch(iter(range(100)), depth=2)))
+
+    def test_prefetch_propagates_exception(self):
+        def failing():
+            yield 1
+            raise RuntimeError('broken download')
+
+        with self.assertRaises(RuntimeError):
+            list(json_stream.prefetch(failing()))
+
+    def test_read_file(self):
+        document = json.dumps(self.SMOG, ensure_ascii=False)
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False, encoding='utf-8') as f:
+            f.write(document)
+        try:
+            items = list(json_stream.iter_json_array(json_stream.read_file(f.name, read_size=5), key="smog_data"))
+        finally:
+            os.remove(f.name)
+
+        self.assertEqual(self.SMOG["smog_data"], items)
+
+
+if __name__ == '__main__':
+    unittest.main()
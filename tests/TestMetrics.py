@@ -0,0 +1,113 @@
+###
+# SolarMeteo    : https://github.com/pa810p/solarmeteo
+# Author        : Pawel Prokop
+# License       : GNU GENERAL PUBLIC LICENSE v3
+###
+
+import json
+import os
+import tempfile
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+from unittest import mock
+
+from solarmeteo.metrics import metrics
+from solarmeteo.updater.http_client import HttpClient
+from solarmeteo.updater.meteo_updater import MeteoUpdater
+
+
+def _frame(name):
+    with metrics.timer('heatmap.render'):
+        metrics.count('heatmap.rendered')
+    return name
+
+
+class TestMetrics(unittest.TestCase):
+
+    def tearDown(self):
+        metrics.disable()
+
+    def test_disabled_records_nothing(self):
+        with metrics.timer('imgw.download'):
+            metrics.count('imgw.records', 10)
+
+        self.assertFalse(metrics.enabled())
+        self.assertIsNone(metrics.snapshot())
+        # timers of a disabled registry are shared, nothing is allocated per stage
+        self.assertIs(metrics.timer('a'), metrics.timer('b'))
+
+    def test_timers_and_counters(self):
+        metrics.enable()
+        for _ in range(3):
+            with metrics.timer('imgw.ingest'):
+                pass
+        metrics.count('imgw.records', 5)
+        metrics.count('imgw.records', 7)
+
+        with self.assertRaises(ValueError):
+            with metrics.timer('imgw.download'):
+                raise ValueError()
+
+        snapshot = metrics.snapshot()
+        calls, total, maximum = snapshot['timers']['imgw.ingest']
+        self.assertEqual(3, calls)
+        self.assertLessEqual(maximum, total)
+        self.assertEqual(1, snapshot['timers']['imgw.download'][0])
+        self.assertEqual({'imgw.records': 12}, snapshot['counters'])
+
+    def test_worker_metrics_merged(self):
+        metrics.enable()
+        metrics.count('heatmap.rendered')
+        with ProcessPoolExecutor(max_workers=2) as executor:
+            futures = [executor.submit(metrics.collected, _frame, metrics.enabled(), name) for name in 'abc']
+            for future in futures:
+                _, worker_metrics = future.result()
+                metrics.merge(worker_metrics)
+
+        snapshot = metrics.snapshot()
+        self.assertEqual(4, snapshot['counters']['heatmap.rendered'])
+        self.assertEqual(3, snapshot['timers']['heatmap.render'][0])
+
+        self.assertEqual(('a', None), metrics.collected(_frame, False, 'a'))
+
+    def test_export(self):
+        metrics.enable()
+        with metrics.timer('query.imgw'):
+            pass
+        metrics.count('qc.rejected_spatial', 2)
+
+        with tempfile.TemporaryDirectory() as directory:
+            prometheus_file = os.path.join(directory, 'textfile', 'solarmeteo.prom')
+            summary_file = os.path.join(directory, 'metrics.json')
+            metrics.export(prometheus_file, summary_file)
+
+            with open(prometheus_file, encoding='utf-8') as file:
+                text = file.read()
+            with open(summary_file, encoding='utf-8') as file:
+                summary = json.load(file)
+            self.assertEqual(['metrics.json', 'textfile'], sorted(os.listdir(directory)))
+
+        self.assertIn('solarmeteo_stage_calls_total{stage="query.imgw"} 1\n', text)
+        self.assertIn('# TYPE solarmeteo_stage_seconds_max gauge\n', text)
+        self.assertIn('solarmeteo_events_total{name="qc.rejected_spatial"} 2\n', text)
+        self.assertEqual(1, summary['timers']['query.imgw']['count'])
+        self.assertEqual({'qc.rejected_spatial': 2}, summary['counters'])
+
+    def test_updater_download(self):
+        metrics.enable()
+        http_client = HttpClient()
+        http_client.get = mock.Mock(return_value=None)
+        updater = MeteoUpdater(meteo_db_url='sqlite://', meteo_data_url='http://localhost', updater_interval=0,
+                               updater_update_station_coordinates=False,
+                               updater_update_station_coordinates_file=None, http_client=http_client)
+
+        self.assertIsNone(updater.get('http://localhost', conditional=True))
+
+        snapshot = metrics.snapshot()
+        self.assertEqual(1, snapshot['timers']['imgw.download'][0])
+        self.assertEqual({'imgw.not_modified': 1}, snapshot['counters'])
+        http_client.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+###
+# SolarMeteo    : https://github.com/pa810p/solarmeteo
+# Author        : Pawel Prokop
+# License       : GNU GENERAL PUBLIC LICENSE v3
+###
+
+import os
+import tempfile
+import unittest
+from datetime import datetime
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+
+from solarmeteo.heatmap.data_provider import TemperatureProvider, PM10Provider
+from solarmeteo.model import Base
+from solarmeteo.model.database import dispose_engines
+from solarmeteo.model.observed_datetime import ObservedDatetime, observe_datetimes, SOURCE_ESA, SOURCE_IMGW
+from solarmeteo.model.station import Station
+from solarmeteo.model.station_data import StationData
+from solarmeteo.updater.meteo_updater import MeteoUpdater
+
+
+class TestObservedDatetime(unittest.TestCase):
+
+    def setUp(self):
+        self.db_dir = tempfile.mkdtemp()
+        self.db_url = 'sqlite:///' + os.path.join(self.db_dir, 'meteo.db')
+        self.engine = create_engine(self.db_url)
+        Station.metadata.create_all(self.engine)
+        StationData.metadata.create_all(self.engine)
+        Base.metadata.create_all(self.engine)
+
+    def tearDown(self):
+        self.engine.dispose()
+        dispose_engines()
+        os.remove(os.path.join(self.db_dir, 'meteo.db'))
+        os.rmdir(self.db_dir)
+
+    def test_observe_datetimes(self):
+        # when
+        with Session(self.engine) as session:
+            observe_datetimes(session, SOURCE_ESA, ['2025-07-10 12:00:00', '2025-07-10T13:00:00+02:00'])
+            observe_datetimes(session, SOURCE_ESA, [datetime(2025, 7, 10, 12), None])
+            observe_datetimes(session, SOURCE_IMGW, [datetime(2025, 7, 10, 12)])
+            session.commit()
+
+        # then
+        with Session(self.engine) as session:
+            rows = session.execute(select(ObservedDatetime.source, ObservedDatetime.datetime)).all()
+        self.assertEqual({(SOURCE_ESA, datetime(2025, 7, 10, 12)), (SOURCE_ESA, datetime(2025, 7, 10, 13)),
+                          (SOURCE_IMGW, datetime(2025, 7, 10, 12))}, set(rows))
+
+    def test_last_datetimes_of_updated_stations(self):
+        # given
+        updater = MeteoUpdater(meteo_db_url=self.db_url, meteo_data_url=None, updater_interval=None,
+                               updater_update_station_coordinates=False,
+                               updater_update_station_coordinates_file=None)
+        stations = [
+            {'id_stacji': imgw_id, 'stacja': f'Station {imgw_id}', 'data_pomiaru': '2025-06-23',
+             'godzina_pomiaru': hour, 'temperatura': '15.1', 'predkosc_wiatru': '1', 'kierunek_wiatru': '320',
+             'wilgotnosc_wzgledna': '58.4', 'suma_opadu': '0', 'cisnienie': '1017.2'}
+            for hour in ('6', '8', '7') for imgw_id in ('12295', '12600')
+        ]
+        with Session(self.engine) as session:
+            updater.update_stations(session, stations, None)
+            observe_datetimes(session, SOURCE_ESA, [datetime(2025, 6, 23, 9)])
+            session.commit()
+
+        # when
+        last = TemperatureProvider(self.db_url).get_last_datetimes(2)
+
+        # then
+        self.assertEqual([datetime(2025, 6, 23, 8), datetime(2025, 6, 23, 7)], last)
+        self.assertEqual([datetime(2025, 6, 23, 9)], PM10Provider(self.db_url).get_last_datetimes(1))
+
+
+if __name__ == '__main__':
+    unittest.main()
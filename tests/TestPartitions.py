@@ -0,0 +1,46 @@
+###
+# SolarMeteo    : https://github.com/pa810p/solarmeteo
+# Author        : Pawel Prokop
+# License       : GNU GENERAL PUBLIC LICENSE v3
+###
+
+import unittest
+from datetime import datetime
+
+from sqlalchemy import create_engine, inspect
+
+from solarmeteo.model.partitions import add_months, month_start, partition_name, partition_month, \
+    ensure_partitions, is_partitioned, apply_retention
+
+
+class TestPartitions(unittest.TestCase):
+
+    def test_months(self):
+        self.assertEqual(datetime(2025, 6, 1), month_start(datetime(2025, 6, 23, 8)))
+        self.assertEqual(datetime(2026, 1, 1), add_months(datetime(2025, 12, 1), 1))
+        self.assertEqual(datetime(2024, 11, 1), add_months(datetime(2025, 1, 1), -2))
+        self.assertEqual(datetime(2027, 1, 1), add_months(datetime(2025, 1, 1), 24))
+
+    def test_partition_name(self):
+        name = partition_name('station_data', datetime(2025, 6, 1))
+
+        self.assertEqual('station_data_y2025m06', name)
+        self.assertEqual(datetime(2025, 6, 1), partition_month(name))
+        self.assertIsNone(partition_month('station_data_default'))
+
+    def test_not_partitioned_database(self):
+        # given
+        engine = create_engine('sqlite://')
+
+        # when
+        ensure_partitions(engine, 'station_data', [datetime(2025, 6, 23, 8), '2025-07-10 12:00:00'])
+        result = apply_retention(engine, datetime(2025, 1, 1))
+
+        # then
+        self.assertFalse(is_partitioned(engine, 'station_data'))
+        self.assertEqual({}, result)
+        self.assertEqual([], inspect(engine).get_table_names())
+
+
+if __name__ == '__main__':
+    unittest.main()
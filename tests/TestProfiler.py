@@ -0,0 +1,81 @@
+###
+# SolarMeteo    : https://github.com/pa810p/solarmeteo
+# Author        : Pawel Prokop
+# License       : GNU GENERAL PUBLIC LICENSE v3
+###
+
+import os
+import tempfile
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from solarmeteo.metrics import metrics, profiler
+
+
+def _interpolate(n):
+    return sum(i * i for i in range(n))
+
+
+def _render(n):
+    return _interpolate(n) + _interpolate(n // 2)
+
+
+class TestProfiler(unittest.TestCase):
+
+    def test_profile_tag(self):
+        self.assertEqual('render-temperature-2025-01-02_13_00_00',
+                         profiler.profile_tag('render', 'temperature', datetime(2025, 1, 2, 13)))
+
+    def test_not_profiled_without_directory(self):
+        self.assertEqual(_render(10), profiler.profiled(None, 'render', _render, 10))
+
+    def test_profile_and_collapsed_stacks(self):
+        with tempfile.TemporaryDirectory() as directory:
+            self.assertEqual(_render(200000), profiler.profiled(directory, 'render', _render, 200000))
+
+            self.assertEqual(['render.collapsed', 'render.prof'], sorted(os.listdir(directory)))
+            with open(os.path.join(directory, 'render.collapsed'), encoding='utf-8') as file:
+                stacks = dict(line.rsplit(' ', 1) for line in file.read().splitlines())
+
+        interpolate = [stack for stack in stacks if stack.split(';')[-1].startswith('TestProfiler.py:<genexpr>')]
+        self.assertTrue(interpolate)
+        for stack in interpolate:
+            frames = stack.split(';')
+            self.assertTrue(frames[0].startswith('TestProfiler.py:_render'))
+            self.assertTrue(frames[1].startswith('TestProfiler.py:_interpolate'))
+        self.assertTrue(all(int(value) > 0 for value in stacks.values()))
+
+    def test_render_workers(self):
+        with tempfile.TemporaryDirectory() as directory:
+            run = profiler.run_directory(directory, datetime(2026, 1, 1, 12))
+            with ProcessPoolExecutor(max_workers=2) as executor:
+                futures = [executor.submit(metrics.collected, profiler.profiled, False, run,
+                                           profiler.profile_tag('render', 'temperature', hour), _render, 1000)
+                           for hour in range(3)]
+                self.assertEqual([(_render(1000), None)] * 3, [future.result() for future in futures])
+            profiler.write_summary(run)
+
+            self.assertEqual(os.path.join(directory, '20260101-120000'), run)
+            files = sorted(os.listdir(run))
+        self.assertEqual(7, len(files))
+        self.assertIn('render-temperature-2.prof', files)
+        self.assertIn('summary.txt', files)
+
+    def test_summary_refreshed(self):
+        with tempfile.TemporaryDirectory() as directory:
+            profiler.profiled(directory, profiler.profile_tag('job', 'imgw', 1), _render, 1000)
+            profiler.write_summary(directory)
+            # the daemon refreshes the summary after every job
+            profiler.profiled(directory, profiler.profile_tag('job', 'esa', 2), _render, 1000)
+            profiler.write_summary(directory)
+
+            with open(os.path.join(directory, 'summary.txt'), encoding='utf-8') as file:
+                self.assertEqual('2 profiles', file.readline().strip())
+            # profiles and the summary are written aside and renamed
+            self.assertEqual(['job-esa-2.collapsed', 'job-esa-2.prof', 'job-imgw-1.collapsed', 'job-imgw-1.prof',
+                              'summary.txt'], sorted(os.listdir(directory)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,161 @@
+###
+# SolarMeteo    : https://github.com/pa810p/solarmeteo
+# Author        : Pawel Prokop
+# License       : GNU GENERAL PUBLIC LICENSE v3
+###
+
+import time
+import unittest
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from solarmeteo.heatmap.data_provider import StationValue
+from solarmeteo.heatmap.quality_control import QualityControl, quality_control, REASON_SPATIAL, REASON_HISTORY
+
+
+def grid_stations(values):
+    """ stations on a regular grid of about 10 km over southern Poland """
+    side = int(np.ceil(np.sqrt(len(values))))
+    return [StationValue(lon=19.0 + (i % side) * 0.14, lat=50.0 + (i // side) * 0.09, value=value, name=f'S{i}')
+            for i, value in enumerate(values)]
+
+
+class TestQualityControl(unittest.TestCase):
+
+    def test_spatial_outlier_rejected(self):
+        # given: smooth field with one broken sensor
+        values = [20.0 + (i % 5) * 0.3 for i in range(25)]
+        values[12] = 90.0
+        qc = QualityControl(neighbours=8, threshold=3.5)
+
+        # when
+        accepted, report = qc.filter(datetime(2026, 5, 1, 12), grid_stations(values))
+
+        # then
+        self.assertEqual(24, len(accepted))
+        self.assertNotIn('S12', [s.name for s in accepted])
+        self.assertEqual([('S12', 90.0, REASON_SPATIAL)], report.rejected)
+        self.assertEqual(25, report.checked)
+        self.assertEqual({'checked': 25, 'rejected_spatial': 1, 'rejected_history': 0}, qc.stats())
+
+    def test_too_few_stations_kept(self):
+        qc = QualityControl()
+
+        accepted, report = qc.filter(datetime(2026, 5, 1, 12), grid_stations([10.0, 80.0]))
+
+        self.assertEqual(2, len(accepted))
+        self.assertEqual([], report.rejected)
+
+    def test_history_outlier_rejected(self):
+        # given: S4 is a station constantly 6 degrees colder than its surroundings
+        qc = QualityControl(neighbours=8, threshold=3.5, history_length=4, min_history=3)
+        start = datetime(2026, 5, 1, 0)
+        frames = []
+        for hour in range(6):
+            values = [10.0 + hour * 0.1] * 9
+            values[4] -= 6.0
+            frames.append((start + timedelta(hours=hour), values))
+        # a front warms the whole area up
+        frames[4] = (frames[4][0], [value + 5.0 for value in frames[4][1]])
+        # S2 jumps, although within the range of values in the frame
+        frames[5][1][2] = 4.0
+
+        # when: frames come newest first as from provider
+        provided = [(displaydate, grid_stations(values)) for displaydate, values in reversed(frames)]
+        filtered, reports = qc.filter_frames(provided)
+
+        # then: order of frames is kept, reports follow time
+        self.assertEqual([d for d, _ in provided], [d for d, _ in filtered])
+        self.assertEqual([d for d, _ in frames], [r.displaydate for r in reports])
+        # offset never accepted does not become normal of the station
+        for report in reports[:5]:
+            self.assertEqual([('S4', report.rejected[0][1], REASON_SPATIAL)], report.rejected)
+        self.assertEqual([('S2', 4.0, REASON_HISTORY), ('S4', 4.5, REASON_SPATIAL)], reports[5].rejected)
+        self.assertEqual(1, reports[5].count(REASON_HISTORY))
+        self.assertEqual(7, len(filtered[0][1]))
+        self.assertEqual({'checked': 54, 'rejected_spatial': 6, 'rejected_history': 1}, qc.stats())
+
+    def test_known_offset_accepted(self):
+        # given: S4 is a mountain station 6 degrees colder, accepted while its neighbours differ a lot
+        qc = QualityControl(neighbours=8, threshold=3.5, history_length=4, min_history=3)
+        start = datetime(2026, 5, 1, 0)
+        noisy = [6.0, 14.0, 8.0, 12.0, 4.0, 12.0, 8.0, 14.0, 6.0]
+        calm = [10.0] * 9
+        calm[4] = 4.0
+        frames = [(start + timedelta(hours=hour), grid_stations(noisy)) for hour in range(3)]
+        frames.append((start + timedelta(hours=3), grid_stations(calm)))
+
+        _, reports = qc.filter_frames(frames)
+
+        # then: in a calm frame the offset deviates from neighbours, but is usual for the station
+        self.assertEqual([[], [], [], []], [report.rejected for report in reports])
+
+    def test_frames_checked_again_remembered_once(self):
+        # given: frames checked and then checked again as by regenerate()
+        qc = QualityControl(neighbours=8, threshold=3.5, history_length=6, min_history=3)
+        start = datetime(2026, 5, 1, 0)
+        frames = [(start + timedelta(hours=hour), grid_stations([10.0 + hour, 11.0, 9.0, 10.5, 4.0, 9.5, 10.0, 11.0,
+                                                                  9.0]))
+                  for hour in range(3)]
+
+        _, first = qc.filter_frames(frames)
+        _, second = qc.filter_frames(frames)
+
+        # then: every frame is remembered once, a frame is not scored against itself
+        key = QualityControl.station_key(frames[0][1][1])
+        self.assertEqual(len(frames), len(qc._history[key]))
+        self.assertEqual([r.rejected for r in first], [r.rejected for r in second])
+
+    def test_stuck_sensor_rejected(self):
+        # given: S12 is stuck at 900 among readings of about 20
+        qc = QualityControl(neighbours=8, threshold=3.5, history_length=6, min_history=3)
+        rng = np.random.default_rng(3)
+        start = datetime(2026, 5, 1, 0)
+        frames = []
+        for hour in range(8):
+            values = list(rng.normal(20, 3, 25))
+            values[12] = 900.0
+            frames.append((start + timedelta(hours=hour), grid_stations(values)))
+
+        filtered, reports = qc.filter_frames(frames)
+
+        # then: rejected in every frame, not only until it has history
+        for report in reports:
+            self.assertIn(('S12', 900.0, REASON_SPATIAL), report.rejected)
+        for _, stations in filtered:
+            self.assertNotIn('S12', [s.name for s in stations])
+
+    def test_process_wide_instance_per_type(self):
+        self.assertIs(quality_control('test_type'), quality_control('test_type'))
+        self.assertIsNot(quality_control('test_type'), quality_control('other_test_type'))
+
+    def test_process_wide_instance_per_settings(self):
+        strict = quality_control('settings_type', neighbours=4, threshold=2.0)
+
+        self.assertIs(strict, quality_control('settings_type', neighbours=4, threshold=2.0))
+        self.assertEqual((8, 3.5), (quality_control('settings_type').neighbours,
+                                    quality_control('settings_type').threshold))
+        self.assertEqual((4, 2.0), (strict.neighbours, strict.threshold))
+
+    def test_thousands_of_points_fast(self):
+        rng = np.random.default_rng(7)
+        count = 5000
+        stations = [StationValue(lon=lon, lat=lat, value=value, name=str(i)) for i, (lon, lat, value) in
+                    enumerate(zip(rng.uniform(14.5, 24, count), rng.uniform(49, 54.8, count),
+                                  rng.normal(20, 1, count)))]
+        stations[0].value = 200.0
+        qc = QualityControl()
+        qc.filter(datetime(2026, 5, 1, 11), stations)
+
+        started = time.perf_counter()
+        accepted, report = qc.filter(datetime(2026, 5, 1, 12), stations)
+        elapsed = time.perf_counter() - started
+
+        self.assertIn(('0', 200.0, REASON_SPATIAL), report.rejected)
+        self.assertGreater(len(accepted), count * 0.95)
+        self.assertLess(elapsed, 1.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,147 @@
+###
+# SolarMeteo    : https://github.com/pa810p/solarmeteo
+# Author        : Pawel Prokop
+# License       : GNU GENERAL PUBLIC LICENSE v3
+###
+
+import json
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import Session
+
+from solarmeteo.model import Base
+from solarmeteo.model.station import Station
+from solarmeteo.model.station_data import StationData
+from solarmeteo.replay.recorder import Recorder, replay_key, replay_url, load_index
+from solarmeteo.replay.server import ReplayServer, scale_payload
+from solarmeteo.updater.http_client import HttpClient
+from solarmeteo.updater.meteo_updater import MeteoUpdater
+
+IMGW_URL = 'https://danepubliczne.imgw.pl/api/data/synop'
+ESA_URL = 'https://public-esa.ose.gov.pl/api/v1/smog'
+GIOS_URL = 'https://api.gios.gov.pl/pjp-api/v1/rest/aqindex/getIndex/114'
+SOLAR_URL = 'https://monitoringapi.solaredge.com/site/1/overview?api_key=secret'
+
+with open(os.path.join(os.path.dirname(__file__), 'resources', 'station1.json'), encoding='utf-8') as _file:
+    STATION = json.load(_file)
+
+
+def imgw_feed():
+    return [STATION, dict(STATION, id_stacji='12375', stacja='Warszawa')]
+
+
+def esa_feed():
+    return {'smog_data': [{'school': {'name': 'SP 1', 'city': 'Kraków', 'longitude': '19.9', 'latitude': '50.0'},
+                           'data': {'pm10_avg': 20.5}, 'timestamp': '2025-01-01T12:00:00'}]}
+
+
+def create_response(document, headers=None):
+    response = mock.Mock()
+    response.status_code = 200
+    response.content = json.dumps(document).encode('utf-8')
+    response.headers = headers or {'Content-Type': 'application/json'}
+    return response
+
+
+class TestReplay(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        recorder = Recorder(self.directory.name)
+        recorder.record(IMGW_URL, create_response(imgw_feed(), {'Content-Type': 'application/json', 'ETag': '"v1"'}))
+        recorder.record(ESA_URL, create_response(esa_feed()))
+        recorder.record(GIOS_URL, create_response({'AqIndex': {'Identyfikator stacji pomiarowej': 114}}))
+        recorder.record(SOLAR_URL, create_response({'overview': {}}))
+        self.http = HttpClient()
+
+    def tearDown(self):
+        self.http.close()
+        self.directory.cleanup()
+
+    def test_replay_key(self):
+        self.assertEqual('/monitoringapi.solaredge.com/site/1/overview', replay_key(SOLAR_URL))
+        self.assertEqual('/api.gios.gov.pl/station/findAll?page=0&size=300',
+                         replay_key('https://api.gios.gov.pl/station/findAll?page=0&size=300'))
+        self.assertEqual('http://localhost:8000/danepubliczne.imgw.pl/api/data/synop',
+                         replay_url('http://localhost:8000/', IMGW_URL))
+
+    def test_recorder(self):
+        client = HttpClient(recorder=Recorder(self.directory.name))
+        client.session = mock.Mock()
+        client.session.get.return_value = create_response([STATION])
+
+        client.get('https://danepubliczne.imgw.pl/api/data/synop/id/12295')
+
+        index = load_index(self.directory.name)
+        self.assertEqual(5, len(index))
+        entry = index['/danepubliczne.imgw.pl/api/data/synop/id/12295']
+        self.assertEqual({'Content-Type': 'application/json'}, entry['headers'])
+        with open(os.path.join(self.directory.name, entry['file']), encoding='utf-8') as file:
+            self.assertEqual([STATION], json.load(file))
+        # secrets are not stored
+        self.assertFalse(any('secret' in key for key in index))
+
+    def test_replay(self):
+        with ReplayServer(self.directory.name) as server:
+            self.assertEqual(imgw_feed(), self.http.get(replay_url(server.url, IMGW_URL)).json())
+            self.assertEqual({'overview': {}}, self.http.get(replay_url(server.url, SOLAR_URL)).json())
+
+            # conditional requests are answered by 304 once confirmed
+            self.assertIsNotNone(self.http.get(replay_url(server.url, IMGW_URL), conditional=True))
+            self.http.confirm(replay_url(server.url, IMGW_URL))
+            self.assertIsNone(self.http.get(replay_url(server.url, IMGW_URL), conditional=True))
+
+            self.assertEqual(404, self.http.get(replay_url(server.url, 'https://api.gios.gov.pl/unknown')).status_code)
+            self.assertEqual(5, server.requests)
+
+    def test_latency_and_errors(self):
+        with ReplayServer(self.directory.name, latency_ms=100, error_rate=1.0) as server:
+            started = time.perf_counter()
+            response = self.http.get(replay_url(server.url, IMGW_URL))
+
+            self.assertGreaterEqual(time.perf_counter() - started, 0.1)
+            self.assertEqual(503, response.status_code)
+            self.assertEqual(1, server.errors)
+
+    def test_scaling(self):
+        scaled = json.loads(scale_payload(json.dumps(esa_feed()).encode('utf-8'), 3))['smog_data']
+        self.assertEqual(['SP 1', 'SP 1 #1', 'SP 1 #2'], [record['school']['name'] for record in scaled])
+        self.assertEqual(3, len({record['school']['longitude'] for record in scaled}))
+
+        with ReplayServer(self.directory.name, scale={'api.gios.gov.pl': 2, 'danepubliczne.imgw.pl': 5}) as server:
+            stations = self.http.get(replay_url(server.url, IMGW_URL)).json()
+            # index of a copy of a station is served by the original station
+            gios_copy = GIOS_URL.replace('/114', '/1000114')
+            index = self.http.get(replay_url(server.url, gios_copy)).json()
+
+        self.assertEqual(10, len(stations))
+        self.assertEqual(10, len({station['id_stacji'] for station in stations}))
+        self.assertEqual('2012295', stations[4]['id_stacji'])
+        self.assertEqual({'AqIndex': {'Identyfikator stacji pomiarowej': 114}}, index)
+
+    def test_ingest_from_replay_server(self):
+        db_url = 'sqlite:///' + os.path.join(self.directory.name, 'meteo.db')
+        engine = create_engine(db_url)
+        Station.metadata.create_all(engine)
+        StationData.metadata.create_all(engine)
+        Base.metadata.create_all(engine)
+
+        with ReplayServer(self.directory.name, scale={'danepubliczne.imgw.pl': 20}) as server:
+            updater = MeteoUpdater(meteo_db_url=db_url, meteo_data_url=replay_url(server.url, IMGW_URL),
+                                   updater_interval=None, updater_update_station_coordinates=False,
+                                   updater_update_station_coordinates_file=None, http_client=self.http)
+            changes = updater.update()
+
+        with Session(engine) as session:
+            self.assertEqual(40, session.scalar(select(func.count()).select_from(StationData)))
+        self.assertEqual(1, len(changes))
+        engine.dispose()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+###
+# SolarMeteo    : https://github.com/pa810p/solarmeteo
+# Author        : Pawel Prokop
+# License       : GNU GENERAL PUBLIC LICENSE v3
+###
+
+import os
+import tempfile
+import unittest
+from datetime import datetime
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+from solarmeteo.heatmap.data_provider import RollupProvider
+from solarmeteo.model import Base, EsaStation
+from solarmeteo.model.database import dispose_engines
+from solarmeteo.model.observed_datetime import SOURCE_ESA, SOURCE_IMGW
+from solarmeteo.model.rollup import add_to_rollups, bucket_start
+from solarmeteo.model.station import Station
+from solarmeteo.model.station_data import StationData
+from solarmeteo.updater.meteo_updater import MeteoUpdater
+
+
+def station_json(imgw_id, date, hour, temperature):
+    return {
+        'id_stacji': imgw_id, 'stacja': f'Station {imgw_id}', 'data_pomiaru': date, 'godzina_pomiaru': hour,
+        'temperatura': temperature, 'predkosc_wiatru': '1', 'kierunek_wiatru': '320', 'wilgotnosc_wzgledna': '58.4',
+        'suma_opadu': '0', 'cisnienie': '1017.2',
+    }
+
+
+class TestRollup(unittest.TestCase):
+
+    def setUp(self):
+        self.db_dir = tempfile.mkdtemp()
+        self.db_url = 'sqlite:///' + os.path.join(self.db_dir, 'meteo.db')
+        self.engine = create_engine(self.db_url)
+        Station.metadata.create_all(self.engine)
+        StationData.metadata.create_all(self.engine)
+        Base.metadata.create_all(self.engine)
+        with self.engine.begin() as connection:
+            connection.execute(text('CREATE UNIQUE INDEX station_data_uq ON station_data (station_id, datetime)'))
+
+        self.updater = MeteoUpdater(meteo_db_url=self.db_url, meteo_data_url=None, updater_interval=None,
+                                    updater_update_station_coordinates=False,
+                                    updater_update_station_coordinates_file=None)
+
+    def tearDown(self):
+        self.engine.dispose()
+        dispose_engines()
+        os.remove(os.path.join(self.db_dir, 'meteo.db'))
+        os.rmdir(self.db_dir)
+
+    def test_bucket_start(self):
+        value = datetime(2025, 6, 23, 8, 45, 12)
+
+        self.assertEqual(datetime(2025, 6, 23, 8), bucket_start(value, 'hour'))
+        self.assertEqual(datetime(2025, 6, 23), bucket_start(value, 'day'))
+        self.assertEqual(datetime(2025, 6, 1), bucket_start(value, 'month'))
+        self.assertEqual(datetime(2025, 1, 1), bucket_start(value, 'year'))
+        with self.assertRaises(ValueError):
+            bucket_start(value, 'week')
+
+    def test_select_resolution(self):
+        imgw = RollupProvider(self.db_url, SOURCE_IMGW)
+        esa = RollupProvider(self.db_url, SOURCE_ESA)
+        year = (datetime(2025, 1, 1), datetime(2026, 1, 1))
+
+        self.assertEqual('month', imgw.select_resolution('year', *year))
+        self.assertEqual('month', imgw.select_resolution('month', *year))
+        self.assertEqual('day', imgw.select_resolution('day', *year))
+        self.assertEqual('day', imgw.select_resolution('month', datetime(2025, 1, 15), datetime(2025, 3, 1)))
+        self.assertEqual('hour', esa.select_resolution('day', datetime(2025, 1, 1, 6), datetime(2025, 1, 2)))
+        with self.assertRaises(ValueError):
+            imgw.select_resolution('hour', *year)
+
+    def test_rollups_maintained_by_updater(self):
+        # given
+        stations = [
+            station_json('12295', '2025-06-22', '20', '15.0'),
+            station_json('12295', '2025-06-23', '6', '11.0'),
+            station_json('12295', '2025-06-23', '8', '17.0'),
+            station_json('12600', '2025-06-23', '8', '20.0'),
+        ]
+        with Session(self.engine) as session:
+            self.updater.update_stations(session, stations, None)
+            # duplicates are rejected and must not be counted again
+            self.updater.update_stations(session, stations[1:2], None)
+            first, second = [station.id for station in session.query(Station).order_by(Station.imgw_id)]
+
+        provider = RollupProvider(self.db_url, SOURCE_IMGW)
+
+        # when
+        daily = provider.provide_rollups('temperature', 'day', datetime(2025, 6, 1), datetime(2025, 7, 1))
+        monthly = provider.provide_rollups('temperature', 'month', datetime(2025, 6, 1), datetime(2025, 7, 1),
+                                           station_ids=[first])
+
+        # then
+        self.assertEqual([(datetime(2025, 6, 22), first, 1, 15.0, 15.0, 15.0),
+                          (datetime(2025, 6, 23), first, 2, 14.0, 11.0, 17.0),
+                          (datetime(2025, 6, 23), second, 1, 20.0, 20.0, 20.0)],
+                         [(v.bucket, v.key, v.count, v.mean, v.min, v.max) for v in daily])
+        self.assertEqual([(datetime(2025, 6, 1), first, 3, 43.0 / 3, 11.0, 17.0)],
+                         [(v.bucket, v.key, v.count, v.mean, v.min, v.max) for v in monthly])
+
+    def test_esa_rollups_by_city(self):
+        # given
+        with Session(self.engine) as session:
+            session.add_all([
+                EsaStation(name='school 1', street=None, post_code=None, city='Kraków', longitude=19.9, latitude=50.0),
+                EsaStation(name='school 2', street=None, post_code=None, city='Kraków', longitude=19.95, latitude=50.1),
+                EsaStation(name='school 3', street=None, post_code=None, city='Zakopane', longitude=19.9, latitude=49.3),
+            ])
+            session.commit()
+            ids = {station.name: station.id for station in session.query(EsaStation)}
+            add_to_rollups(session, SOURCE_ESA, ids['school 1'], '2025-01-01 10:00:00', {'pm10': 40.0})
+            add_to_rollups(session, SOURCE_ESA, ids['school 2'], '2025-01-01 11:00:00', {'pm10': 60.0})
+            add_to_rollups(session, SOURCE_ESA, ids['school 3'], '2025-01-02 10:00:00', {'pm10': 20.0, 'pm25': None})
+            session.commit()
+
+        # when
+        values = RollupProvider(self.db_url, SOURCE_ESA).provide_rollups(
+            'pm10', 'year', datetime(2025, 1, 1), datetime(2026, 1, 1), by_city=True)
+
+        # then
+        self.assertEqual([(datetime(2025, 1, 1), 'Kraków', 2, 50.0, 40.0, 60.0),
+                          (datetime(2025, 1, 1), 'Zakopane', 1, 20.0, 20.0, 20.0)],
+                         [(v.bucket, v.key, v.count, v.mean, v.min, v.max) for v in values])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+###
+# SolarMeteo    : https://github.com/pa810p/solarmeteo
+# Author        : Pawel Prokop
+# License       : GNU GENERAL PUBLIC LICENSE v3
+###
+
+import json
+import os
+import tempfile
+import threading
+import unittest
+
+from solarmeteo.scheduler.scheduler import Scheduler
+
+
+class TestScheduler(unittest.TestCase):
+
+    def test_run_job_records_status(self):
+        scheduler = Scheduler()
+        calls = []
+        job = scheduler.add_job('imgw', 3600, lambda: calls.append(1))
+
+        scheduler.run_job(job)
+
+        status = scheduler.status()['imgw']
+        self.assertEqual([1], calls)
+        self.assertEqual(1, status['runs'])
+        self.assertEqual(0, status['failures'])
+        self.assertFalse(status['running'])
+        self.assertIsNotNone(status['last_start'])
+        self.assertIsNotNone(status['last_duration'])
+        self.assertIsNone(status['last_error'])
+
+    def test_run_job_records_failure(self):
+        scheduler = Scheduler()
+
+        def failing():
+            raise RuntimeError('imgw unavailable')
+
+        job = scheduler.add_job('imgw', 3600, failing)
+        scheduler.run_job(job)
+
+        status = scheduler.status()['imgw']
+        self.assertEqual(1, status['failures'])
+        self.assertEqual('imgw unavailable', status['last_error'])
+
+    def test_duplicate_job(self):
+        scheduler = Scheduler()
+        scheduler.add_job('esa', 60, lambda: None)
+
+        with self.assertRaises(ValueError):
+            scheduler.add_job('esa', 60, lambda: None)
+
+    def test_jobs_run_concurrently_and_write_status(self):
+        with tempfile.TemporaryDirectory() as directory:
+            status_file = os.path.join(directory, 'status.json')
+            scheduler = Scheduler(status_file=status_file)
+            barrier = threading.Barrier(2, timeout=5)
+
+            # each job waits for the other one, which succeeds only if they run at the same time
+            scheduler.add_job('solar', 3600, barrier.wait)
+            scheduler.add_job('esa', 3600, barrier.wait)
+
+            scheduler.start()
+            try:
+                for job in scheduler.jobs.values():
+                    for _ in range(500):
+                        if job.runs:
+                            break
+                        threading.Event().wait(0.01)
+            finally:
+                scheduler.stop(timeout=5)
+
+            status = scheduler.status()
+            self.assertEqual(0, status['solar']['failures'])
+            self.assertEqual(0, status['esa']['failures'])
+            with open(status_file) as f:
+                self.assertEqual({'solar', 'esa'}, set(json.load(f)['jobs'].keys()))
+
+
+if __name__ == '__main__':
+    unittest.main()
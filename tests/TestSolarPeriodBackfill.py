@@ -0,0 +1,106 @@
+###
+# SolarMeteo    : https://github.com/pa810p/solarmeteo
+# Author        : Pawel Prokop
+# License       : GNU GENERAL PUBLIC LICENSE v3
+###
+
+import json
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+
+from solarmeteo.model.database import dispose_engines
+from solarmeteo.model.solar_data import SolarData
+from solarmeteo.updater.solar_updater import SolarUpdater
+
+
+def energy_values(from_date, to_date, power):
+    values = []
+    current = from_date
+    while current < to_date + timedelta(days=1):
+        values.append({'date': current.strftime('%Y-%m-%d %H:%M:%S'), 'value': power})
+        current += timedelta(hours=6)
+    values.append({'date': to_date.strftime('%Y-%m-%d 23:45:00'), 'value': None})
+    return {'energy': {'timeUnit': 'QUARTER_OF_AN_HOUR', 'unit': 'Wh', 'values': values}}
+
+
+class TestSolarPeriodBackfill(unittest.TestCase):
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.db_file = os.path.join(self.work_dir, 'meteo.db')
+        self.checkpoint_file = os.path.join(self.work_dir, 'checkpoint.json')
+        self.engine = create_engine('sqlite:///' + self.db_file)
+        SolarData.metadata.create_all(self.engine)
+
+        self.updater = SolarUpdater(meteo_db_url='sqlite:///' + self.db_file, data_url=None, updater_interval=None,
+                                    site_id='1234', solar_key=None, lon=None, lat=None, height=None,
+                                    backfill_checkpoint_file=self.checkpoint_file)
+        self.downloads = []
+
+    def tearDown(self):
+        self.engine.dispose()
+        dispose_engines()
+        for file in os.listdir(self.work_dir):
+            os.remove(os.path.join(self.work_dir, file))
+        os.rmdir(self.work_dir)
+
+    def download(self, power):
+        def download_datetime_period(from_date, to_date):
+            self.downloads.append((from_date, to_date))
+            return energy_values(from_date, to_date, power)
+        return download_datetime_period
+
+    def stored_power(self):
+        with Session(self.engine) as session:
+            return {row.datetime: row.power for row in session.execute(select(SolarData)).scalars()}
+
+    def test_split_period(self):
+        windows = SolarUpdater.split_period(datetime(2019, 1, 15), datetime(2019, 3, 3))
+
+        self.assertEqual([
+            (datetime(2019, 1, 15), datetime(2019, 1, 31)),
+            (datetime(2019, 2, 1), datetime(2019, 2, 28)),
+            (datetime(2019, 3, 1), datetime(2019, 3, 3)),
+        ], windows)
+
+    def test_update_datetime_period_inserts_and_updates(self):
+        # given
+        self.updater.download_datetime_period = self.download(100.0)
+        self.updater.update_datetime_period('2019-01-15:2019-03-03')
+        first = self.stored_power()
+
+        # when
+        self.updater.download_datetime_period = self.download(200.0)
+        merged = self.updater.update_datetime_period('2019-01-15:2019-03-03')
+
+        # then
+        second = self.stored_power()
+        self.assertEqual(len(first), merged)
+        self.assertEqual(set(first.keys()), set(second.keys()))
+        self.assertTrue(all(power == 200.0 for power in second.values()))
+        self.assertEqual(6, len(self.downloads))
+        # checkpoint of completed period is removed
+        with open(self.checkpoint_file) as f:
+            self.assertEqual({}, json.load(f))
+
+    def test_update_datetime_period_resumes_from_checkpoint(self):
+        # given
+        with open(self.checkpoint_file, 'w') as f:
+            json.dump({'1234 2019-01-15:2019-03-03': ['2019-01-15:2019-01-31', '2019-02-01:2019-02-28']}, f)
+        self.updater.download_datetime_period = self.download(100.0)
+
+        # when
+        self.updater.update_datetime_period('2019-01-15:2019-03-03')
+
+        # then
+        self.assertEqual([(datetime(2019, 3, 1), datetime(2019, 3, 3))], self.downloads)
+        self.assertTrue(all(d >= datetime(2019, 3, 1) for d in self.stored_power()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -6,8 +6,7 @@
 
 import unittest
 
-from datetime import datetime
-from mockito import when, eq
+from mockito import when
 
 import json
 
@@ -55,9 +54,8 @@ class TestSolarUpdater(unittest.TestCase):
     def test_update_datetime_period_valid(self):
         json_period_data = self.load_energy_data(self.testconfig.SOLARMETEO_ROOT + '/tests/resources/energy2019-06_quoter.json')
 
-        when(self.updater).download_datetime_period(eq(datetime.strptime('1979-01-09', '%Y-%m-%d')),
-                                                    eq(datetime.strptime('1989-01-09','%Y-%m-%d')))\
-            .thenReturn(json_period_data)
+        # period is downloaded in month long windows
+        when(self.updater).download_datetime_period(...).thenReturn(json_period_data)
         period = '1979-01-09:1989-01-09'
         self.updater.update_datetime_period(period)
 
@@ -0,0 +1,89 @@
+###
+# SolarMeteo    : https://github.com/pa810p/solarmeteo
+# Author        : Pawel Prokop
+# License       : GNU GENERAL PUBLIC LICENSE v3
+###
+
+import unittest
+
+import numpy as np
+from mockito import spy2, verify, unstub
+
+from solarmeteo.heatmap import spatial_binning
+from solarmeteo.heatmap.spatial_binning import GridBinner
+from solarmeteo.heatmap.station_geometry import project, unproject
+
+
+class TestSpatialBinning(unittest.TestCase):
+
+    def tearDown(self):
+        unstub()
+
+    def test_project_roundtrip(self):
+        x, y = project([19.94, 21.01], [50.06, 52.23])
+        lons, lats = unproject(x, y)
+
+        np.testing.assert_allclose([19.94, 21.01], lons, atol=1e-9)
+        np.testing.assert_allclose([50.06, 52.23], lats, atol=1e-9)
+        # Kraków - Warszawa is about 250 km
+        self.assertAlmostEqual(252, np.hypot(x[1] - x[0], y[1] - y[0]) / 1000, delta=5)
+
+    def test_dense_sensors_binned_with_median(self):
+        # given: ten sensors within a few hundred meters, one of them broken, and one sensor far away
+        binner = GridBinner(cell_km=5)
+        ids = list(range(11))
+        lons = [19.9400 + i * 0.0005 for i in range(10)] + [21.01]
+        lats = [50.0600 + i * 0.0005 for i in range(10)] + [52.23]
+        values = [20, 21, 22, 19, 20, 21, 500, 20, 22, 21, 35]
+        names = ['Kraków'] * 10 + ['Warszawa']
+
+        # when
+        cells = binner.bin(ids, lons, lats, values, names)
+
+        # then
+        self.assertEqual(2, len(cells))
+        by_name = {name: (lon, lat, value) for lon, lat, value, name in cells}
+        self.assertEqual(21.0, by_name['Kraków'][2])
+        self.assertEqual(35.0, by_name['Warszawa'][2])
+        self.assertAlmostEqual(np.mean(lons[:10]), by_name['Kraków'][0], places=6)
+
+    def test_trimmed_mean(self):
+        binner = GridBinner(cell_km=5, statistic='trimmed_mean', trim=0.1)
+
+        cells = binner.bin(list(range(10)), [19.94] * 10, [50.06] * 10, [1, 2, 3, 4, 5, 6, 7, 8, 9, 1000],
+                           ['Kraków'] * 10)
+
+        self.assertEqual(5.5, cells[0][2])
+
+    def test_city_label_on_most_populated_cell(self):
+        binner = GridBinner(cell_km=1)
+        lons = [19.90, 19.94, 19.9401, 19.9402]
+        lats = [50.06, 50.06, 50.06, 50.06]
+
+        cells = binner.bin([1, 2, 3, 4], lons, lats, [10, 20, 20, 20], ['Kraków'] * 4)
+
+        self.assertEqual(['', 'Kraków'], sorted(name for _, _, _, name in cells))
+
+    def test_sensor_cells_assigned_once(self):
+        # given
+        binner = GridBinner(cell_km=5)
+        spy2(spatial_binning.project)
+
+        # when
+        binner.bin([1, 2], [19.94, 21.01], [50.06, 52.23], [1, 2], ['Kraków', 'Warszawa'])
+        binner.bin([1, 2, 3], [19.94, 21.01, 18.60], [50.06, 52.23, 54.35], [3, 4, 5],
+                   ['Kraków', 'Warszawa', 'Gdańsk'])
+
+        # then: second frame projects only the new sensor
+        verify(spatial_binning, times=1).project([19.94, 21.01], [50.06, 52.23])
+        verify(spatial_binning, times=1).project([18.60], [54.35])
+
+    def test_invalid_configuration(self):
+        with self.assertRaises(ValueError):
+            GridBinner(cell_km=0)
+        with self.assertRaises(ValueError):
+            GridBinner(statistic='mean')
+
+
+if __name__ == '__main__':
+    unittest.main()
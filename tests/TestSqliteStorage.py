@@ -0,0 +1,227 @@
+###
+# SolarMeteo    : https://github.com/pa810p/solarmeteo
+# Author        : Pawel Prokop
+# License       : GNU GENERAL PUBLIC LICENSE v3
+###
+
+import os
+import tempfile
+import unittest
+from datetime import datetime
+from unittest import mock
+
+import alembic.command
+from alembic.config import Config
+from sqlalchemy import func, inspect, select, text
+from sqlalchemy.orm import Session
+
+from solarmeteo.model import EsaStationData, GiosStation, GiosStationData, Rollup
+from solarmeteo.model import database
+from solarmeteo.model.database import bulk_upsert, dispose_engines, get_engine
+from solarmeteo.model.observed_datetime import ObservedDatetime, SOURCE_IMGW, SOURCE_GIOS
+from solarmeteo.model.rollup import add_all_to_rollups
+from solarmeteo.model.station import Station
+from solarmeteo.model.station_data import StationData
+from solarmeteo.updater.esa_updater import EsaUpdater
+from solarmeteo.updater.gios_updater import GiosUpdater, LIST_OF_STATIONS
+from solarmeteo.updater.meteo_updater import MeteoUpdater
+
+ALEMBIC_LOCATION = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'alembic')
+
+
+def station_json(imgw_id, date, hour, temperature):
+    return {
+        'id_stacji': imgw_id, 'stacja': f'Station {imgw_id}', 'data_pomiaru': date, 'godzina_pomiaru': hour,
+        'temperatura': temperature, 'predkosc_wiatru': '1', 'kierunek_wiatru': '320', 'wilgotnosc_wzgledna': '58.4',
+        'suma_opadu': '0', 'cisnienie': '1017.2',
+    }
+
+
+def smog_json(name, timestamp, pm10):
+    return {
+        'school': {'name': name, 'city': 'Kraków', 'longitude': '19.9', 'latitude': '50.0'},
+        'data': {'humidity_avg': 60.0, 'pressure_avg': 1010.0, 'temperature_avg': 12.5, 'pm10_avg': pm10,
+                 'pm25_avg': 10.0},
+        'timestamp': timestamp,
+    }
+
+
+def gios_station_json(gios_id, name):
+    return {
+        'Identyfikator stacji': gios_id, 'Kod stacji': f'MpKr{gios_id}', 'Nazwa stacji': name,
+        'WGS84 φ N': '50.05', 'WGS84 λ E': '19.92', 'Identyfikator miasta': 1, 'Nazwa miasta': 'Kraków',
+        'Gmina': 'Kraków', 'Powiat': 'Kraków', 'Województwo': 'MAŁOPOLSKIE', 'Ulica': None,
+    }
+
+
+class TestSqliteStorage(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.db_url = 'sqlite:///' + os.path.join(self.directory.name, 'meteo.db')
+        self.config = Config()
+        self.config.set_main_option('script_location', ALEMBIC_LOCATION)
+        self.config.set_main_option('sqlalchemy.url', self.db_url)
+        alembic.command.upgrade(self.config, 'head')
+        self.engine = get_engine(self.db_url)
+
+    def tearDown(self):
+        dispose_engines()
+        self.directory.cleanup()
+
+    def test_migrations(self):
+        tables = set(inspect(self.engine).get_table_names())
+        self.assertTrue({'station', 'station_data', 'solar_data', 'sun_data', 'frame_types', 'frames', 'gios_station',
+                         'gios_parameter', 'gios_station_data', 'esa_station', 'esa_station_data',
+                         'observed_datetime', 'rollup'} <= tables)
+        self.assertEqual([['station_id', 'datetime']], [
+            constraint['column_names'] for constraint in inspect(self.engine).get_unique_constraints('station_data')])
+        with self.engine.connect() as connection:
+            self.assertEqual(5, connection.execute(text('SELECT count(*) FROM frame_types')).scalar())
+            self.assertEqual('wal', connection.execute(text('PRAGMA journal_mode')).scalar())
+        # indexes of migrated measurement tables are those of the models
+        for model in (StationData, EsaStationData, GiosStationData):
+            self.assertEqual({index.name for index in model.__table__.indexes},
+                             {index['name'] for index in inspect(self.engine).get_indexes(model.__tablename__)})
+
+        alembic.command.downgrade(self.config, 'base')
+        self.assertEqual(['alembic_version'], inspect(self.engine).get_table_names())
+
+    def test_rollups_backfilled_by_migration(self):
+        alembic.command.downgrade(self.config, 'c8d14f3a6e57')
+        with Session(self.engine) as session:
+            station = Station('Kraków', 12566)
+            session.add(station)
+            session.flush()
+            station_id = station.id
+            session.add(StationData(station_id, datetime(2025, 1, 1, 6), 2.0, None, None, None, None, None))
+            session.commit()
+        alembic.command.upgrade(self.config, 'head')
+
+        with Session(self.engine) as session:
+            add_all_to_rollups(session, SOURCE_IMGW, [(station_id, datetime(2025, 1, 1, 9), {'temperature': -4.0})])
+            session.commit()
+
+            # upsert of the same bucket updates the backfilled row
+            self.assertEqual([('day', 2, -2.0), ('month', 2, -2.0)], session.execute(
+                select(Rollup.resolution, Rollup.count, Rollup.sum)
+                .where(Rollup.variable == 'temperature', Rollup.bucket >= datetime(2025, 1, 1))
+                .order_by(Rollup.resolution)).all())
+
+    def test_imgw_bulk_ingest(self):
+        updater = MeteoUpdater(meteo_db_url=self.db_url, meteo_data_url=None, updater_interval=None,
+                               updater_update_station_coordinates=False,
+                               updater_update_station_coordinates_file=None)
+        stations = [
+            station_json('12295', '2025-06-23', '8', '17.0'),
+            station_json('12600', '2025-06-23', '8', None),
+            station_json('12600', '2025-06-23', '9', '20.0'),
+        ]
+
+        with Session(self.engine) as session:
+            changes = updater.update_stations(session, stations, None)
+            # stored rows are skipped, only the new one is reported
+            repeated = updater.update_stations(session, stations + [station_json('12295', '2025-06-23', '9', '18.0')],
+                                               None)
+
+            self.assertEqual({datetime(2025, 6, 23, 8), datetime(2025, 6, 23, 9)}, set(changes))
+            self.assertIn('temperature', changes[datetime(2025, 6, 23, 8)])
+            self.assertEqual({datetime(2025, 6, 23, 9): {'temperature', 'wind_speed', 'wind_direction', 'humidity',
+                                                        'precipitation', 'pressure'}}, repeated)
+            self.assertEqual(4, session.scalar(select(func.count()).select_from(StationData)))
+            self.assertEqual(2, session.scalar(select(func.count()).select_from(ObservedDatetime)
+                                               .where(ObservedDatetime.source == SOURCE_IMGW)))
+            self.assertEqual((2, 35.0), session.execute(
+                select(Rollup.count, Rollup.sum).where(Rollup.resolution == 'day',
+                                                       Rollup.variable == 'temperature')
+                .order_by(Rollup.count.desc())).first())
+
+    def test_esa_bulk_ingest(self):
+        updater = EsaUpdater(self.db_url, None)
+        smog_data = [
+            smog_json('SP 1', '2025-01-01T12:00:00', 20.0),
+            smog_json('SP 1', '2025-01-01T12:00:00', 20.0),
+            smog_json('SP 2', '2025-01-01T12:00:00', 30.0),
+            # invalid
+            smog_json('SP 2', '2025-01-01T12:10:00', 0),
+        ]
+
+        with Session(self.engine) as session:
+            self.assertEqual(4, updater.update_smog_data(session, smog_data))
+            updater.update_smog_data(session, smog_data[:1])
+
+            self.assertEqual(2, session.scalar(select(func.count()).select_from(EsaStationData)))
+            self.assertEqual([(1, 20.0), (1, 30.0)], session.execute(
+                select(Rollup.count, Rollup.sum).where(Rollup.resolution == 'hour', Rollup.variable == 'pm10')
+                .order_by(Rollup.sum)).all())
+
+    def test_gios_upserts(self):
+        updater = GiosUpdater(self.db_url, 'https://api.gios.gov.pl/pjp-api/v1/rest', max_delay_sec=1)
+
+        with mock.patch.object(updater, 'get', return_value={LIST_OF_STATIONS: [gios_station_json(400, 'Kraków')]}):
+            updater.update_stations()
+        with mock.patch.object(updater, 'get', return_value={LIST_OF_STATIONS: [
+                gios_station_json(400, 'Kraków, Aleja Krasińskiego'), gios_station_json(500, 'Kraków, Bujaka')]}):
+            updater.update_stations()
+
+        with Session(self.engine) as session:
+            self.assertEqual([(400, 'Kraków, Aleja Krasińskiego'), (500, 'Kraków, Bujaka')], session.execute(
+                select(GiosStation.gios_id, GiosStation.station_name).order_by(GiosStation.gios_id)).all())
+            station = session.query(GiosStation).filter_by(gios_id=400).one()
+            rows = [{'gios_station_id': station.id, 'parameter_id': 3, 'datetime': datetime(2025, 1, 1, 12),
+                     'value': 2}]
+            parameters = {3: 'pm10'}
+
+            GiosUpdater._save_station_data(session, station, rows, parameters)
+            GiosUpdater._save_station_data(session, station, rows, parameters)
+
+            self.assertEqual(1, session.scalar(select(func.count()).select_from(GiosStationData)))
+            self.assertEqual(1, session.scalar(select(func.count()).select_from(ObservedDatetime)
+                                               .where(ObservedDatetime.source == SOURCE_GIOS)))
+            self.assertEqual(1, session.scalar(select(Rollup.count).where(Rollup.resolution == 'day')))
+
+    def test_bulk_upsert_statements(self):
+        rows = [{'source': SOURCE_IMGW, 'datetime': datetime(2025, 1, 1, hour)} for hour in range(5)]
+
+        with Session(self.engine) as session, \
+                mock.patch.dict(database.MAX_PARAMETERS, {'sqlite': 4}), \
+                mock.patch.object(session, 'execute', wraps=session.execute) as execute:
+            returned = bulk_upsert(session, ObservedDatetime, rows + rows[:1], returning=[ObservedDatetime.datetime])
+            session.commit()
+
+            # two rows per statement, the duplicate is skipped
+            self.assertEqual(3, execute.call_count)
+            self.assertEqual(5, len(returned))
+
+            add_all_to_rollups(session, SOURCE_IMGW, [(1, datetime(2025, 1, 1, 6), {'temperature': 2.0}),
+                                                      (1, datetime(2025, 1, 1, 9), {'temperature': -4.0}),
+                                                      (1, datetime(2025, 1, 2, 9), {'temperature': None})])
+            session.commit()
+            self.assertEqual([('day', 2, -2.0, -4.0, 2.0), ('month', 2, -2.0, -4.0, 2.0)], session.execute(
+                select(Rollup.resolution, Rollup.count, Rollup.sum, Rollup.min, Rollup.max)
+                .order_by(Rollup.resolution)).all())
+
+    def test_bulk_upsert_updates_duplicates_in_order(self):
+        def rollup(station_id, value):
+            return {'source': SOURCE_IMGW, 'resolution': 'day', 'variable': 'temperature',
+                    'bucket': datetime(2025, 1, 1), 'station_id': station_id, 'count': 1, 'sum': value,
+                    'min': value, 'max': value}
+        rows = [rollup(1, 2.0), rollup(2, 5.0), rollup(1, -4.0)]
+
+        with Session(self.engine) as session, \
+                mock.patch.object(session, 'execute', wraps=session.execute) as execute:
+            bulk_upsert(session, Rollup, rows,
+                        index_elements=[Rollup.source, Rollup.resolution, Rollup.variable, Rollup.bucket,
+                                        Rollup.station_id],
+                        set_=lambda excluded: {'count': Rollup.count + excluded['count'],
+                                               'sum': Rollup.sum + excluded['sum']})
+            session.commit()
+
+            # PostgreSQL does not update a row twice in a statement, the duplicate goes to the next one
+            self.assertEqual(2, execute.call_count)
+            self.assertEqual([(1, 2, -2.0), (2, 1, 5.0)], session.execute(
+                select(Rollup.station_id, Rollup.count, Rollup.sum).order_by(Rollup.station_id)).all())
+
+
+if __name__ == '__main__':
+    unittest.main()
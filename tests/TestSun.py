@@ -4,21 +4,91 @@
 # License       : GNU GENERAL PUBLIC LICENSE v3
 ###
 
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 
 import unittest
 
+import numpy as np
+
 from solarmeteo.updater import sun
 
+# tolerance of NOAA algorithm against astropy reference in degrees
+TOLERANCE = 0.01
+
+
+def angle_difference(a, b):
+    return abs((a - b + 180.0) % 360.0 - 180.0)
+
 
 class TestSun(unittest.TestCase):
 
-    @unittest.skip("not implemented yet")
+    longitude = 21.0276
+    latitude = 52.2131
+    height = 106
+
+    @classmethod
+    def setUpClass(cls):
+        # do not try to download IERS tables during tests, bundled ones are precise enough
+        from astropy.utils import iers
+        iers.conf.auto_download = False
+        iers.conf.auto_max_age = None
+
     def test_calculate_sun(self):
-        sun.calculate_sun(
-            datetime.now(),
-            self.longitude,
-            self.latitude,
-            self.height
-        )
+        solar_datetime = datetime(2025, 6, 21, 12, 0, 0, tzinfo=timezone.utc)
+
+        azimuth, altitude = sun.calculate_sun(solar_datetime, self.longitude, self.latitude, self.height)
+        ref_azimuth, ref_altitude = sun.calculate_sun_astropy(solar_datetime, self.longitude, self.latitude,
+                                                              self.height)
+
+        self.assertIsInstance(azimuth, float)
+        self.assertIsInstance(altitude, float)
+        self.assertLess(angle_difference(azimuth, ref_azimuth), TOLERANCE)
+        self.assertLess(abs(altitude - ref_altitude), TOLERANCE)
+
+    def test_solar_position_matches_astropy(self):
+        datetimes = [datetime(2019, 1, 1, 5, 15, tzinfo=timezone.utc) + timedelta(hours=17 * i + 0.25 * i)
+                     for i in range(12)]
+
+        azimuth, altitude = sun.solar_position(datetimes, self.longitude, self.latitude)
+
+        for i, solar_datetime in enumerate(datetimes):
+            ref_azimuth, ref_altitude = sun.calculate_sun_astropy(solar_datetime, self.longitude, self.latitude,
+                                                                  self.height)
+            self.assertLess(angle_difference(azimuth[i], ref_azimuth), TOLERANCE, solar_datetime)
+            self.assertLess(abs(altitude[i] - ref_altitude), TOLERANCE, solar_datetime)
+
+    def test_solar_position_broadcasts_locations(self):
+        utc = np.array(['2025-03-20T11:00:00'], dtype='datetime64[s]')
+        lons = np.array([14.5, 19.9, 24.1])
+        lats = np.array([53.4, 50.06, 49.3])
+
+        azimuth, altitude = sun.solar_position(utc, lons, lats)
+
+        self.assertEqual((3,), azimuth.shape)
+        for i in range(3):
+            single_azimuth, single_altitude = sun.solar_position(utc, lons[i], lats[i])
+            self.assertAlmostEqual(single_azimuth[0], azimuth[i])
+            self.assertAlmostEqual(single_altitude[0], altitude[i])
+
+    def test_solar_noon(self):
+        # at local solar noon the sun is due south in the northern hemisphere
+        utc = np.arange('2025-06-21T10:00', '2025-06-21T12:00', np.timedelta64(1, 'm'), dtype='datetime64[m]')
+
+        azimuth, altitude = sun.solar_position(utc, self.longitude, self.latitude)
+
+        noon = np.argmax(altitude)
+        self.assertLess(angle_difference(azimuth[noon], 180.0), 0.5)
+        # declination on solstice is about 23.44 degrees
+        self.assertAlmostEqual(90.0 - self.latitude + 23.44, altitude[noon], delta=0.1)
+
+    def test_refraction_lifts_altitude_near_horizon(self):
+        utc = np.array(['2025-06-21T02:30:00'], dtype='datetime64[s]')
+
+        _, geometric = sun.solar_position(utc, self.longitude, self.latitude)
+        _, apparent = sun.solar_position(utc, self.longitude, self.latitude, refraction=True)
+
+        self.assertGreater(apparent[0], geometric[0])
+
 
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+###
+# SolarMeteo    : https://github.com/pa810p/solarmeteo
+# Author        : Pawel Prokop
+# License       : GNU GENERAL PUBLIC LICENSE v3
+###
+
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+
+from solarmeteo.model.database import dispose_engines
+from solarmeteo.model.solar_data import SolarData
+from solarmeteo.model.sun_data import SunData
+from solarmeteo.updater import sun
+from solarmeteo.updater.solar_updater import SolarUpdater
+
+
+class TestSunBackfill(unittest.TestCase):
+
+    def setUp(self):
+        self.db_dir = tempfile.mkdtemp()
+        self.db_url = 'sqlite:///' + os.path.join(self.db_dir, 'meteo.db')
+        self.engine = create_engine(self.db_url)
+        SolarData.metadata.create_all(self.engine)
+        SunData.metadata.create_all(self.engine)
+
+        self.updater = SolarUpdater(meteo_db_url=self.db_url, data_url=None, updater_interval=None, site_id=None,
+                                    solar_key=None, lon='21.0276', lat='52.2131', height='106')
+
+    def tearDown(self):
+        self.engine.dispose()
+        dispose_engines()
+        os.remove(os.path.join(self.db_dir, 'meteo.db'))
+        os.rmdir(self.db_dir)
+
+    def test_backfill_sun_data(self):
+        # given
+        start = datetime(2019, 6, 1)
+        datetimes = [start + timedelta(minutes=15 * i) for i in range(250)]
+        with Session(self.engine) as session:
+            session.add_all(SolarData(d, 100.0) for d in datetimes)
+            # already computed position must be kept
+            session.add(SunData(datetimes[10], 1.0, 2.0))
+            session.commit()
+
+        # when
+        inserted = self.updater.backfill_sun_data(chunk_size=100)
+
+        # then
+        self.assertEqual(249, inserted)
+        with Session(self.engine) as session:
+            rows = {row.datetime: row for row in session.execute(select(SunData)).scalars()}
+        self.assertEqual(set(datetimes), set(rows.keys()))
+        self.assertEqual(1.0, rows[datetimes[10]].azimuth)
+
+        azimuth, height = sun.calculate_sun(datetimes[50], 21.0276, 52.2131, 106)
+        self.assertAlmostEqual(azimuth, rows[datetimes[50]].azimuth)
+        self.assertAlmostEqual(height, rows[datetimes[50]].height)
+
+        # nothing left to do
+        self.assertEqual(0, self.updater.backfill_sun_data())
+
+
+if __name__ == '__main__':
+    unittest.main()